@@ -9,9 +9,13 @@ from logger import logger
 from routers.clovax_analyze import router as clovax_analyze_router
 from routers.vt_analyzer import router as vt_analyzer_router
 from routers.risk_grader import router as risk_grader_router
-from routers.input_receiver import router as input_receiver_router
-from routers.output_sender import router as output_sender_router
-from routers.llama_analyze import router as llama_analyze_router
+from routers.input_receiver import router as input_receiver_router, job_queue
+from routers.output_sender import router as output_sender_router, webhook_dispatcher
+from routers.llama_analyze import router as llama_analyze_router, llama_scheduler, start_model_loading
+from routers.prometheus_exporter import router as prometheus_router, metrics_snapshots
+from routers.vt_client import vt_client
+from routers.clovax_client import clovax_client
+from routers.executors import shutdown_pools
 
 # FastAPI 앱 생성
 app = FastAPI(
@@ -41,6 +45,25 @@ app.include_router(vt_analyzer_router, prefix="/vt-analyzer", tags=["VirusTotal
 app.include_router(risk_grader_router, prefix="/risk", tags=["위험도 등급 평가"])
 app.include_router(input_receiver_router, prefix="/input-receiver", tags=["Input Receiver"])
 app.include_router(output_sender_router, prefix="/output-sender", tags=["Output Sender"])
+app.include_router(prometheus_router, tags=["Metrics"])
+
+# ⚙️ 분석 작업 큐 워커 시작/종료 및 공용 클라이언트/실행 풀 정리
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+    await webhook_dispatcher.start()
+    await start_model_loading()  # LLaMA 모델은 백그라운드 로딩 (준비 상태: /llama-analyze/ready)
+    await metrics_snapshots.start()  # 워커별 지표 스냅샷 (/metrics 가 모든 워커 지표를 합쳐 반환)
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+    await webhook_dispatcher.stop()
+    await metrics_snapshots.stop()
+    await llama_scheduler.stop()
+    await vt_client.aclose()
+    await clovax_client.aclose()
+    shutdown_pools()
 
 # Swagger 문서 오버라이딩
 def custom_openapi():
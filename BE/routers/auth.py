@@ -0,0 +1,14 @@
+from fastapi import HTTPException, Request
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ✅ API Key 검증 함수
+def verify_api_key(request: Request):
+    auth_header = request.headers.get("authorization")
+    logger.info(f"[AUTH] 받은 인증 헤더: {auth_header}")
+    if auth_header != "API KEY":
+        raise HTTPException(
+            status_code=403,
+            detail="❌ 유효하지 않은 API Key입니다. Swagger 상단 Authorize 버튼에 정확한 키값을 입력하세요."
+        )
@@ -1,57 +1,146 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
+from typing import Optional
+import json
 import logging
-from openai import OpenAI
+import os
+import re
+import time
 
-router = APIRouter()
+from routers.auth import verify_api_key
+from routers.clovax_client import ClovaXClientError, clovax_client
+from routers.inference_cache import inference_cache
+from routers.password_extractor import fast_password
 
-# 🔐 Clova Studio (OpenAI 호환 API)
-client = OpenAI(
-    api_key="ClovaX API KEY",
-    base_url="https://clovastudio.stream.ntruss.com/v1/openai"
-)
+router = APIRouter()
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG)
+
+# ✅ 추론 설정 (본문의 문자열을 그대로 골라내는 작업이므로 기본 temperature 0)
+# temperature 0 이면 같은 본문에 항상 같은 답 → 추론 캐시 사용, 0 보다 크면 매번 새로 추론 (캐시 안 함)
+CLOVAX_MODEL = "HCX-005"
+CLOVAX_PROMPT_VERSION = "1"  # 프롬프트를 바꾸면 올려서 이전 캐시 답변을 사용하지 않도록 함
+CLOVAX_TEMPERATURE = float(os.getenv("CLOVAX_TEMPERATURE", "0"))
+CLOVAX_STRUCTURED_OUTPUT = os.getenv("CLOVAX_STRUCTURED_OUTPUT", "1") == "1"  # 요청에 constrained 값이 없을 때의 기본 모드
+
+# ✅ 구조화 출력 스키마: {"password": "..."} 한 개 필드만 허용 → 설명 문장 없이 바로 종료
+PASSWORD_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "archive_password",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {"password": {"type": "string", "minLength": 1, "maxLength": 64}},
+            "required": ["password"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# API 가 response_format 을 지원하지 않는다고 거부하면(400) 일정 시간 자유 생성으로 전환 후 다시 시도
+CLOVAX_STRUCTURED_RETRY_SECONDS = float(os.getenv("CLOVAX_STRUCTURED_RETRY_SECONDS", "3600"))
+_STRUCTURED_UNSUPPORTED = re.compile(r"response_format|json_schema|structured|schema", re.IGNORECASE)
+structured_output_disabled_until = 0.0
+
+def structured_output_supported() -> bool:
+    return time.time() >= structured_output_disabled_until
 
 # 📥 요청 모델
 class ClovaXRequest(BaseModel):
     post_text: str
+    bypass_cache: bool = False
+    constrained: Optional[bool] = None  # None 이면 CLOVAX_STRUCTURED_OUTPUT 설정을 따름
+    bypass_fastpath: bool = False  # true 이면 규칙 기반 추출을 건너뛰고 항상 LLM 호출 (엔진/출력 모드 비교 측정용)
 
 # 📤 응답 모델
 class ClovaXResponse(BaseModel):
     password: str
 
 # 🔍 내부 분석 함수 (직접 호출용)
-async def analyze_with_clovax(post_text: str) -> str:
+async def analyze_with_clovax(post_text: str, bypass_cache: bool = False, constrained: Optional[bool] = None,
+                              bypass_fastpath: bool = False) -> str:
+    # ⚡ 본문에 비밀번호가 명시된 경우는 규칙 기반으로 바로 반환 (힌트/계산형 등 모호한 경우만 LLM 호출)
+    fast = None if bypass_fastpath else fast_password(post_text)
+    if fast is not None:
+        return fast["password"]
+
+    constrained = CLOVAX_STRUCTURED_OUTPUT if constrained is None else constrained
+    constrained = constrained and structured_output_supported()
+    prompt_version = f"{CLOVAX_PROMPT_VERSION}-json" if constrained else CLOVAX_PROMPT_VERSION
+
     try:
-        logger.info("📨 ClovaX 분석 시작 (HCX 모델 사용)")
-
-        prompt = f"""
-        다음 게시글 비밀번호를 추론해줘.
-        본문: {post_text}
-        """
-
-        response = client.chat.completions.create(
-            model="HCX-005",
-            messages=[
-                {"role": "system", "content": "압축파일 비밀번호만 골라서 출력하세요."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=256
+        return await inference_cache.cached(
+            post_text, CLOVAX_MODEL, prompt_version, CLOVAX_TEMPERATURE,
+            lambda: _infer_with_clovax(post_text, constrained), bypass=bypass_cache,
         )
 
-        answer = response.choices[0].message.content.strip()
-        logger.info(f"📌 ClovaX 결과: {answer}")
-        return answer
-
     except Exception as e:
         logger.error(f"❌ ClovaX 분석 실패: {e}")
         raise HTTPException(status_code=500, detail=f"Clova 분석 오류: {e}")
 
+async def _infer_with_clovax(post_text: str, constrained: bool = False) -> str:
+    global structured_output_disabled_until
+    logger.info("📨 ClovaX 분석 시작 (HCX 모델 사용)")
+
+    prompt = f"""
+    다음 게시글 비밀번호를 추론해줘.
+    본문: {post_text}
+    """
+    messages = [
+        {"role": "system", "content": "압축파일 비밀번호만 골라서 출력하세요."},
+        {"role": "user", "content": prompt}
+    ]
+
+    # 🔐 Clova Studio (OpenAI 호환 API) - 공용 클라이언트가 동시 요청 수/재시도/시간 제한을 관리
+    if constrained:
+        try:
+            response = await clovax_client.chat(
+                model=CLOVAX_MODEL,
+                messages=messages,
+                temperature=CLOVAX_TEMPERATURE,
+                max_tokens=64,
+                extra={"response_format": PASSWORD_RESPONSE_FORMAT},
+            )
+            answer = _parse_structured_answer(response)
+            logger.info(f"📌 ClovaX 결과 (구조화 출력): {answer}")
+            return answer
+        except ClovaXClientError as e:
+            # 다른 이유의 400(본문 길이 초과 등)은 그대로 실패, response_format 관련 거부일 때만 전환
+            if e.status_code != 400 or not _STRUCTURED_UNSUPPORTED.search(e.body):
+                raise
+            structured_output_disabled_until = time.time() + CLOVAX_STRUCTURED_RETRY_SECONDS
+            logger.warning(f"⚠️ ClovaX 구조화 출력 미지원 → {CLOVAX_STRUCTURED_RETRY_SECONDS:g}초 동안 자유 생성으로 전환: {e.body[:200]}")
+
+    response = await clovax_client.chat(
+        model=CLOVAX_MODEL,
+        messages=messages,
+        temperature=CLOVAX_TEMPERATURE,
+        max_tokens=256
+    )
+
+    answer = response.strip()
+    logger.info(f"📌 ClovaX 결과: {answer}")
+    return answer
+
+# 🧾 구조화 출력 → 비밀번호 (JSON 이 아니면 본문 그대로)
+def _parse_structured_answer(response: str) -> str:
+    try:
+        return str(json.loads(response)["password"]).strip()
+    except (ValueError, KeyError, TypeError):
+        return response.strip()
+
 # 🌐 API 라우트 (Swagger 및 외부 호출용)
 @router.post("", response_model=ClovaXResponse, summary="ClovaX LLM 비밀번호 추론")
 async def analyze_with_clovax_api(request: ClovaXRequest) -> ClovaXResponse:
-    password = await analyze_with_clovax(request.post_text)
+    password = await analyze_with_clovax(
+        request.post_text, bypass_cache=request.bypass_cache, constrained=request.constrained,
+        bypass_fastpath=request.bypass_fastpath,
+    )
     return ClovaXResponse(password=password)
+
+
+# 📊 ClovaX 클라이언트 호출/재시도/지연시간 통계 조회 (관리자용)
+@router.get("/client/stats", summary="ClovaX 클라이언트 호출 통계", dependencies=[Depends(verify_api_key)])
+def clovax_client_stats():
+    return clovax_client.snapshot()
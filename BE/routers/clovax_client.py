@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+import httpx
+
+from routers.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# ✅ ClovaX 클라이언트 설정 (환경 변수로 조정 가능, 로컬 OpenAI 호환 스텁 서버 테스트 시 CLOVAX_BASE_URL 변경)
+CLOVAX_API_KEY = os.getenv("CLOVAX_API_KEY", "ClovaX API KEY")
+CLOVAX_BASE_URL = os.getenv("CLOVAX_BASE_URL", "https://clovastudio.stream.ntruss.com/v1/openai")
+CLOVAX_MAX_CONCURRENCY = int(os.getenv("CLOVAX_MAX_CONCURRENCY", "4"))  # Clova Studio 동시 요청 한도에 맞춤
+CLOVAX_MAX_RETRIES = int(os.getenv("CLOVAX_MAX_RETRIES", "3"))
+CLOVAX_BACKOFF_BASE = float(os.getenv("CLOVAX_BACKOFF_BASE", "1"))
+CLOVAX_BACKOFF_MAX = float(os.getenv("CLOVAX_BACKOFF_MAX", "20"))
+CLOVAX_CONNECT_TIMEOUT = float(os.getenv("CLOVAX_CONNECT_TIMEOUT", "5"))
+CLOVAX_READ_TIMEOUT = float(os.getenv("CLOVAX_READ_TIMEOUT", "30"))
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class ClovaXClientError(Exception):
+    def __init__(self, status_code: int, message: str, body: str = ""):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body  # 오류 응답 본문 (실패 원인 판별용)
+
+
+# 📡 공용 ClovaX 클라이언트 (OpenAI 호환 chat/completions, 커넥션 유지 + 동시 요청 제한 + 재시도 + 지연시간 히스토그램)
+class ClovaXClient:
+    def __init__(
+        self,
+        api_key: str = CLOVAX_API_KEY,
+        base_url: str = CLOVAX_BASE_URL,
+        max_concurrency: int = CLOVAX_MAX_CONCURRENCY,
+        max_retries: int = CLOVAX_MAX_RETRIES,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "timeouts": 0, "errors": 0, "inflight": 0}
+        self.latency = LatencyHistogram()  # 성공한 요청 1회의 응답 시간
+        self.call_latency = LatencyHistogram()  # 재시도/대기를 포함한 chat() 전체 시간
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=httpx.Timeout(CLOVAX_READ_TIMEOUT, connect=CLOVAX_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # 💬 chat/completions 1회 → 첫 번째 답변 본문
+    async def chat(self, messages: list[dict], model: str, temperature: float, max_tokens: int,
+                   extra: Optional[dict] = None) -> str:
+        payload = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens, **(extra or {})}
+        started = time.perf_counter()
+        try:
+            return await self._post(payload)
+        finally:
+            self.call_latency.observe(time.perf_counter() - started)
+
+    async def _post(self, payload: dict) -> str:
+        url = f"{self.base_url}/chat/completions"
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                self.stats["requests"] += 1
+                self.stats["inflight"] += 1
+                started = time.perf_counter()
+                try:
+                    response = await self._http().post(url, json=payload)
+                    status = response.status_code
+                except httpx.TimeoutException as e:
+                    response, status = None, None
+                    self.stats["timeouts"] += 1
+                    logger.warning(f"⚠️ ClovaX 응답 시간 초과: {e!r}")
+                except httpx.TransportError as e:
+                    response, status = None, None
+                    logger.warning(f"⚠️ ClovaX 연결 오류: {e!r}")
+                finally:
+                    self.stats["inflight"] -= 1
+
+            if status == 200:
+                self.latency.observe(time.perf_counter() - started)
+                try:
+                    return response.json()["choices"][0]["message"]["content"]
+                except (KeyError, IndexError, ValueError) as e:
+                    self.stats["errors"] += 1
+                    raise ClovaXClientError(502, f"ClovaX 응답 파싱 오류: {e}")
+
+            if status is not None and status not in RETRYABLE_STATUS:
+                self.stats["errors"] += 1
+                logger.error(f"❌ ClovaX 요청 실패: {status} - {response.text}")
+                raise ClovaXClientError(status, f"ClovaX 요청 실패: {status}", body=response.text[:2000])
+
+            if status == 429:
+                self.stats["throttled"] += 1
+
+            if attempt >= self.max_retries:
+                self.stats["errors"] += 1
+                raise ClovaXClientError(status or 504, "ClovaX 요청 실패 (재시도 소진)")
+
+            delay = self._backoff_delay(attempt, response)
+            attempt += 1
+            self.stats["retries"] += 1
+            logger.warning(f"🔁 ClovaX 재시도 대기 {delay:.1f}s - 상태: {status}")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _backoff_delay(attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(float(retry_after), CLOVAX_BACKOFF_MAX)
+                except ValueError:
+                    pass
+        # full jitter: 여러 요청이 동시에 재시도하며 다시 몰리지 않도록 0 ~ 상한 사이 임의 대기
+        return random.uniform(0, min(CLOVAX_BACKOFF_BASE * (2 ** attempt), CLOVAX_BACKOFF_MAX))
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "max_concurrency": self.max_concurrency,
+            "latency_seconds": self.latency.snapshot(),
+            "call_latency_seconds": self.call_latency.snapshot(),
+        }
+
+
+# ✅ 프로세스 공용 클라이언트 인스턴스
+clovax_client = ClovaXClient()
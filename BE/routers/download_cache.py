@@ -0,0 +1,248 @@
+import fcntl
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# ✅ 다운로드 캐시 설정 (환경 변수로 조정 가능)
+DOWNLOAD_CACHE_DIR = os.getenv("DOWNLOAD_CACHE_DIR", os.path.abspath("./data/download_cache"))  # 비어 있으면 캐시 비활성화
+DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv("DOWNLOAD_CACHE_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+
+
+# 🔎 URL 에 저장된 검증자와 사전 점검 응답 비교 (ETag → Last-Modified 순)
+def _still_valid(entry: dict, probe: dict) -> bool:
+    if entry["etag"] and probe.get("etag"):
+        return entry["etag"] == probe["etag"]
+    if entry["last_modified"] and probe.get("last_modified"):
+        return entry["last_modified"] == probe["last_modified"]
+    # 검증자가 없는 서버는 재사용하지 않음 (같은 URL 에 다른 파일이 올라올 수 있음)
+    return False
+
+
+# 🗄️ 다운로드한 압축파일 캐시 (URL → 내용 해시 인덱스 + 내용 해시별 파일 1개, 용량 초과 시 LRU 제거)
+# - 같은 바이트는 URL 이 달라도 blobs/<sha256> 하나로 저장
+# - 사용 중(pin)인 파일은 제거 대상에서 제외
+#   pin = 파일에 공유 잠금(flock LOCK_SH) → 같은 캐시 디렉토리를 쓰는 다른 워커 프로세스도 제거하지 않음
+#   제거는 배타 잠금(LOCK_EX | LOCK_NB)을 얻은 파일만 (프로세스가 죽으면 커널이 잠금을 풀어 pin 이 남지 않음)
+class DownloadCache:
+    def __init__(self, cache_dir: str = DOWNLOAD_CACHE_DIR, max_bytes: int = DOWNLOAD_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pinned: dict[str, list] = {}  # sha256 → [공유 잠금을 건 파일 디스크립터, 이 프로세스 안의 사용 수]
+        self._conn = None
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "stores": 0, "dedup_stores": 0, "evictions": 0, "bytes_saved": 0}
+
+        if cache_dir:
+            self.blob_dir = os.path.join(cache_dir, "blobs")
+            os.makedirs(self.blob_dir, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(cache_dir, "index.sqlite3"), check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS urls (
+                    url TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_type TEXT,
+                    filename TEXT
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS blobs (
+                    sha256 TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+            logger.info(f"🗄️ 다운로드 캐시 사용: {cache_dir} (최대 {max_bytes} bytes)")
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, sha256)
+
+    # 📌 파일에 공유 잠금을 걸어 사용 중 표시 (락을 쥔 상태에서 호출)
+    # 다른 프로세스가 제거 중이거나 이미 제거한 파일이면 False
+    def _pin(self, sha256: str) -> bool:
+        pinned = self._pinned.get(sha256)
+        if pinned is not None:
+            pinned[1] += 1
+            return True
+        try:
+            fd = os.open(self._blob_path(sha256), os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            if os.fstat(fd).st_nlink == 0:
+                raise FileNotFoundError(sha256)
+        except OSError:
+            os.close(fd)
+            return False
+        self._pinned[sha256] = [fd, 1]
+        return True
+
+    # 🔍 URL 캐시 조회 → 사전 점검 결과로 재검증 후 download_archive 와 같은 형태의 dict 반환 (pin 됨)
+    def lookup(self, url: str, probe: dict) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT u.sha256, u.etag, u.last_modified, u.content_type, u.filename, b.size "
+                "FROM urls u JOIN blobs b ON b.sha256 = u.sha256 WHERE u.url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            sha256, etag, last_modified, content_type, filename, size = row
+            entry = {"etag": etag, "last_modified": last_modified}
+            path = self._blob_path(sha256)
+            size_changed = probe.get("size") is not None and probe["size"] != size
+            if not _still_valid(entry, probe) or size_changed or not self._pin(sha256):
+                self._conn.execute("DELETE FROM urls WHERE url = ?", (url,))
+                self._conn.commit()
+                self.stats["stale"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self._conn.execute("UPDATE blobs SET last_used = ? WHERE sha256 = ?", (time.time(), sha256))
+            self._conn.commit()
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += size
+
+        logger.info(f"♻️ 다운로드 캐시 적중: {url} (sha256={sha256}, {size} bytes)")
+        return {
+            "path": path,
+            "sha256": sha256,
+            "size": size,
+            "content_type": content_type,
+            "filename": filename,
+        }
+
+    # 💾 방금 받은 파일을 캐시에 저장 → 캐시 안의 경로 반환 (pin 됨, 저장하지 않으면 원래 경로)
+    def store(self, url: str, probe: dict, archive: dict) -> str:
+        if not self.enabled or (self.max_bytes and archive["size"] > self.max_bytes):
+            return archive["path"]
+        if not (probe.get("etag") or probe.get("last_modified")):
+            return archive["path"]
+
+        sha256 = archive["sha256"]
+        path = self._blob_path(sha256)
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,)).fetchone() is not None
+            if exists and self._pin(sha256):
+                # 다른 URL 로 같은 파일을 이미 받아 둔 경우: 방금 받은 파일은 임시 디렉토리와 함께 삭제됨
+                self.stats["dedup_stores"] += 1
+            elif exists and os.path.exists(path):
+                # 다른 프로세스가 지금 제거 중인 파일 → 이번에는 캐시하지 않고 받은 파일을 그대로 사용
+                return archive["path"]
+            else:
+                # 캐시 디렉토리 안 임시 이름으로 옮긴 뒤 잠그고 rename → 다른 프로세스에 보이는 순간부터 pin 된 상태
+                staging = f"{path}.{os.getpid()}.tmp"
+                shutil.move(archive["path"], staging)
+                fd = os.open(staging, os.O_RDONLY)
+                fcntl.flock(fd, fcntl.LOCK_SH)
+                os.replace(staging, path)
+                self._pinned[sha256] = [fd, 1]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO blobs (sha256, size, last_used) VALUES (?, ?, ?)",
+                (sha256, archive["size"], time.time()),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls (url, sha256, etag, last_modified, content_type, filename) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, sha256, probe.get("etag"), probe.get("last_modified"), archive["content_type"], archive["filename"]),
+            )
+            self._conn.commit()
+            self.stats["stores"] += 1
+            self._evict()
+        return path
+
+    def release(self, sha256: str):
+        with self._lock:
+            pinned = self._pinned.get(sha256)
+            if pinned is None:
+                return
+            pinned[1] -= 1
+            if pinned[1] <= 0:
+                del self._pinned[sha256]
+                os.close(pinned[0])  # 공유 잠금도 함께 해제
+
+    # 🔒 다른 프로세스를 포함해 아무도 사용하지 않는 파일만 배타 잠금 → 잠근 디스크립터 반환 (사용 중이면 None)
+    def _lock_for_eviction(self, sha256: str) -> Optional[int]:
+        if sha256 in self._pinned:
+            return None
+        try:
+            fd = os.open(self._blob_path(sha256), os.O_RDONLY)
+        except FileNotFoundError:
+            return -1
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    # 🧹 용량 초과 시 오래 사용하지 않은 파일부터 제거 (락을 쥔 상태에서 호출)
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if not self.max_bytes or total <= self.max_bytes:
+            return
+        for sha256, size in self._conn.execute("SELECT sha256, size FROM blobs ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            fd = self._lock_for_eviction(sha256)
+            if fd is None:
+                continue
+            self._conn.execute("DELETE FROM urls WHERE sha256 = ?", (sha256,))
+            self._conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            if fd >= 0:
+                # 잠금을 쥔 채로 삭제 → 그 사이 pin 하려던 프로세스는 잠금 실패 또는 링크 수 0 으로 캐시 미스 처리
+                try:
+                    os.remove(self._blob_path(sha256))
+                except FileNotFoundError:
+                    pass
+                finally:
+                    os.close(fd)
+            total -= size
+            self.stats["evictions"] += 1
+            logger.info(f"🧹 다운로드 캐시 제거: {sha256} ({size} bytes)")
+        self._conn.commit()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            blobs, stored_bytes, urls = 0, 0, 0
+            if self._conn is not None:
+                blobs, stored_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+                urls = self._conn.execute("SELECT COUNT(*) FROM urls").fetchone()[0]
+            return {
+                **self.stats,
+                "enabled": self.enabled,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+                "urls": urls,
+                "blobs": blobs,
+                "stored_bytes": stored_bytes,
+                "max_bytes": self.max_bytes,
+                "pinned": len(self._pinned),
+            }
+
+
+# ✅ 프로세스 공용 캐시 인스턴스
+download_cache = DownloadCache()
@@ -0,0 +1,323 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Optional
+
+import httpx
+
+from routers.archive_formats import SNIFF_SIZE, filename_from_headers, format_from_hints, sniff_format
+from routers.executors import run_cpu, run_io
+from routers.hashing import hash_file
+
+logger = logging.getLogger(__name__)
+
+# ✅ 다운로드 설정 (환경 변수로 조정 가능)
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_DOWNLOAD_SIZE = int(os.getenv("MAX_DOWNLOAD_SIZE", str(256 * 1024 * 1024)))  # 0 이면 무제한
+DOWNLOAD_CONNECT_TIMEOUT = float(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", "10"))
+DOWNLOAD_READ_TIMEOUT = float(os.getenv("DOWNLOAD_READ_TIMEOUT", "60"))
+DOWNLOAD_MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES", "3"))  # 연결 끊김 시 이어받기 횟수
+RANGE_DOWNLOAD_MIN_SIZE = int(os.getenv("RANGE_DOWNLOAD_MIN_SIZE", str(32 * 1024 * 1024)))  # 구간 병렬 다운로드 기준 크기
+RANGE_SEGMENTS = int(os.getenv("RANGE_SEGMENTS", "4"))
+
+# ✅ 다운로드 실패 코드
+DOWNLOAD_TOO_LARGE = "DOWNLOAD_TOO_LARGE"
+DOWNLOAD_NOT_ARCHIVE = "DOWNLOAD_NOT_ARCHIVE"
+DOWNLOAD_HTTP_ERROR = "DOWNLOAD_HTTP_ERROR"
+DOWNLOAD_TIMEOUT = "DOWNLOAD_TIMEOUT"
+DOWNLOAD_NETWORK_ERROR = "DOWNLOAD_NETWORK_ERROR"
+DOWNLOAD_INCOMPLETE = "DOWNLOAD_INCOMPLETE"
+
+
+class DownloadError(Exception):
+    def __init__(self, code: str, message: str):
+        super().__init__(f"[{code}] {message}")
+        self.code = code
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(DOWNLOAD_READ_TIMEOUT, connect=DOWNLOAD_CONNECT_TIMEOUT)
+
+
+def _check_size(size: Optional[int]):
+    if MAX_DOWNLOAD_SIZE and size is not None and size > MAX_DOWNLOAD_SIZE:
+        raise DownloadError(DOWNLOAD_TOO_LARGE, f"파일 크기 제한 초과: {size} bytes > {MAX_DOWNLOAD_SIZE} bytes")
+
+
+def _check_head(head: bytes, content_type: Optional[str], filename: Optional[str]):
+    if sniff_format(head) is None and format_from_hints(content_type, filename) is None:
+        raise DownloadError(
+            DOWNLOAD_NOT_ARCHIVE,
+            f"지원되지 않는 압축 포맷입니다. (content-type: {content_type}, 파일명: {filename})"
+        )
+
+
+def _range_start(response: httpx.Response) -> Optional[int]:
+    match = re.match(r"bytes (\d+)-", response.headers.get("content-range", ""))
+    return int(match.group(1)) if match else None
+
+
+def _total_size(response: httpx.Response) -> Optional[int]:
+    content_range = response.headers.get("content-range")
+    if content_range:
+        match = re.match(r"bytes \d+-\d+/(\d+)", content_range)
+        if match:
+            return int(match.group(1))
+    content_length = response.headers.get("content-length")
+    if response.status_code == 200 and content_length and content_length.isdigit():
+        return int(content_length)
+    return None
+
+
+# 🛰️ 사전 점검: 본문을 받기 전에 크기/형식 확인 (HEAD → 필요 시 앞부분 Range 요청)
+async def probe_download(download_link: str) -> dict:
+    probe = {
+        "size": None,
+        "content_type": None,
+        "filename": None,
+        "accept_ranges": False,
+        "etag": None,
+        "last_modified": None,
+    }
+    try:
+        async with httpx.AsyncClient(follow_redirects=True, timeout=_timeout()) as client:
+            response = await client.head(download_link)
+            if response.status_code < 400:
+                probe["size"] = _total_size(response)
+            elif response.status_code not in (403, 405, 501):
+                # HEAD 를 막아 둔 서버(403/405/501)가 아니면 본 요청도 실패할 것이므로 바로 중단
+                raise DownloadError(DOWNLOAD_HTTP_ERROR, f"다운로드 실패 - 상태코드: {response.status_code}")
+
+            # 앞부분만 Range 로 받아 매직 바이트까지 확인 (총 크기는 Content-Range 로 확인)
+            async with client.stream("GET", download_link, headers={"Range": f"bytes=0-{SNIFF_SIZE - 1}"}) as ranged:
+                if ranged.status_code >= 400:
+                    raise DownloadError(DOWNLOAD_HTTP_ERROR, f"다운로드 실패 - 상태코드: {ranged.status_code}")
+                head = b""
+                async for chunk in ranged.aiter_bytes():
+                    head += chunk
+                    if len(head) >= SNIFF_SIZE:
+                        break
+                probe["size"] = _total_size(ranged) or probe["size"]
+                probe["accept_ranges"] = ranged.status_code == 206
+                headers = ranged.headers
+
+    except httpx.TimeoutException as e:
+        raise DownloadError(DOWNLOAD_TIMEOUT, f"사전 점검 시간 초과: {e}")
+    except httpx.TransportError as e:
+        raise DownloadError(DOWNLOAD_NETWORK_ERROR, f"사전 점검 연결 오류: {e}")
+
+    probe["content_type"] = headers.get("content-type")
+    probe["filename"] = filename_from_headers(headers.get("content-disposition"), download_link)
+    probe["etag"] = headers.get("etag")
+    probe["last_modified"] = headers.get("last-modified")
+
+    _check_size(probe["size"])
+    if len(head) >= SNIFF_SIZE or (probe["size"] is not None and len(head) >= probe["size"]):
+        _check_head(head[:SNIFF_SIZE], probe["content_type"], probe["filename"])
+
+    logger.info(
+        f"🛰️ 다운로드 사전 점검 통과 - 크기: {probe['size']} bytes, "
+        f"형식: {probe['content_type']}, Range 지원: {probe['accept_ranges']}"
+    )
+    return probe
+
+
+# 📊 다운로드 처리량 통계 (프로세스 누적)
+download_stats = {
+    "downloads": 0,
+    "segmented_downloads": 0,
+    "bytes": 0,
+    "seconds": 0.0,
+    "resumes": 0,
+    "last_throughput_mbps": 0.0,
+}
+
+
+def download_stats_snapshot() -> dict:
+    seconds = download_stats["seconds"]
+    return {
+        **download_stats,
+        "avg_throughput_mbps": round(download_stats["bytes"] * 8 / seconds / 1e6, 2) if seconds else 0.0,
+    }
+
+
+def _record_download(size: int, elapsed: float, segmented: bool) -> float:
+    throughput = round(size * 8 / elapsed / 1e6, 2) if elapsed > 0 else 0.0
+    download_stats["downloads"] += 1
+    download_stats["segmented_downloads"] += int(segmented)
+    download_stats["bytes"] += size
+    download_stats["seconds"] += elapsed
+    download_stats["last_throughput_mbps"] = throughput
+    return throughput
+
+
+def _open_at(path: str, pos: int, truncate: bool):
+    f = open(path, "r+b")
+    f.seek(pos)
+    if truncate:
+        f.truncate()
+    return f
+
+
+def _create_file(path: str, size: int = 0):
+    with open(path, "wb") as f:
+        f.truncate(size)
+
+
+# 🔁 [start, end] 구간을 받아 파일의 해당 위치에 기록 - 연결이 끊기면 받은 위치부터 Range 로 이어받기
+# - end 가 None 이면 파일 끝까지, 반환값은 이 구간에서 실제로 받아 기록한 바이트 수
+# - on_response(response, pos): 응답 헤더 확인용 / on_chunk(chunk): 받은 순서대로 호출
+# - on_restart(): 서버가 이어받기를 거부하고 처음부터 보낼 때 호출 (해시 등 초기화)
+async def _fetch_range(client: httpx.AsyncClient, url: str, path: str, start: int, end: Optional[int],
+                       validator: Optional[str] = None, on_response=None, on_chunk=None, on_restart=None) -> int:
+    pos = start
+    attempt = 0
+    while True:
+        headers = {}
+        if pos > 0 or end is not None:
+            headers["Range"] = f"bytes={pos}-{'' if end is None else end}"
+            if validator:
+                headers["If-Range"] = validator
+        try:
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 200 and pos > 0:
+                    # Range 미지원 또는 원본 변경(If-Range 불일치) → 구간 다운로드면 실패, 전체 다운로드면 처음부터
+                    if start > 0 or end is not None or on_restart is None:
+                        raise DownloadError(DOWNLOAD_HTTP_ERROR, "서버가 Range 이어받기를 거부했습니다. (원본 변경 가능성)")
+                    logger.warning("⚠️ 서버가 이어받기를 거부하여 처음부터 다시 다운로드합니다.")
+                    pos = 0
+                    on_restart()
+                elif response.status_code not in (200, 206):
+                    raise DownloadError(DOWNLOAD_HTTP_ERROR, f"다운로드 실패 - 상태코드: {response.status_code}")
+                elif response.status_code == 206 and _range_start(response) not in (None, pos):
+                    raise DownloadError(DOWNLOAD_HTTP_ERROR, f"요청과 다른 구간을 응답했습니다. (요청 {pos}, 응답 {_range_start(response)})")
+                if on_response is not None:
+                    on_response(response, pos)
+
+                # 파일 열기/쓰기는 IO 풀에서 (디스크가 느려도 이벤트 루프를 막지 않음)
+                f = await run_io(_open_at, path, pos, pos == 0 and end is None)
+                try:
+                    async for chunk in response.aiter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        if end is not None and pos + len(chunk) > end + 1:
+                            chunk = chunk[:end + 1 - pos]
+                        await run_io(f.write, chunk)
+                        pos += len(chunk)
+                        if on_chunk is not None:
+                            on_chunk(chunk)
+                        if end is not None and pos > end:
+                            # Range 를 무시하고 200 으로 전체를 보내는 서버면 나머지는 받지 않음
+                            break
+                finally:
+                    await run_io(f.close)
+
+            if end is None or pos > end:
+                return pos - start
+            raise httpx.ReadError(f"응답이 예상보다 짧습니다. ({pos}/{end + 1})")
+
+        except httpx.TransportError as e:
+            attempt += 1
+            if attempt > DOWNLOAD_MAX_RETRIES:
+                if isinstance(e, httpx.TimeoutException):
+                    raise DownloadError(DOWNLOAD_TIMEOUT, f"다운로드 시간 초과: {e}")
+                raise DownloadError(DOWNLOAD_NETWORK_ERROR, f"다운로드 연결 오류: {e}")
+            download_stats["resumes"] += 1
+            delay = min(2 ** attempt, 30)
+            logger.warning(f"🔁 다운로드 이어받기 대기 {delay}s - 위치 {pos} bytes, 사유: {e!r}")
+            await asyncio.sleep(delay)
+
+
+# ✅ 파일 다운로드 (httpx 비동기 스트리밍) - 받는 동안 원본 압축파일의 SHA-256 도 함께 계산
+# 크기 제한/앞부분 형식 검사를 스트리밍 중에도 적용하여, 거부할 입력이면 나머지를 받지 않고 중단
+# 사전 점검 결과 Range 를 지원하는 큰 파일이면 구간 병렬 다운로드 사용
+async def download_archive(download_link: str, temp_dir: str, probe: Optional[dict] = None) -> dict:
+    archive_path = os.path.join(temp_dir, "downloaded_file")
+    await run_io(_create_file, archive_path)
+    started = time.perf_counter()
+
+    if probe and probe["accept_ranges"] and probe["size"] and probe["size"] >= RANGE_DOWNLOAD_MIN_SIZE \
+            and RANGE_SEGMENTS > 1:
+        archive = await _download_segmented(download_link, archive_path, probe)
+        segmented = True
+    else:
+        archive = await _download_single(download_link, archive_path, probe)
+        segmented = False
+
+    elapsed = time.perf_counter() - started
+    archive["elapsed_s"] = round(elapsed, 3)
+    archive["throughput_mbps"] = _record_download(archive["size"], elapsed, segmented)
+    logger.info(
+        f"📥 파일 다운로드 완료: {archive_path} ({archive['size']} bytes, {archive['elapsed_s']}s, "
+        f"{archive['throughput_mbps']} Mbps, {'구간 병렬' if segmented else '단일 스트림'}, sha256={archive['sha256']})"
+    )
+    return archive
+
+
+async def _download_single(download_link: str, archive_path: str, probe: Optional[dict]) -> dict:
+    state = {"sha256": hashlib.sha256(), "size": 0, "head": b"", "content_type": None, "filename": None}
+    validator = (probe or {}).get("etag") or (probe or {}).get("last_modified")
+
+    def on_response(response: httpx.Response, pos: int):
+        if pos == 0:
+            state["content_type"] = response.headers.get("content-type")
+            state["filename"] = filename_from_headers(response.headers.get("content-disposition"), str(response.url))
+            _check_size(_total_size(response))
+
+    def on_chunk(chunk: bytes):
+        if len(state["head"]) < SNIFF_SIZE:
+            state["head"] += chunk[:SNIFF_SIZE - len(state["head"])]
+            if len(state["head"]) >= SNIFF_SIZE:
+                _check_head(state["head"], state["content_type"], state["filename"])
+        state["sha256"].update(chunk)
+        state["size"] += len(chunk)
+        _check_size(state["size"])
+
+    def on_restart():
+        state.update(sha256=hashlib.sha256(), size=0, head=b"")
+
+    async with httpx.AsyncClient(follow_redirects=True, timeout=_timeout()) as client:
+        await _fetch_range(client, download_link, archive_path, 0, None, validator, on_response, on_chunk, on_restart)
+
+    if probe and probe["size"] is not None and state["size"] != probe["size"]:
+        raise DownloadError(DOWNLOAD_INCOMPLETE, f"다운로드 크기 불일치: {state['size']} / {probe['size']} bytes")
+
+    return {
+        "path": archive_path,
+        "sha256": state["sha256"].hexdigest(),
+        "size": state["size"],
+        "content_type": state["content_type"],
+        "filename": state["filename"],
+    }
+
+
+async def _download_segmented(download_link: str, archive_path: str, probe: dict) -> dict:
+    total = probe["size"]
+    validator = probe.get("etag") or probe.get("last_modified")
+    segment_size = -(-total // RANGE_SEGMENTS)
+    ranges = [(start, min(start + segment_size, total) - 1) for start in range(0, total, segment_size)]
+
+    await run_io(_create_file, archive_path, total)
+
+    limits = httpx.Limits(max_connections=len(ranges), max_keepalive_connections=len(ranges))
+    async with httpx.AsyncClient(follow_redirects=True, timeout=_timeout(), limits=limits) as client:
+        received = await asyncio.gather(*(
+            _fetch_range(client, download_link, archive_path, start, end, validator)
+            for start, end in ranges
+        ))
+
+    # 파일은 미리 total 크기로 늘려 두었으므로 파일 크기가 아니라 구간별로 실제 받은 바이트 수로 확인
+    size = sum(received)
+    if size != total:
+        raise DownloadError(DOWNLOAD_INCOMPLETE, f"다운로드 크기 불일치: {size} / {total} bytes")
+
+    # 구간이 순서 없이 도착하므로 원본 해시는 다운로드 완료 후 한 번에 계산
+    sha256, _ = await run_cpu(hash_file, archive_path)
+    return {
+        "path": archive_path,
+        "sha256": sha256,
+        "size": size,
+        "content_type": probe["content_type"],
+        "filename": probe["filename"],
+    }
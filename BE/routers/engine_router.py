@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+from routers.clovax_analyze import analyze_with_clovax
+from routers.llama_analyze import analyze_with_llama, llama_available
+from routers.metrics import LatencyHistogram
+from routers.password_extractor import fast_password
+
+logger = logging.getLogger(__name__)
+
+# ✅ 추론 엔진 라우터 설정 (환경 변수로 조정 가능)
+ENGINE_POLICY = os.getenv("ENGINE_POLICY", "ordered")  # ordered / cheapest / fastest / accuracy
+ENGINE_ORDER = [e.strip() for e in os.getenv("ENGINE_ORDER", "clovax,llama").split(",") if e.strip()]
+ENGINE_LATENCY_BUDGET = float(os.getenv("ENGINE_LATENCY_BUDGET", "20"))  # 이 시간 안에 답이 없으면 다음 엔진으로 전환(초)
+ENGINE_HEDGE = os.getenv("ENGINE_HEDGE", "0") == "1"  # 1 이면 앞 엔진을 취소하지 않고 다음 엔진을 함께 실행
+ENGINE_HEDGE_DELAY = float(os.getenv("ENGINE_HEDGE_DELAY", "3"))  # 헤지 요청을 보내기 전 대기 시간(초)
+
+
+class NoEngineAnswerError(Exception):
+    pass
+
+
+# 📚 추론 엔진 레지스트리
+# - infer(post_text, bypass_cache) -> 비밀번호 문자열 (실패 시 예외)
+# - available() -> 지금 바로 요청을 받을 수 있는지 (모델 로딩 중 등은 False)
+# - cost: 상대 비용 (cheapest 정책 정렬 기준, 외부 API 과금 엔진일수록 크게)
+INFERENCE_ENGINES: dict[str, dict] = {}
+
+
+def register_engine(
+    name: str,
+    infer: Callable[[str, bool], Awaitable[str]],
+    available: Optional[Callable[[], bool]] = None,
+    cost: float = 1.0,
+):
+    INFERENCE_ENGINES[name] = {
+        "name": name,
+        "infer": infer,
+        "available": available or (lambda: True),
+        "cost": cost,
+        "stats": {
+            "calls": 0, "answers": 0, "empty": 0, "errors": 0, "cancelled": 0, "hedge_wins": 0,
+            "outcomes": 0, "correct": 0,
+        },
+        "latency": LatencyHistogram(),
+    }
+
+
+register_engine(
+    "clovax",
+    lambda post_text, bypass_cache: analyze_with_clovax(post_text, bypass_cache=bypass_cache),
+    cost=float(os.getenv("ENGINE_COST_CLOVAX", "1")),
+)
+register_engine(
+    "llama",
+    lambda post_text, bypass_cache: analyze_with_llama(post_text, bypass_cache=bypass_cache),
+    available=llama_available,
+    cost=float(os.getenv("ENGINE_COST_LLAMA", "0.1")),
+)
+
+
+# 🧭 정책별 엔진 시도 순서 + 폴백/헤지 실행 + 엔진별 지연시간/정확도 통계
+class EngineRouter:
+    def __init__(
+        self,
+        policy: str = ENGINE_POLICY,
+        order: list[str] = ENGINE_ORDER,
+        latency_budget: float = ENGINE_LATENCY_BUDGET,
+        hedge: bool = ENGINE_HEDGE,
+        hedge_delay: float = ENGINE_HEDGE_DELAY,
+    ):
+        self.policy = policy
+        self.order = [name for name in order if name in INFERENCE_ENGINES]
+        self.latency_budget = latency_budget
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.stats = {"requests": 0, "fast_path": 0, "fallbacks": 0, "hedged": 0, "failed": 0}
+
+    # 관측된 정답률 (표본이 적을 때 0/1 로 튀지 않도록 라플라스 보정)
+    @staticmethod
+    def _accuracy(engine: dict) -> float:
+        return (engine["stats"]["correct"] + 1) / (engine["stats"]["outcomes"] + 2)
+
+    # 관측된 p95 지연시간 (아직 호출 기록이 없으면 0 → 먼저 시도해 측정)
+    @staticmethod
+    def _p95(engine: dict) -> float:
+        latency = engine["latency"].snapshot()
+        return latency["p95"] if latency["count"] else 0.0
+
+    def ranked_engines(self) -> list[dict]:
+        engines = [INFERENCE_ENGINES[name] for name in self.order]
+        if self.policy == "cheapest":
+            engines.sort(key=lambda e: e["cost"])
+        elif self.policy == "fastest":
+            engines.sort(key=self._p95)
+        elif self.policy == "accuracy":
+            engines.sort(key=lambda e: (-self._accuracy(e), self._p95(e)))
+        return [e for e in engines if e["available"]()]
+
+    async def _call(self, engine: dict, post_text: str, bypass_cache: bool) -> str:
+        engine["stats"]["calls"] += 1
+        started = time.perf_counter()
+        try:
+            answer = await engine["infer"](post_text, bypass_cache)
+        except asyncio.CancelledError:
+            engine["stats"]["cancelled"] += 1
+            raise
+        except Exception:
+            engine["stats"]["errors"] += 1
+            raise
+        engine["latency"].observe(time.perf_counter() - started)
+        if not (answer or "").strip():
+            engine["stats"]["empty"] += 1
+            raise NoEngineAnswerError(f"{engine['name']} 빈 답변")
+        engine["stats"]["answers"] += 1
+        return answer.strip()
+
+    # 🔍 비밀번호 추론 → {"password", "engine"}
+    # 앞 엔진이 실패하면 바로, 지연 예산(헤지 모드는 헤지 지연)을 넘기면 다음 엔진 실행 → 먼저 나온 유효한 답 사용
+    async def infer(self, post_text: str, bypass_cache: bool = False) -> dict:
+        self.stats["requests"] += 1
+        fast = fast_password(post_text)
+        if fast is not None:
+            self.stats["fast_path"] += 1
+            return {"password": fast["password"], "engine": "rules"}
+
+        queue = self.ranked_engines()
+        if not queue:
+            self.stats["failed"] += 1
+            raise NoEngineAnswerError("사용 가능한 추론 엔진이 없습니다.")
+
+        delay = self.hedge_delay if self.hedge else self.latency_budget
+        running: dict[asyncio.Task, dict] = {}
+        hedges: set[asyncio.Task] = set()  # 앞 엔진이 아직 실행 중일 때 함께 띄운 (헤지) 작업
+        errors = []
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            engine = queue[launched]
+            launched += 1
+            task = asyncio.create_task(self._call(engine, post_text, bypass_cache))
+            if launched > 1:
+                self.stats["hedged" if running else "fallbacks"] += 1
+                logger.info(f"🧭 추론 엔진 추가 실행: {engine['name']} ({'헤지' if running else '폴백'})")
+                if running:
+                    hedges.add(task)
+            running[task] = engine
+
+        try:
+            launch()
+            while running:
+                can_launch = launched < len(queue)
+                done, _ = await asyncio.wait(running, timeout=delay if can_launch else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    engine = running.pop(task)
+                    try:
+                        answer = task.result()
+                    except Exception as e:
+                        errors.append(f"{engine['name']}: {e}")
+                        logger.warning(f"⚠️ 추론 엔진 실패: {engine['name']} - {e}")
+                        continue
+                    if task in hedges:
+                        # 헤지로 띄운 엔진이 먼저 답한 경우만 (원래 엔진이 먼저 답하면 헤지는 이득이 없었음)
+                        engine["stats"]["hedge_wins"] += 1
+                    return {"password": answer, "engine": engine["name"]}
+
+                if not can_launch:
+                    continue
+                if not done and not self.hedge:
+                    # 지연 예산 초과 → 느린 엔진은 취소하고 다음 엔진으로 폴백
+                    # 취소된 호출도 "적어도 지연 예산만큼 걸림" 으로 기록 (fastest 정책이 빠른 표본만 보고 순위를 매기지 않도록)
+                    for task, engine in running.items():
+                        task.cancel()
+                        engine["latency"].observe(self.latency_budget)
+                        errors.append(f"{engine['name']}: 지연 예산 {self.latency_budget}s 초과")
+                    running.clear()
+                # 시간 초과(헤지/폴백) 또는 실행 중이던 엔진 실패 → 다음 엔진 실행
+                launch()
+        finally:
+            for task in running:
+                task.cancel()
+
+        self.stats["failed"] += 1
+        raise NoEngineAnswerError(f"모든 추론 엔진 실패: {'; '.join(errors)}")
+
+    # ✅ 압축파일 비밀번호 확인 결과로 엔진 정답 여부 기록 (accuracy 정책 및 통계에 반영)
+    def record_outcome(self, engine_name: str, correct: bool):
+        engine = INFERENCE_ENGINES.get(engine_name)
+        if engine is None:
+            return
+        engine["stats"]["outcomes"] += 1
+        engine["stats"]["correct"] += int(correct)
+
+    def snapshot(self) -> dict:
+        engines = {}
+        for name, engine in INFERENCE_ENGINES.items():
+            engines[name] = {
+                **engine["stats"],
+                "available": engine["available"](),
+                "cost": engine["cost"],
+                "accuracy": round(engine["stats"]["correct"] / engine["stats"]["outcomes"], 4) if engine["stats"]["outcomes"] else None,
+                "latency_seconds": engine["latency"].snapshot(),
+            }
+        return {
+            **self.stats,
+            "policy": self.policy,
+            "order": [e["name"] for e in self.ranked_engines()],
+            "latency_budget_seconds": self.latency_budget,
+            "hedge": self.hedge,
+            "hedge_delay_seconds": self.hedge_delay,
+            "engines": engines,
+        }
+
+
+# ✅ 프로세스 공용 엔진 라우터
+engine_router = EngineRouter()
@@ -0,0 +1,72 @@
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# ✅ 실행 풀 크기 설정 (환경 변수로 조정 가능)
+# - IO 풀: 블로킹 라이브러리 호출(동기 SDK, 파일 I/O 등)을 이벤트 루프 밖에서 실행
+# - CPU 풀: 압축 해제, SHA-256 해시 계산 등 CPU/디스크 집약 작업 실행
+IO_POOL_WORKERS = int(os.getenv("IO_POOL_WORKERS", "16"))
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(os.cpu_count() or 2)))
+CPU_POOL_KIND = os.getenv("CPU_POOL_KIND", "thread")  # "thread" 또는 "process"
+# - 해시 풀: 압축 멤버 단위 SHA-256 병렬 계산 (CPU 풀 작업 안에서 호출되므로 별도 풀 사용)
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", str(os.cpu_count() or 2)))
+
+_io_pool: ThreadPoolExecutor | None = None
+_cpu_pool: Executor | None = None
+_hash_pool: ThreadPoolExecutor | None = None
+
+
+def io_pool() -> ThreadPoolExecutor:
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_POOL_WORKERS, thread_name_prefix="zs-io")
+        logger.info(f"⚙️ IO 실행 풀 생성 - 스레드 {IO_POOL_WORKERS}개")
+    return _io_pool
+
+
+def cpu_pool() -> Executor:
+    global _cpu_pool
+    if _cpu_pool is None:
+        if CPU_POOL_KIND == "process":
+            _cpu_pool = ProcessPoolExecutor(max_workers=CPU_POOL_WORKERS)
+        else:
+            # zlib/lzma/hashlib 은 큰 버퍼 처리 시 GIL 을 해제하므로 기본값은 스레드 풀
+            _cpu_pool = ThreadPoolExecutor(max_workers=CPU_POOL_WORKERS, thread_name_prefix="zs-cpu")
+        logger.info(f"⚙️ CPU 실행 풀 생성 - {CPU_POOL_KIND} {CPU_POOL_WORKERS}개")
+    return _cpu_pool
+
+
+def hash_pool() -> ThreadPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ThreadPoolExecutor(max_workers=HASH_POOL_WORKERS, thread_name_prefix="zs-hash")
+        logger.info(f"⚙️ 해시 실행 풀 생성 - 스레드 {HASH_POOL_WORKERS}개")
+    return _hash_pool
+
+
+# 🔁 블로킹 함수를 IO 풀에서 실행하고 결과를 await
+async def run_io(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_pool(), functools.partial(func, *args, **kwargs))
+
+
+# 🔁 CPU/디스크 집약 함수를 CPU 풀에서 실행하고 결과를 await
+# (process 모드에서는 func 와 인자가 pickle 가능해야 함)
+async def run_cpu(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_pool(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_pools():
+    global _io_pool, _cpu_pool, _hash_pool
+    for pool in (_io_pool, _cpu_pool, _hash_pool):
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    _io_pool = None
+    _cpu_pool = None
+    _hash_pool = None
+    logger.info("🛑 실행 풀 종료")
@@ -1,19 +1,34 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
+from contextlib import asynccontextmanager
 import os
-import hashlib
 import tempfile
-import requests
 import shutil
-import zipfile
-import py7zr
-import tarfile
-import rarfile
 import logging
+import time
+from typing import Optional
+
+from routers.executors import run_cpu, run_io
+from routers.hashing import ExtractionBudget, ExtractionLimitError, hash_files_on_disk
+from routers.archive_formats import UnsupportedFormatError, detect_format, get_handler, sniff_format
+from routers.downloader import DownloadError, download_archive
+from routers.download_cache import download_cache
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# ✅ 해제 방식 설정 (환경 변수로 조정 가능)
+# - stream: 멤버를 디스크에 풀지 않고 압축 해제 스트림에서 바로 SHA-256 계산
+# - disk: 기존 방식 (extractall 후 파일을 다시 읽어 해시)
+EXTRACT_MODE = os.getenv("EXTRACT_MODE", "stream")
+
+# ✅ 중첩 압축파일 재귀 해제 제한 (압축 폭탄 조기 차단)
+MAX_NESTING_DEPTH = int(os.getenv("MAX_NESTING_DEPTH", "3"))  # 0 이면 최상위 압축파일만 해제
+MAX_TOTAL_UNCOMPRESSED = int(os.getenv("MAX_TOTAL_UNCOMPRESSED", str(2 * 1024 * 1024 * 1024)))
+MAX_MEMBER_COUNT = int(os.getenv("MAX_MEMBER_COUNT", "10000"))
+MAX_COMPRESSION_RATIO = float(os.getenv("MAX_COMPRESSION_RATIO", "100"))
+RATIO_CHECK_MIN_SIZE = int(os.getenv("RATIO_CHECK_MIN_SIZE", str(1024 * 1024)))  # 이보다 작은 멤버는 압축률 검사 생략
+
 # 📥 요청 모델
 class FileExtractRequest(BaseModel):
     download_link: str
@@ -22,85 +37,233 @@ class FileExtractRequest(BaseModel):
 # 📤 응답 모델
 class FileExtractResponse(BaseModel):
     extracted_files: list[dict]
+    levels: list[dict] = []
+    archive: dict = {}
 
 # ✅ Swagger 테스트용 API 엔드포인트
 @router.post("/", response_model=FileExtractResponse, summary="파일 다운로드 및 압축 해제")
-def extract_file_api(req: FileExtractRequest):
-    extracted = extract_file(req.download_link, req.password)
-    return {"extracted_files": extracted}
+async def extract_file_api(req: FileExtractRequest):
+    return await extract_file(req.download_link, req.password)
 
-# ✅ 내부 해제 함수 (기존 그대로)
-def extract_file(download_link: str, password: str = None):
-    try:
-        temp_dir = tempfile.mkdtemp()
-        logger.info(f"📂 임시 디렉토리 생성됨: {temp_dir}")
+# ✅ 압축파일 한 단계 해시 계산 (stream: 압축 해제 스트림에서 바로 / disk: 풀어서 다시 읽기)
+# stream 방식은 청크마다 예산을 누적해 제한을 넘는 즉시 중단 (disk 방식은 extractall 이후 해시 단계에서 검사)
+def _hash_one_level(archive_path: str, temp_dir: str, password: str, fmt: str, budget: ExtractionBudget) -> list[dict]:
+    handler = get_handler(fmt)
+    if EXTRACT_MODE == "disk":
+        file_list = handler["extract"](archive_path, temp_dir, password)
+        logger.info(f"📂 압축 해제 완료 ({fmt}) - 포함 파일 수: {len(file_list)}")
+        return hash_files_on_disk(temp_dir, file_list, budget)
+    return handler["stream_hash"](archive_path, temp_dir, password, budget)
+
+# 🛡️ 헤더에 기록된 크기로 해제 전에 제한 검사 (멤버 수, 총 해제 크기, 압축률)
+def _check_declared_limits(handler: dict, archive_path: str, password: str, budget: ExtractionBudget):
+    members = handler["inspect"](archive_path, password)
+    if members is None:
+        return
+
+    if budget.members + len(members) > MAX_MEMBER_COUNT:
+        raise ExtractionLimitError(f"멤버 수 제한 초과: {budget.members + len(members)}개 > {MAX_MEMBER_COUNT}개")
+
+    declared = sum(m["size"] or 0 for m in members)
+    if budget.bytes + declared > MAX_TOTAL_UNCOMPRESSED:
+        raise ExtractionLimitError(f"총 해제 크기 제한 초과: {budget.bytes + declared} bytes > {MAX_TOTAL_UNCOMPRESSED} bytes")
 
-        response = requests.get(download_link, stream=True)
-        if response.status_code != 200:
-            raise Exception(f"다운로드 실패 - 상태코드: {response.status_code}")
-
-        archive_path = os.path.join(temp_dir, "downloaded_file")
-        with open(archive_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        logger.info(f"📥 파일 다운로드 완료: {archive_path}")
-
-        extracted_files = []
-
-        if zipfile.is_zipfile(archive_path):
-            with zipfile.ZipFile(archive_path) as zip_ref:
-                if password:
-                    zip_ref.setpassword(password.encode())
-                zip_ref.extractall(temp_dir)
-                file_list = zip_ref.namelist()
-
-        elif archive_path.endswith(".7z"):
-            with py7zr.SevenZipFile(archive_path, mode='r', password=password) as z:
-                z.extractall(path=temp_dir)
-                file_list = z.getnames()
-
-        elif archive_path.endswith(".rar"):
-            with rarfile.RarFile(archive_path) as rf:
-                if password:
-                    rf.setpassword(password)
-                rf.extractall(path=temp_dir)
-                file_list = rf.namelist()
-
-        elif archive_path.endswith(".tar.gz") or archive_path.endswith(".tgz"):
-            with tarfile.open(archive_path, "r:gz") as tf:
-                tf.extractall(path=temp_dir)
-                file_list = tf.getnames()
+    for m in members:
+        if m["compressed_size"] and (m["size"] or 0) >= RATIO_CHECK_MIN_SIZE \
+                and m["size"] / m["compressed_size"] > MAX_COMPRESSION_RATIO:
+            raise ExtractionLimitError(f"압축률 제한 초과: {m['file_name']} ({m['size'] / m['compressed_size']:.0f}배)")
 
+    # solid 7z 처럼 멤버별 압축 크기가 없는 경우를 위해 압축파일 전체 기준으로도 검사
+    archive_size = os.path.getsize(archive_path)
+    if declared >= RATIO_CHECK_MIN_SIZE and archive_size and declared / archive_size > MAX_COMPRESSION_RATIO:
+        raise ExtractionLimitError(f"압축률 제한 초과: 전체 {declared / archive_size:.0f}배")
+
+# 🔁 압축파일 1개를 해시하고, 중첩 압축파일이면 한 단계 더 내려가 재귀 처리
+def _walk_archive(archive_path: str, work_dir: str, password: str, fmt: str, depth: int, prefix: str,
+                  files: list, levels: dict, budget: ExtractionBudget):
+    started = time.perf_counter()
+    handler = get_handler(fmt)
+    level = levels.setdefault(depth, {
+        "depth": depth, "archives": 0, "members": 0, "leaves": 0, "nested_archives": 0, "bytes": 0, "elapsed_s": 0.0,
+    })
+
+    _check_declared_limits(handler, archive_path, password, budget)
+    # 헤더 정보가 없는 tar/gz 등도 해제 도중 총 크기/멤버 수/압축파일 전체 압축률 제한에 걸리면 바로 중단
+    level_budget = budget.child(os.path.getsize(archive_path), MAX_COMPRESSION_RATIO, RATIO_CHECK_MIN_SIZE,
+                                label=f" ({prefix or '최상위'})")
+    members = _hash_one_level(archive_path, work_dir, password, fmt, level_budget)
+
+    level["archives"] += 1
+    level["members"] += len(members)
+    level["bytes"] += sum(m["size"] for m in members)
+
+    nested = []
+    for m in members:
+        head = m.pop("_head", b"")
+        member_name = m["file_name"]
+        m["file_name"] = prefix + member_name
+        m["depth"] = depth
+        nested_fmt = sniff_format(head) if depth < MAX_NESTING_DEPTH else None
+        if nested_fmt is not None:
+            nested.append((m, member_name))
         else:
-            raise Exception("지원되지 않는 압축 포맷입니다.")
+            files.append(m)
+            level["leaves"] += 1
+    level["elapsed_s"] += time.perf_counter() - started
 
-        logger.info(f"📂 압축 해제 완료 - 포함 파일 수: {len(file_list)}")
+    for m, member_name in nested:
+        started = time.perf_counter()
+        inner_dir = tempfile.mkdtemp(dir=work_dir)
+        inner_path = os.path.join(inner_dir, "nested_archive")
+        try:
+            # 해시 단계에서 이미 크기를 잰 멤버이므로 복사는 그 크기까지만 허용 (스트림이 달라지면 중단)
+            handler["extract_member"](archive_path, password, member_name, inner_path,
+                                      ExtractionBudget(max_bytes=m["size"], label=f" ({m['file_name']} 복사)"))
+            level["elapsed_s"] += time.perf_counter() - started
+            inner_fmt = detect_format(inner_path)
 
-        for file_name in file_list:
-            file_path = os.path.join(temp_dir, file_name)
-            if not os.path.isfile(file_path):
-                continue
+            # 내부 압축파일은 같은 비밀번호를 우선 시도하고, 실패하면 비밀번호 없이 시도
+            last_error = None
+            for inner_password in dict.fromkeys([password, None]):
+                try:
+                    _walk_archive(inner_path, inner_dir, inner_password, inner_fmt, depth + 1,
+                                  m["file_name"] + "/", files, levels, budget)
+                    level["nested_archives"] += 1
+                    break
+                except ExtractionLimitError:
+                    raise
+                except Exception as e:
+                    last_error = e
+            else:
+                raise last_error
 
-            sha256_hash = hashlib.sha256()
-            with open(file_path, "rb") as f:
-                for byte_block in iter(lambda: f.read(4096), b""):
-                    sha256_hash.update(byte_block)
+        except ExtractionLimitError:
+            raise
+        except Exception as e:
+            # 열 수 없는 중첩 압축파일은 파일 자체를 최종 분석 대상으로 취급
+            logger.warning(f"⚠️ 중첩 압축파일 해제 실패 - 파일 자체를 분석 대상으로 처리: {m['file_name']} ({e})")
+            files.append(m)
+            level["leaves"] += 1
+        finally:
+            shutil.rmtree(inner_dir, ignore_errors=True)
 
-            file_info = {
-                "file_name": file_name,
-                "sha256": sha256_hash.hexdigest(),
-                "size": os.path.getsize(file_path)
-            }
-            extracted_files.append(file_info)
+# ✅ 중첩 압축파일 재귀 해제 + 최종 파일 해시 (CPU 풀에서 실행되는 동기 함수)
+def extract_recursive(archive_path: str, temp_dir: str, password: str = None, fmt: str = None) -> dict:
+    fmt = fmt or detect_format(archive_path)
+    files: list[dict] = []
+    levels: dict[int, dict] = {}
+    budget = ExtractionBudget(max_bytes=MAX_TOTAL_UNCOMPRESSED, max_members=MAX_MEMBER_COUNT)
 
-        logger.info(f"📑 SHA256 해시 계산 완료 - 총 {len(extracted_files)}개 파일")
-        return extracted_files
+    _walk_archive(archive_path, temp_dir, password, fmt, 0, "", files, levels, budget)
 
-    except Exception as e:
-        logger.error(f"[압축 해제 실패] {str(e)}")
-        raise Exception(f"[압축 해제 실패] {str(e)}")
+    level_list = [levels[d] for d in sorted(levels)]
+    for level in level_list:
+        level["elapsed_s"] = round(level["elapsed_s"], 4)
+    logger.info(
+        f"📑 SHA256 해시 계산 완료 ({fmt}) - 최종 파일 {len(files)}개, "
+        f"깊이 {len(level_list) - 1}, 총 {budget.bytes} bytes"
+    )
+    return {"extracted_files": files, "levels": level_list}
+
+# ✅ 압축파일 준비: 다운로드 캐시 확인 → 없으면 다운로드+원본 해시(비동기 I/O)
+# 사전 점검 결과(probe)가 있으면 다운로드 캐시로 재검증하여 같은 파일은 다시 받지 않음
+# 블록을 벗어나면 임시 디렉토리 삭제 + 캐시 pin 해제
+# archive: {"path", "sha256", "size", "content_type", "filename", "cache_hit", "elapsed_s", "throughput_mbps", "temp_dir"}
+@asynccontextmanager
+async def open_archive(download_link: str, probe: dict = None):
+    temp_dir = tempfile.mkdtemp()
+    pinned = None
+    try:
+        logger.info(f"📂 임시 디렉토리 생성됨: {temp_dir}")
+
+        archive = await run_io(download_cache.lookup, download_link, probe) if probe else None
+        if archive is not None:
+            pinned = archive["sha256"]
+            archive.update(elapsed_s=0.0, throughput_mbps=0.0, cache_hit=True)
+        else:
+            archive = await download_archive(download_link, temp_dir, probe)
+            archive["cache_hit"] = False
+            if probe:
+                cached_path = await run_io(download_cache.store, download_link, probe, archive)
+                if cached_path != archive["path"]:
+                    archive["path"], pinned = cached_path, archive["sha256"]
+        archive["temp_dir"] = temp_dir
+        yield archive
+
+    except DownloadError as e:
+        # 다운로드 단계 실패는 실패 코드를 유지한 채 그대로 전달
+        logger.error(f"[다운로드 실패] {str(e)}")
+        raise
 
     finally:
+        if pinned is not None:
+            download_cache.release(pinned)
         if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
+            await run_io(shutil.rmtree, temp_dir)
             logger.info(f"🧹 임시 디렉토리 삭제 완료: {temp_dir}")
+
+# 🔑 비밀번호 후보를 순서대로 압축파일에 대 보고 처음 맞는 것을 반환 (전체 해제 없이 헤더/가장 작은 멤버로 확인)
+# 모두 실패하면 첫 번째 후보를 반환하여 해제 단계에서 원래 오류가 드러나도록 함
+# 반환: (비밀번호, 일치한 후보 순번(-1 = 없음), 암호 보호 여부)
+def _select_password(archive_path: str, fmt: str, candidates: list) -> tuple[Optional[str], int, bool]:
+    check = get_handler(fmt)["check_password"]
+    if check(archive_path, None):
+        # 암호가 없는 압축파일은 어떤 후보든 통과하므로 첫 번째 후보를 그대로 사용
+        return (candidates[0] if candidates else None), 0, False
+    for index, candidate in enumerate(candidates):
+        if check(archive_path, candidate):
+            return candidate, index, True
+    return (candidates[0] if candidates else None), -1, True
+
+async def choose_password(archive: dict, candidates: list) -> Optional[str]:
+    if "format" not in archive:
+        archive["format"] = await run_io(detect_format, archive["path"], archive["content_type"], archive["filename"])
+    started = time.perf_counter()
+    password, index, protected = await run_cpu(_select_password, archive["path"], archive["format"], candidates)
+    elapsed = time.perf_counter() - started
+    archive["password_protected"] = protected
+    archive["password_index"] = index
+    if not protected:
+        logger.info(f"🔓 암호 없는 압축파일 ({elapsed:.3f}s)")
+    elif index < 0:
+        logger.warning(f"🔑 비밀번호 후보 {len(candidates)}개 모두 불일치 ({elapsed:.3f}s) - 첫 후보로 해제 시도")
+    else:
+        logger.info(f"🔑 비밀번호 확인: 후보 {index + 1}/{len(candidates)}번째 일치 ({elapsed:.3f}s)")
+    return password
+
+# 📊 압축 해제 처리량 통계 (프로세스 누적)
+extraction_stats = {"archives": 0, "nested_archives": 0, "files": 0, "bytes": 0}
+
+# ✅ 준비된 압축파일 재귀 해제/멤버 해시 (CPU 풀)
+# 반환: {"extracted_files": [...], "levels": [단계별 처리 시간/개수], "archive": {원본 sha256, size, format}}
+async def extract_archive(archive: dict, password: str = None) -> dict:
+    try:
+        fmt = archive.get("format") or await run_io(detect_format, archive["path"], archive["content_type"], archive["filename"])
+        result = await run_cpu(extract_recursive, archive["path"], archive["temp_dir"], password, fmt)
+        extraction_stats["archives"] += 1
+        extraction_stats["nested_archives"] += sum(level["nested_archives"] for level in result["levels"])
+        extraction_stats["files"] += len(result["extracted_files"])
+        extraction_stats["bytes"] += sum(level["bytes"] for level in result["levels"])
+        result["archive"] = {
+            "sha256": archive["sha256"],
+            "size": archive["size"],
+            "format": fmt,
+            "cache_hit": archive["cache_hit"],
+            "download_elapsed_s": archive["elapsed_s"],
+            "download_throughput_mbps": archive["throughput_mbps"],
+        }
+        return result
+
+    except (ExtractionLimitError, UnsupportedFormatError) as e:
+        # 실패 사유 집계(EXTRACTION_LIMIT / UNSUPPORTED_FORMAT)를 위해 예외 유형을 그대로 전달
+        logger.error(f"[압축 해제 실패] {str(e)}")
+        raise
+
+    except Exception as e:
+        logger.error(f"[압축 해제 실패] {str(e)}")
+        raise Exception(f"[압축 해제 실패] {str(e)}") from e
+
+# ✅ 내부 해제 함수: 다운로드(또는 캐시) → 재귀 해제/멤버 해시
+async def extract_file(download_link: str, password: str = None, probe: dict = None):
+    async with open_archive(download_link, probe) as archive:
+        return await extract_archive(archive, password)
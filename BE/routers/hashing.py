@@ -0,0 +1,167 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import deque
+
+from routers.executors import hash_pool
+
+logger = logging.getLogger(__name__)
+
+# ✅ 해시 설정 (환경 변수로 조정 가능)
+HASH_CHUNK_SIZE = int(os.getenv("HASH_CHUNK_SIZE", str(1024 * 1024)))
+# 동시에 해시하는 멤버 수 상한 (멤버당 HASH_CHUNK_SIZE 버퍼 + 압축 해제기 메모리 사용)
+MEMBER_HASH_CONCURRENCY = int(os.getenv("MEMBER_HASH_CONCURRENCY", "4"))
+# 해시하면서 함께 보관하는 앞부분 크기 (중첩 압축파일 판별용, tar 서명이 257 바이트 위치)
+HEAD_SIZE = 512
+
+
+class ExtractionLimitError(Exception):
+    pass
+
+
+# 🛡️ 압축 해제 예산: 읽은 바이트/멤버 수를 청크마다 누적하고 제한을 넘는 즉시 ExtractionLimitError
+# - 헤더에 크기가 없는 포맷(tar/gz/bz2/xz)도 해제 도중에 멈추도록 hash_stream / 멤버 복사에서 호출
+# - child(): 압축파일 1개 단위 예산 (부모 예산에도 함께 누적, 압축 크기 대비 압축률 검사)
+# - 병렬 해시 스레드에서 동시에 호출되므로 잠금 사용
+class ExtractionBudget:
+    def __init__(self, max_bytes: int = None, max_members: int = None, parent: "ExtractionBudget" = None,
+                 compressed_size: int = 0, max_ratio: float = None, ratio_min_size: int = 0, label: str = ""):
+        self.max_bytes = max_bytes
+        self.max_members = max_members
+        self.parent = parent
+        self.compressed_size = compressed_size
+        self.max_ratio = max_ratio
+        self.ratio_min_size = ratio_min_size
+        self.label = label
+        self.bytes = 0
+        self.members = 0
+        self._lock = threading.Lock()
+
+    def child(self, compressed_size: int, max_ratio: float, ratio_min_size: int, label: str = "") -> "ExtractionBudget":
+        return ExtractionBudget(parent=self, compressed_size=compressed_size, max_ratio=max_ratio,
+                                ratio_min_size=ratio_min_size, label=label)
+
+    def charge(self, n: int):
+        with self._lock:
+            self.bytes += n
+            total = self.bytes
+        if self.max_bytes is not None and total > self.max_bytes:
+            raise ExtractionLimitError(f"총 해제 크기 제한 초과{self.label}: {total} bytes 이상 > {self.max_bytes} bytes")
+        if self.max_ratio and self.compressed_size and total >= self.ratio_min_size \
+                and total / self.compressed_size > self.max_ratio:
+            raise ExtractionLimitError(f"압축률 제한 초과{self.label}: {total / self.compressed_size:.0f}배 이상")
+        if self.parent is not None:
+            self.parent.charge(n)
+
+    def count_member(self):
+        with self._lock:
+            self.members += 1
+            count = self.members
+        if self.max_members is not None and count > self.max_members:
+            raise ExtractionLimitError(f"멤버 수 제한 초과: {count}개 > {self.max_members}개")
+        if self.parent is not None:
+            self.parent.count_member()
+
+
+# ✅ 파일 객체를 끝까지 읽으며 SHA-256 계산 (재사용 버퍼 사용) → (digest, size, 앞부분 HEAD_SIZE 바이트)
+# budget 이 있으면 청크마다 누적해 제한을 넘는 즉시 중단
+def hash_stream(fobj, buf: bytearray, budget: ExtractionBudget = None) -> tuple[str, int, bytes]:
+    sha256_hash = hashlib.sha256()
+    view = memoryview(buf)
+    size = 0
+    head = b""
+    readinto = getattr(fobj, "readinto", None)
+    while True:
+        if readinto is not None:
+            n = readinto(buf)
+            if not n:
+                break
+            sha256_hash.update(view[:n])
+            if len(head) < HEAD_SIZE:
+                head += bytes(view[:HEAD_SIZE - len(head)])
+        else:
+            block = fobj.read(len(buf))
+            if not block:
+                break
+            n = len(block)
+            sha256_hash.update(block)
+            if len(head) < HEAD_SIZE:
+                head += block[:HEAD_SIZE - len(head)]
+        size += n
+        if budget is not None:
+            budget.charge(n)
+    return sha256_hash.hexdigest(), size, head
+
+
+# ✅ 파일 전체 SHA-256 계산 → (digest, size)
+def hash_file(path: str) -> tuple[str, int]:
+    with open(path, "rb") as f:
+        digest, size, _ = hash_stream(f, bytearray(HASH_CHUNK_SIZE))
+    return digest, size
+
+
+# ✅ 멤버 해시를 해시 풀에서 병렬 계산 (입력 순서 유지, 동시 처리 멤버 수 제한)
+def hash_members_parallel(members: list, hash_one) -> list[dict]:
+    if len(members) <= 1 or MEMBER_HASH_CONCURRENCY <= 1:
+        return [hash_one(m) for m in members]
+
+    pool = hash_pool()
+    results = []
+    pending = deque()
+    for member in members:
+        pending.append(pool.submit(hash_one, member))
+        if len(pending) >= MEMBER_HASH_CONCURRENCY:
+            results.append(pending.popleft().result())
+    while pending:
+        results.append(pending.popleft().result())
+    return results
+
+
+# ✅ 스레드별 해시 버퍼 / 압축파일 핸들 (병렬 해시 시 핸들을 공유하지 않기 위함)
+class ThreadLocalReaders:
+    def __init__(self, opener=None):
+        self._opener = opener
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._handles = []
+
+    def buffer(self) -> bytearray:
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = bytearray(HASH_CHUNK_SIZE)
+        return buf
+
+    def handle(self):
+        handle = getattr(self._local, "handle", None)
+        if handle is None:
+            handle = self._local.handle = self._opener()
+            with self._lock:
+                self._handles.append(handle)
+        return handle
+
+    def close(self):
+        for handle in self._handles:
+            handle.close()
+
+
+# ✅ 디스크에 풀린 파일들의 SHA-256 계산 (디스크 방식)
+# 결과의 "_head" 는 중첩 압축파일 판별용 앞부분 바이트 (응답에 포함하기 전에 제거)
+def hash_files_on_disk(base_dir: str, file_list: list[str], budget: ExtractionBudget = None) -> list[dict]:
+    readers = ThreadLocalReaders()
+
+    def hash_extracted_file(file_name):
+        file_path = os.path.join(base_dir, file_name)
+        if budget is not None:
+            budget.count_member()
+        with open(file_path, "rb") as f:
+            digest, size, head = hash_stream(f, readers.buffer(), budget)
+        return {
+            "file_name": file_name,
+            "sha256": digest,
+            "size": size,
+            "_head": head
+        }
+
+    file_list = [n for n in file_list if os.path.isfile(os.path.join(base_dir, n))]
+    return hash_members_parallel(file_list, hash_extracted_file)
@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from routers.executors import run_io
+
+logger = logging.getLogger(__name__)
+
+# ✅ LLM 추론 결과 캐시 설정 (환경 변수로 조정 가능)
+INFERENCE_CACHE_PATH = os.getenv("INFERENCE_CACHE_PATH", os.path.abspath("./data/inference_cache.sqlite3"))  # 비어 있으면 디스크 계층 비활성화
+INFERENCE_CACHE_MEMORY_SIZE = int(os.getenv("INFERENCE_CACHE_MEMORY_SIZE", "4096"))
+INFERENCE_CACHE_TTL = int(os.getenv("INFERENCE_CACHE_TTL", str(7 * 24 * 3600)))  # 0 이면 캐시 사용 안 함
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+# 🧹 게시글 정규화: 유니코드 호환 문자 통일(NFKC) + 공백 정리 (줄바꿈/띄어쓰기만 다른 게시글은 같은 키)
+def normalize_post_text(post_text: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", post_text)).strip()
+
+
+# 🔑 (정규화된 본문, 모델, 프롬프트 버전, temperature) → 캐시 키
+def inference_key(post_text: str, model: str, prompt_version: str, temperature: float) -> str:
+    raw = "\0".join([normalize_post_text(post_text), model, prompt_version, f"{temperature:g}"])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# 🗄️ ClovaX / LLaMA 공용 추론 결과 캐시 (메모리 LRU + SQLite 2계층)
+# temperature 가 0 이 아니면 같은 입력에도 답이 달라지므로(한 번 뽑힌 답을 TTL 동안 고정하게 됨) 캐시하지 않음
+class InferenceCache:
+    def __init__(
+        self,
+        db_path: str = INFERENCE_CACHE_PATH,
+        memory_size: int = INFERENCE_CACHE_MEMORY_SIZE,
+        ttl: int = INFERENCE_CACHE_TTL,
+    ):
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, dict] = OrderedDict()
+        self._conn = None
+        self.stats: dict[str, dict] = {}
+
+        if db_path and ttl > 0:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS inferences (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+            logger.info(f"🗄️ 추론 결과 캐시 디스크 계층 사용: {db_path}")
+
+    def _count(self, model: str, field: str, amount: float = 1):
+        counters = self.stats.setdefault(model, {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "uncacheable": 0, "empty": 0, "stores": 0, "saved_seconds": 0.0,
+        })
+        counters[field] += amount
+
+    def _remember(self, key: str, entry: dict):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str, model: str) -> Optional[dict]:
+        if self.ttl <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry["expires_at"] > now:
+                    self._memory.move_to_end(key)
+                    self._count(model, "memory_hits")
+                    return entry
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute("SELECT answer, expires_at FROM inferences WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if row[1] > now:
+                        entry = {"answer": row[0], "expires_at": row[1], "elapsed_s": 0.0}
+                        self._remember(key, entry)
+                        self._count(model, "disk_hits")
+                        return entry
+                    self._conn.execute("DELETE FROM inferences WHERE key = ?", (key,))
+                    self._conn.commit()
+
+            self._count(model, "misses")
+            return None
+
+    def put(self, key: str, model: str, answer: str, elapsed_s: float = 0.0):
+        if self.ttl <= 0:
+            return
+        entry = {"answer": answer, "expires_at": time.time() + self.ttl, "elapsed_s": elapsed_s}
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO inferences (key, model, answer, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, model, answer, entry["expires_at"]),
+                )
+                self._conn.commit()
+            self._count(model, "stores")
+
+    # ⚡ 캐시 조회 → 없으면 compute() 실행 후 저장 (bypass 이면 캐시를 읽지 않고 새 결과로 갱신)
+    # 샘플링(temperature > 0) 답변은 읽지도 저장하지도 않고 매번 compute()
+    # 빈 답변은 엔진 라우터가 실패로 보므로 저장하지 않음 (다음 요청에서 다시 추론)
+    async def cached(
+        self,
+        post_text: str,
+        model: str,
+        prompt_version: str,
+        temperature: float,
+        compute: Callable[[], Awaitable[str]],
+        bypass: bool = False,
+    ) -> str:
+        if temperature > 0:
+            self._count(model, "uncacheable")
+            return await compute()
+
+        key = inference_key(post_text, model, prompt_version, temperature)
+        if bypass:
+            self._count(model, "bypassed")
+        else:
+            entry = await run_io(self.get, key, model)
+            if entry is not None:
+                self._count(model, "saved_seconds", entry["elapsed_s"])
+                logger.info(f"♻️ [{model}] 추론 캐시 적중: {entry['answer']}")
+                return entry["answer"]
+
+        started = time.perf_counter()
+        answer = await compute()
+        if not answer or not answer.strip():
+            self._count(model, "empty")
+            return answer
+        await run_io(self.put, key, model, answer, time.perf_counter() - started)
+        return answer
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            models = {}
+            for model, counters in self.stats.items():
+                hits = counters["memory_hits"] + counters["disk_hits"]
+                lookups = hits + counters["misses"]
+                models[model] = {
+                    **counters,
+                    "saved_seconds": round(counters["saved_seconds"], 3),
+                    "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                }
+            disk_entries = None
+            if self._conn is not None:
+                disk_entries = self._conn.execute("SELECT COUNT(*) FROM inferences").fetchone()[0]
+            return {
+                "models": models,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "ttl_seconds": self.ttl,
+            }
+
+
+# ✅ 프로세스 공용 캐시 인스턴스
+inference_cache = InferenceCache()
@@ -1,32 +1,62 @@
-from fastapi import APIRouter, HTTPException, Request, Depends, Path
+from fastapi import APIRouter, HTTPException, Depends, Path, Query, Header
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+from contextlib import AsyncExitStack
+import asyncio
+import json
 import logging
+import os
+import time
 
-from routers.clovax_analyze import analyze_with_clovax
-from routers.file_extract import extract_file
+from routers.auth import verify_api_key
+from routers.engine_router import engine_router, NoEngineAnswerError
+from routers.file_extract import open_archive, extract_archive, choose_password, ExtractionLimitError
+from routers.password_extractor import password_candidates, answer_candidates
+from routers.downloader import probe_download, download_stats_snapshot, DownloadError
+from routers.download_cache import download_cache
+from routers.result_store import result_store, result_key
+from routers.inference_cache import inference_cache
 from routers.vt_analyzer import analyze_hashes_with_virustotal as analyze_with_virustotal
+from routers.vt_client import VTClientError, VTRateLimitedError
+from routers.archive_formats import UnsupportedFormatError
 from routers.risk_grader import grade_virustotal_results
-from routers.output_sender import send_output_data
+from routers.output_sender import send_output_data, webhook_dispatcher, callback_url_error
+from routers.pipeline_dag import run_dag, PipelineShortCircuit, stage_stats_snapshot
+from routers.result_channel import result_channel
+from routers.executors import run_io
+from routers.job_queue import (
+    JobStore, JobQueue, QueueFullError, JOB_DB_PATH,
+    JOB_QUEUED, JOB_PROBING, JOB_INFERRING, JOB_EXTRACTING, JOB_SCANNING, JOB_GRADED, JOB_FAILED,
+    TERMINAL_STATES,
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# ✅ API Key 검증 함수
-def verify_api_key(request: Request):
-    auth_header = request.headers.get("authorization")
-    logger.info(f"[AUTH] 받은 인증 헤더: {auth_header}")
-    if auth_header != "API KEY":
-        raise HTTPException(
-            status_code=403,
-            detail="❌ 유효하지 않은 API Key입니다. Swagger 상단 Authorize 버튼에 정확한 키값을 입력하세요."
-        )
+# ✅ 결과 대기/스트림 설정 (환경 변수로 조정 가능)
+RESULT_WAIT_MAX = float(os.getenv("RESULT_WAIT_MAX", "60"))  # 롱폴링 1회 최대 대기 시간(초)
+RESULT_STREAM_KEEPALIVE = float(os.getenv("RESULT_STREAM_KEEPALIVE", "15"))  # SSE 연결 유지용 주석 전송 간격(초)
+RESULT_STREAM_POLL_INTERVAL = float(os.getenv("RESULT_STREAM_POLL_INTERVAL", "1"))  # 다른 워커가 발행한 결과 확인 간격(초)
+
+# 📋 작업 상태별 안내 메시지
+JOB_MESSAGES = {
+    JOB_QUEUED: "분석 대기 중입니다.",
+    JOB_PROBING: "다운로드 링크의 크기와 형식을 확인하는 중입니다.",
+    JOB_INFERRING: "게시글에서 비밀번호를 추론하는 중입니다.",
+    JOB_EXTRACTING: "파일을 다운로드하고 압축을 해제하는 중입니다.",
+    JOB_SCANNING: "VirusTotal 해시 분석 중입니다.",
+    JOB_GRADED: "분석이 완료되었습니다.",
+    JOB_FAILED: "분석에 실패했습니다.",
+}
 
 # 📥 입력 데이터 모델
 class InputData(BaseModel):
     post_id: int
     post_text: str
     download_link: str
+    force_refresh: bool = False  # true 이면 이전 분석 결과/추론 캐시를 재사용하지 않고 다시 분석
+    callback_url: Optional[str] = None  # 분석이 끝나면 결과를 POST 로 받을 FE 주소 (응답을 기다리며 연결을 붙잡지 않아도 됨)
 
 # 📤 출력 데이터 모델
 class OutputData(BaseModel):
@@ -38,34 +68,108 @@ class OutputData(BaseModel):
     malicious_count: int
     total_files: int
 
-# 📌 게시글 수신 → 분석 전체 파이프라인
-@router.post("/receive", dependencies=[Depends(verify_api_key)], summary="게시글 수신 및 전체 분석 파이프라인 실행")
-async def receive_input(data: InputData):
+# 📤 작업 등록 응답 모델 (202, 결과를 기다리지 않을 때)
+class JobAccepted(BaseModel):
+    job_id: str
+    post_id: int
+    status: str
+    status_url: str
 
-    try:
-        logger.info(f"[1단계] 게시글 수신 완료 - ID: {data.post_id}")
+# 📊 파이프라인 처리 결과 / 실패 사유별 횟수 (프로세스 누적)
+pipeline_counts = {"completed": 0, "memoized": 0, "failed": 0}
+pipeline_failures: dict[str, int] = {}
+
+# 🏷️ 예외 → 실패 사유 코드 (다운로드 실패는 다운로드 실패 코드 그대로)
+def _failure_reason(e: Exception) -> str:
+    if isinstance(e, DownloadError):
+        return e.code
+    if isinstance(e, VTRateLimitedError):
+        return "VT_RATE_LIMITED"
+    if isinstance(e, VTClientError):
+        return "VT_ERROR"
+    if isinstance(e, ExtractionLimitError):
+        return "EXTRACTION_LIMIT"
+    if isinstance(e, UnsupportedFormatError):
+        return "UNSUPPORTED_FORMAT"
+    if isinstance(e, NoEngineAnswerError):
+        return "NO_PASSWORD_ANSWER"
+    if isinstance(e, HTTPException):
+        return f"HTTP_{e.status_code}"
+    return "OTHER"
+
+# 📋 단계 시작 시 표시할 작업 상태 (다운로드와 추론은 동시에 진행되므로 나중에 시작한 단계가 표시됨)
+STAGE_STATUS = {
+    "probe": JOB_PROBING,
+    "infer": JOB_INFERRING,
+    "download": JOB_EXTRACTING,
+    "scan": JOB_SCANNING,
+}
+
+# 📌 게시글 1건에 대한 분석 파이프라인 (작업 큐 워커에서 실행)
+# 단계 의존성: probe → (infer ∥ download) → password → extract → scan → grade
+# - 사전 점검에서 거부될 입력이면 LLM 호출/다운로드 전에 바로 중단
+# - 비밀번호 추론과 다운로드는 서로 독립이므로 동시에 진행하고, 둘 다 끝나면 비밀번호 확인/해제 시작
+async def run_pipeline(job_id: str, payload: dict) -> dict:
+    data = InputData(**payload)
+    timings: dict = {}
+
+    async def probe_stage(r):
+        logger.info(f"[1단계] 게시글 수신 완료 - ID: {data.post_id}, job_id: {job_id}")
+        return await probe_download(data.download_link)
+
+    async def infer_stage(r):
+        logger.info("[2단계] 비밀번호 추론 시작")
+        inference = await engine_router.infer(data.post_text, bypass_cache=data.force_refresh)
+        logger.info(f"[2단계] {inference['engine']} 추론 완료: {inference['password']}")
+        return inference
 
-        logger.info("[2단계] ClovaX 추론 시작")
-        inferred_password = await analyze_with_clovax(data.post_text)
-        logger.info(f"[2단계] ClovaX 추론 완료: {inferred_password}")
+    async def download_stage(r):
+        logger.info("[3단계] 다운로드 시작 (추론과 동시 진행)")
+        return await stack.enter_async_context(open_archive(data.download_link, probe=r["probe"]))
 
+    async def password_stage(r):
+        archive, inference = r["download"], r["infer"]
+        inferred_password = inference["password"]
+        candidates = password_candidates(data.post_text, inferred_password)
+        password = await choose_password(archive, candidates)
+        if archive["password_protected"]:
+            # 🎯 암호가 걸린 파일만 추론 엔진 정답 여부를 기록 (엔진 라우터 accuracy 정책에 반영)
+            correct = archive["password_index"] >= 0 and password in answer_candidates(inferred_password)
+            engine_router.record_outcome(inference["engine"], correct)
+
+        # ♻️ 같은 파일 + 같은 비밀번호를 같은 등급 기준으로 이미 분석했으면 이전 결과를 그대로 반환
+        memo_key = result_key(archive["sha256"], password)
+        if not data.force_refresh:
+            memoized = await run_io(result_store.get, memo_key)
+            if memoized is not None:
+                memoized["post_id"] = data.post_id
+                logger.info(f"[♻️ 이전 분석 결과 재사용] 원본 sha256={archive['sha256']}")
+                raise PipelineShortCircuit(memoized)
+        return {"password": password, "memo_key": memo_key}
+
+    async def extract_stage(r):
         logger.info("[3단계] 압축 해제 시작")
-        extracted_files = extract_file(data.download_link, password=inferred_password)
+        extraction = await extract_archive(r["download"], password=r["password"]["password"])
+        logger.info(f"[3단계] 압축 해제 완료 - 단계별 처리: {extraction['levels']}")
+        return extraction
 
+    async def scan_stage(r):
         logger.info("[4단계] VirusTotal 해시 분석 시작")
+        extracted_files = r["extract"]["extracted_files"]
         sha256_list = [f["sha256"] for f in extracted_files if isinstance(f, dict) and "sha256" in f]
         for f in extracted_files:
             if not isinstance(f, dict) or "sha256" not in f:
                 logger.warning(f"❗ SHA256 정보가 누락된 항목: {f}")
         if not sha256_list:
             raise Exception("해시 리스트가 비어 있습니다.")
+        return {"sha256_list": sha256_list, "vt_results": await analyze_with_virustotal(sha256_list)}
 
-        vt_results = analyze_with_virustotal(sha256_list)
-
+    async def grade_stage(r):
         logger.info("[5단계] 위험도 등급 평가 시작")
-        risk_results = grade_virustotal_results(vt_results)
+        risk_results = grade_virustotal_results(r["scan"]["vt_results"])
 
         logger.info("[6단계] 최종 응답 처리 시작")
+        sha256_list = r["scan"]["sha256_list"]
         sha256 = sha256_list[0] if sha256_list else ""
         level = risk_results["level"]
         output_payload = OutputData(
@@ -78,12 +182,126 @@ async def receive_input(data: InputData):
             total_files=risk_results["total_files"]
         )
 
-        return send_output_data(output_payload)
+        result = send_output_data(output_payload)
+        await run_io(result_store.put, r["password"]["memo_key"], r["download"]["sha256"], result)
+        logger.info(f"[✅ FE 전송 결과] {result}")
+        return result
+
+    stages = {
+        "probe": ((), probe_stage),
+        "infer": (("probe",), infer_stage),
+        "download": (("probe",), download_stage),
+        "password": (("download", "infer"), password_stage),
+        "extract": (("password",), extract_stage),
+        "scan": (("extract",), scan_stage),
+        "grade": (("scan",), grade_stage),
+    }
+
+    async def on_stage_start(name: str):
+        if name in STAGE_STATUS:
+            await run_io(job_store.update, job_id, STAGE_STATUS[name])
+
+    try:
+        # 다운로드한 압축파일(임시 디렉토리/캐시 고정)은 모든 단계가 끝난 뒤 정리
+        async with AsyncExitStack() as stack:
+            try:
+                results = await run_dag(stages, timings=timings, on_start=on_stage_start)
+                pipeline_counts["completed"] += 1
+                return results["grade"]
+            except PipelineShortCircuit as done:
+                pipeline_counts["memoized"] += 1
+                return done.result
 
     except Exception as e:
+        reason = _failure_reason(e)
+        pipeline_counts["failed"] += 1
+        pipeline_failures[reason] = pipeline_failures.get(reason, 0) + 1
         logger.error(f"[❌ 예외 발생] 게시글 처리 실패 - ID: {data.post_id}")
         logger.error(str(e))
-        raise HTTPException(status_code=500, detail=str(e))
+        raise
+
+    finally:
+        await run_io(job_store.set_timings, job_id, timings)
+        logger.info(f"⏱️ 단계별 처리 시간 - ID: {data.post_id}, {timings}")
+
+
+# ⚙️ 작업 저장소 및 워커 풀 (main.py 의 startup/shutdown 이벤트에서 시작/종료)
+job_store = JobStore(JOB_DB_PATH)
+
+
+# 📣 작업 종료 시 결과 채널 발행 + 결과 콜백 전송 대기열 등록
+async def _on_job_finish(job: dict):
+    await result_channel.publish(job)
+    await webhook_dispatcher.enqueue_job(job)
+
+
+job_queue = JobQueue(job_store, run_pipeline, on_finish=_on_job_finish)
+
+
+def _job_view(job: dict) -> dict:
+    view = {
+        "job_id": job["job_id"],
+        "post_id": job["post_id"],
+        "status": job["status"],
+        "message": JOB_MESSAGES.get(job["status"], ""),
+    }
+    if job["result"] is not None:
+        view["result"] = job["result"]
+    if job["error"] is not None:
+        view["error"] = job["error"]
+    if job.get("timings"):
+        view["timings"] = job["timings"]
+    return view
+
+
+# 📌 게시글 수신 → 분석 작업 등록
+# - 기본: 분석 완료까지 기다렸다가 최종 결과 반환 (200, WordPress 플러그인 등 기존 동기 클라이언트 호환)
+# - wait=false 또는 callback_url 지정 시: 작업 ID 와 함께 202 즉시 반환 (결과는 상태 조회/롱폴링/콜백으로 수신)
+@router.post(
+    "/receive",
+    status_code=200,
+    response_model=OutputData,
+    responses={
+        200: {"description": "분석 완료 - 최종 결과 (wait=true, callback_url 이 없을 때 기본)"},
+        202: {"model": JobAccepted, "description": "작업 등록 완료 - 결과는 상태 조회/롱폴링/콜백으로 수신 (wait=false 또는 callback_url 지정)"},
+    },
+    dependencies=[Depends(verify_api_key)],
+    summary="게시글 수신 및 분석 작업 등록"
+)
+async def receive_input(
+    data: InputData,
+    wait: Optional[bool] = Query(None, description="false 이면 작업 등록 후 202 즉시 반환 (기본값: callback_url 이 없으면 true)")
+):
+    if data.callback_url:
+        url_error = callback_url_error(data.callback_url)
+        if url_error:
+            raise HTTPException(status_code=422, detail=url_error)
+    try:
+        job = await job_queue.submit(data.post_id, data.model_dump())
+    except QueueFullError as e:
+        logger.warning(f"⚠️ 작업 등록 거부 - ID: {data.post_id}, {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+    if wait is None:
+        wait = not data.callback_url
+    if not wait:
+        accepted = JobAccepted(
+            job_id=job["job_id"],
+            post_id=data.post_id,
+            status=job["status"],
+            status_url=f"/input-receiver/receive/result/{data.post_id}",
+        )
+        return JSONResponse(status_code=202, content=accepted.model_dump())
+
+    job_id = job["job_id"]
+    job = await job_queue.wait(job_id)
+    if job is None:
+        # 작업 기록이 저장소에서 사라진 경우 (DB 파일 교체/정리 등) → 결과를 알 수 없음
+        logger.error(f"[❌ 작업 기록 없음] job_id: {job_id}, post_id: {data.post_id}")
+        raise HTTPException(status_code=500, detail=f"작업 기록을 찾을 수 없습니다. (job_id: {job_id})")
+    if job["status"] == JOB_FAILED:
+        raise HTTPException(status_code=500, detail=job["error"])
+    return JSONResponse(status_code=200, content=job["result"])
 
 # 📤 게시글 처리 상태 조회 API
 @router.get(
@@ -97,12 +315,176 @@ def receive_result_status(
     """
     📤 게시글 처리 상태 조회 API
 
-    - 게시글 ID를 기반으로 처리 상태를 반환합니다.
-    - 현재는 예시 목적상 항상 "completed" 상태로 반환합니다.
-    - 향후 DB나 상태 캐시 연동 시 동적 상태 반환 가능.
+    - 게시글 ID로 가장 최근에 등록된 분석 작업의 상태를 반환합니다.
+    - 상태 값: queued / probing / inferring / extracting / scanning / graded / failed
+    - graded 상태이면 result 에 최종 응답, failed 상태이면 error 에 실패 사유가 포함됩니다.
     """
-    return {
-        "post_id": post_id,
-        "status": "completed",
-        "message": f"게시글 {post_id}에 대한 처리가 완료되었습니다."
-    }
+    job = job_store.latest_for_post(post_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"게시글 {post_id}에 대한 분석 작업이 없습니다.")
+    return _job_view(job)
+
+
+# ⏳ 게시글 처리 결과 롱폴링 API (로그 파일을 읽지 않고 완료 시점에 바로 결과 수신)
+@router.get(
+    "/receive/result/{post_id}/wait",
+    tags=["Input Receiver"],
+    summary="게시글 처리 결과 대기 (롱폴링)"
+)
+async def wait_result(
+    post_id: int = Path(..., description="결과를 기다릴 게시글 ID"),
+    job_id: Optional[str] = Query(None, description="기다릴 작업 ID (없으면 게시글의 가장 최근 작업)"),
+    timeout: float = Query(30, ge=0, description=f"최대 대기 시간(초, 최대 {RESULT_WAIT_MAX:g})"),
+):
+    """
+    ⏳ 게시글 처리 결과 롱폴링 API
+
+    - 작업이 graded / failed 로 끝나면 즉시, 아니면 timeout 초 뒤에 현재 상태를 반환합니다.
+    - 응답 형식은 처리 상태 조회 API 와 같으며, 끝나지 않은 상태가 오면 다시 호출하면 됩니다.
+    - 작업 저장소에 없는 게시글(다른 워커/재시작 전 작업)은 결과 채널의 마지막 결과를 반환합니다.
+    """
+    job = await run_io(job_store.get, job_id) if job_id else await run_io(job_store.latest_for_post, post_id)
+    if job is None or job["post_id"] != post_id:
+        record = await run_io(result_channel.latest, post_id)
+        if record is None or (job_id and record["job_id"] != job_id):
+            raise HTTPException(status_code=404, detail=f"게시글 {post_id}에 대한 분석 작업이 없습니다.")
+        return _job_view(record)
+
+    if job["status"] not in TERMINAL_STATES:
+        try:
+            job = await asyncio.wait_for(job_queue.wait(job["job_id"]), timeout=min(timeout, RESULT_WAIT_MAX))
+        except asyncio.TimeoutError:
+            job = await run_io(job_store.get, job["job_id"])
+    return _job_view(job)
+
+
+# 📡 분석 결과 스트림 (Server-Sent Events)
+# - 이벤트 id = 다음 레코드의 파일 오프셋 → 재연결 시 Last-Event-ID (또는 offset) 로 놓친 결과부터 이어받기
+# - 결과 파일을 꼬리 읽기 → 다른 워커 프로세스가 처리한 결과도 전달
+#   (이 프로세스의 발행은 바로 깨워서 읽고, 다른 워커의 발행은 RESULT_STREAM_POLL_INTERVAL 마다 파일 크기로 확인)
+@router.get(
+    "/results/stream",
+    dependencies=[Depends(verify_api_key)],
+    summary="분석 결과 스트림 (SSE)"
+)
+async def stream_results(
+    post_id: Optional[int] = Query(None, description="이 게시글의 결과만 받기 (없으면 전체)"),
+    offset: Optional[int] = Query(None, ge=0, description="이 오프셋 이후의 결과부터 재생 (없으면 새 결과만)"),
+    last_event_id: Optional[str] = Header(None),
+):
+    if last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+
+    def event(record: dict) -> str:
+        return f"id: {record['next_offset']}\ndata: {json.dumps(record, ensure_ascii=False)}\n\n"
+
+    def wanted(record: dict) -> bool:
+        return post_id is None or record["post_id"] == post_id
+
+    async def tail_file():
+        # 읽기 전에 먼저 구독해야 파일 확인과 대기 사이에 발행된 결과로도 깨어남
+        queue = result_channel.subscribe()
+        try:
+            position = offset if offset is not None else await run_io(result_channel.end_offset)
+            idle_since = time.monotonic()
+            while True:
+                records = await run_io(result_channel.read_from, position)
+                for record in records:
+                    position = record["next_offset"]
+                    if wanted(record):
+                        idle_since = time.monotonic()
+                        yield event(record)
+                if len(records) >= 1000:
+                    continue
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=RESULT_STREAM_POLL_INTERVAL)
+                    while not queue.empty():
+                        queue.get_nowait()
+                except asyncio.TimeoutError:
+                    pass
+                if time.monotonic() - idle_since >= RESULT_STREAM_KEEPALIVE:
+                    idle_since = time.monotonic()
+                    yield ": keepalive\n\n"
+        finally:
+            result_channel.unsubscribe(queue)
+
+    async def from_memory():
+        # 결과 파일 없이 메모리로만 운영하는 경우: 이 프로세스의 발행만 전달 (재생 불가)
+        queue = result_channel.subscribe()
+        try:
+            while True:
+                try:
+                    record = await asyncio.wait_for(queue.get(), timeout=RESULT_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if wanted(record):
+                    yield event(record)
+        finally:
+            result_channel.unsubscribe(queue)
+
+    events = tail_file if result_channel.path else from_memory
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+# 📊 결과 채널 통계 조회 (발행 수, 느린 구독자로 버려진 실시간 전달 수, 구독자 수)
+@router.get(
+    "/results/channel/stats",
+    dependencies=[Depends(verify_api_key)],
+    summary="분석 결과 채널 통계"
+)
+def result_channel_stats():
+    return result_channel.snapshot()
+
+
+# 📊 다운로드 처리량 / 다운로드 캐시 통계 조회
+@router.get(
+    "/download/stats",
+    dependencies=[Depends(verify_api_key)],
+    summary="다운로드 처리량 및 캐시 적중 통계"
+)
+def download_stats():
+    return {"download": download_stats_snapshot(), "cache": download_cache.snapshot()}
+
+
+# 📊 분석 결과 재사용 통계 조회
+@router.get(
+    "/results/stats",
+    dependencies=[Depends(verify_api_key)],
+    summary="이전 분석 결과 재사용 통계"
+)
+def result_store_stats():
+    return result_store.snapshot()
+
+
+
+# 📊 LLM 추론 캐시 통계 조회 (ClovaX / LLaMA 공용)
+@router.get(
+    "/inference/stats",
+    dependencies=[Depends(verify_api_key)],
+    summary="LLM 추론 캐시 적중 통계"
+)
+def inference_cache_stats():
+    return inference_cache.snapshot()
+
+
+# 📊 추론 엔진 라우터 통계 조회 (엔진별 지연시간/정답률, 폴백/헤지 횟수)
+@router.get(
+    "/engines/stats",
+    dependencies=[Depends(verify_api_key)],
+    summary="추론 엔진 라우터 통계"
+)
+def engine_router_stats():
+    return engine_router.snapshot()
+
+
+
+# 📊 파이프라인 단계별 처리 시간 통계 조회 (probe / infer / download / password / extract / scan / grade)
+@router.get(
+    "/pipeline/stats",
+    dependencies=[Depends(verify_api_key)],
+    summary="파이프라인 단계별 처리 시간 통계"
+)
+def pipeline_stats():
+    return {**pipeline_counts, "failures": pipeline_failures, "stages": stage_stats_snapshot()}
@@ -0,0 +1,329 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from routers.executors import run_io
+
+logger = logging.getLogger(__name__)
+
+# ✅ 작업 큐 설정 (환경 변수로 조정 가능)
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "100"))
+# 작업 상태 저장소 (여러 워커 프로세스가 같은 파일을 공유해 상태 조회/복구, 비어 있으면 프로세스 메모리에만 보관)
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.abspath("./data/jobs.sqlite3"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))  # 이 시간 동안 갱신되지 않은 미완료 작업은 다른 워커가 가져감
+JOB_WAIT_POLL_INTERVAL = float(os.getenv("JOB_WAIT_POLL_INTERVAL", "1"))  # 다른 워커가 처리 중인 작업 완료 확인 간격(초)
+
+# ✅ 작업 상태 값
+JOB_QUEUED = "queued"
+JOB_PROBING = "probing"
+JOB_INFERRING = "inferring"
+JOB_EXTRACTING = "extracting"
+JOB_SCANNING = "scanning"
+JOB_GRADED = "graded"
+JOB_FAILED = "failed"
+
+JOB_STATES = (JOB_QUEUED, JOB_PROBING, JOB_INFERRING, JOB_EXTRACTING, JOB_SCANNING, JOB_GRADED, JOB_FAILED)
+TERMINAL_STATES = (JOB_GRADED, JOB_FAILED)
+
+_COLUMNS = "job_id, post_id, status, payload, result, error, created_at, updated_at, timings"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _from_row(row) -> dict:
+    job_id, post_id, status, payload, result, error, created_at, updated_at, timings = row
+    return {
+        "job_id": job_id,
+        "post_id": post_id,
+        "status": status,
+        "payload": json.loads(payload) if payload else None,
+        "result": json.loads(result) if result else None,
+        "error": error,
+        "created_at": created_at,
+        "updated_at": updated_at,
+        "timings": json.loads(timings) if timings else None,
+    }
+
+
+# 🗂️ 작업 상태 저장소 (메모리, 또는 여러 워커 프로세스가 공유하는 SQLite)
+# - SQLite 사용 시 조회는 항상 DB 에서 읽음 → 다른 워커가 등록/처리한 작업도 조회 가능
+# - 미완료 작업마다 담당 프로세스(owner)와 임대 만료 시각(lease_until)을 기록, 담당 프로세스가 주기적으로 갱신
+class JobStore:
+    def __init__(self, db_path: str = "", lease_seconds: float = JOB_LEASE_SECONDS):
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._jobs: dict[str, dict] = {}
+        self._latest_by_post: dict[int, str] = {}
+        self._conn = None
+
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    post_id INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL,
+                    updated_at REAL,
+                    timings TEXT,
+                    owner TEXT,
+                    lease_until REAL
+                )
+                """
+            )
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")]
+            for column, kind in (("timings", "TEXT"), ("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_post ON jobs (post_id, created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, lease_until)")
+            self._conn.commit()
+            logger.info(f"🗂️ 작업 저장소 사용: {db_path} (담당 프로세스 {self.owner})")
+
+    @property
+    def shared(self) -> bool:
+        return self._conn is not None
+
+    def create(self, post_id: int, payload: dict) -> dict:
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "post_id": post_id,
+            "status": JOB_QUEUED,
+            "payload": payload,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "timings": None,
+        }
+        with self._lock:
+            if self._conn is None:
+                self._jobs[job["job_id"]] = job
+                self._latest_by_post[post_id] = job["job_id"]
+                return dict(job)
+            self._conn.execute(
+                f"INSERT INTO jobs ({_COLUMNS}, owner, lease_until) VALUES (?, ?, ?, ?, NULL, NULL, ?, ?, NULL, ?, ?)",
+                (job["job_id"], post_id, JOB_QUEUED, json.dumps(payload, ensure_ascii=False), now, now,
+                 self.owner, now + self.lease_seconds),
+            )
+            self._conn.commit()
+        return dict(job)
+
+    def update(self, job_id: str, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                job = self._jobs[job_id]
+                job["status"] = status
+                job["updated_at"] = now
+                if result is not None:
+                    job["result"] = result
+                if error is not None:
+                    job["error"] = error
+                return
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ?, result = COALESCE(?, result), error = COALESCE(?, error) WHERE job_id = ?",
+                (status, now, json.dumps(result, ensure_ascii=False) if result is not None else None, error, job_id),
+            )
+            self._conn.commit()
+
+    def set_timings(self, job_id: str, timings: dict):
+        with self._lock:
+            if self._conn is None:
+                self._jobs[job_id]["timings"] = timings
+                return
+            self._conn.execute("UPDATE jobs SET timings = ? WHERE job_id = ?", (json.dumps(timings), job_id))
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            if self._conn is None:
+                job = self._jobs.get(job_id)
+                return dict(job) if job else None
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return _from_row(row) if row else None
+
+    def latest_for_post(self, post_id: int) -> Optional[dict]:
+        with self._lock:
+            if self._conn is None:
+                job_id = self._latest_by_post.get(post_id)
+                return dict(self._jobs[job_id]) if job_id else None
+            row = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE post_id = ? ORDER BY created_at DESC LIMIT 1", (post_id,)
+            ).fetchone()
+        return _from_row(row) if row else None
+
+    # 🫀 이 프로세스가 맡은 미완료 작업의 임대 연장
+    def renew_leases(self):
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status NOT IN (?, ?)",
+                (time.time() + self.lease_seconds, self.owner, *TERMINAL_STATES),
+            )
+            self._conn.commit()
+
+    # 🔓 종료 시 맡은 미완료 작업의 임대를 바로 만료시켜 다른 워커/재시작한 서버가 이어받도록 함
+    def release_leases(self):
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_until = 0 WHERE owner = ? AND status NOT IN (?, ?)",
+                (self.owner, *TERMINAL_STATES),
+            )
+            self._conn.commit()
+
+    # 🔁 임대가 만료된(담당 프로세스가 죽은) 미완료 작업을 최대 limit 건 가져와 이 프로세스 담당으로 변경
+    # UPDATE ... RETURNING 한 문장으로 처리 → 여러 워커가 동시에 호출해도 한 작업은 한 워커만 가져감
+    def claim_expired(self, limit: int) -> list[dict]:
+        if self._conn is None or limit <= 0:
+            return []
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                UPDATE jobs SET owner = ?, lease_until = ?, status = ?, updated_at = ?
+                WHERE job_id IN (
+                    SELECT job_id FROM jobs
+                    WHERE status NOT IN (?, ?) AND (lease_until IS NULL OR lease_until < ?)
+                    ORDER BY created_at LIMIT ?
+                )
+                RETURNING {_COLUMNS}
+                """,
+                (self.owner, now + self.lease_seconds, JOB_QUEUED, now, *TERMINAL_STATES, now, limit),
+            ).fetchall()
+            self._conn.commit()
+        return [_from_row(row) for row in rows]
+
+
+# ⚙️ 제한된 크기의 프로세스 내 작업 큐 + 워커 풀
+class JobQueue:
+    def __init__(
+        self,
+        store: JobStore,
+        handler: Callable[[str, dict], Awaitable[dict]],
+        workers: int = PIPELINE_WORKERS,
+        maxsize: int = PIPELINE_QUEUE_SIZE,
+        on_finish: Optional[Callable[[dict], Awaitable[None]]] = None,
+    ):
+        self.store = store
+        self.handler = handler
+        self.on_finish = on_finish  # 작업이 graded/failed 로 끝날 때마다 최종 작업 정보로 호출 (결과 채널 발행 등)
+        self.workers = workers
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        self._waiters: dict[str, asyncio.Future] = {}
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        if self.store.shared:
+            self._tasks.append(asyncio.create_task(self._lease_loop()))
+        logger.info(f"⚙️ 작업 큐 시작 - 워커 {self.workers}개, 최대 대기 {self.maxsize}건")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await run_io(self.store.release_leases)
+        logger.info("🛑 작업 큐 종료")
+
+    # 🫀 임대 갱신 + 임대가 만료된 작업(죽은 워커/재시작 전 서버의 작업) 인수
+    async def _lease_loop(self):
+        while True:
+            try:
+                await run_io(self.store.renew_leases)
+                for job in await run_io(self.store.claim_expired, self.maxsize - self._queue.qsize()):
+                    if job["payload"] is None:
+                        await run_io(self.store.update, job["job_id"], JOB_FAILED, error="서버 재시작으로 작업 정보가 유실되었습니다.")
+                        continue
+                    logger.info(f"🔁 담당 워커가 없는 작업 인수 - job_id: {job['job_id']}, post_id: {job['post_id']}")
+                    self._queue.put_nowait(job["job_id"])
+            except Exception as e:
+                logger.error(f"[❌ 작업 임대 갱신 실패] {e}")
+            await asyncio.sleep(self.store.lease_seconds / 3)
+
+    async def submit(self, post_id: int, payload: dict) -> dict:
+        if self._queue is None:
+            raise RuntimeError("작업 큐가 시작되지 않았습니다.")
+        if self._queue.full():
+            raise QueueFullError(f"작업 큐가 가득 찼습니다. (최대 {self.maxsize}건)")
+
+        job = await run_io(self.store.create, post_id, payload)
+        try:
+            self._queue.put_nowait(job["job_id"])
+        except asyncio.QueueFull:
+            # 저장하는 사이 다른 요청이 큐를 채운 경우 → 만든 작업은 실패로 닫고 거부
+            message = f"작업 큐가 가득 찼습니다. (최대 {self.maxsize}건)"
+            await run_io(self.store.update, job["job_id"], JOB_FAILED, error=message)
+            raise QueueFullError(message)
+        logger.info(f"📥 작업 등록 - job_id: {job['job_id']}, post_id: {post_id}, 대기 {self._queue.qsize()}건")
+        return job
+
+    # ⏳ 작업 종료까지 대기 (이 프로세스 작업은 완료 즉시, 다른 워커가 처리 중인 작업은 저장소를 주기적으로 확인)
+    # 저장소에 작업이 없으면 None
+    async def wait(self, job_id: str) -> Optional[dict]:
+        while True:
+            job = await run_io(self.store.get, job_id)
+            if job is None or job["status"] in TERMINAL_STATES:
+                self._waiters.pop(job_id, None)
+                return job
+            future = self._waiters.get(job_id)
+            if future is None:
+                future = asyncio.get_running_loop().create_future()
+                self._waiters[job_id] = future
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout=JOB_WAIT_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                job = await run_io(self.store.get, job_id)
+                result = await self.handler(job_id, job["payload"])
+                await run_io(self.store.update, job_id, JOB_GRADED, result=result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[❌ 작업 실패] job_id: {job_id} - {e}")
+                await run_io(self.store.update, job_id, JOB_FAILED, error=str(e))
+            finally:
+                self._queue.task_done()
+                job = await run_io(self.store.get, job_id)
+                if self.on_finish is not None and job is not None and job["status"] in TERMINAL_STATES:
+                    try:
+                        await self.on_finish(job)
+                    except Exception as e:
+                        logger.error(f"[❌ 작업 완료 알림 실패] job_id: {job_id} - {e}")
+                future = self._waiters.pop(job_id, None)
+                if future is not None and not future.done():
+                    future.set_result(None)
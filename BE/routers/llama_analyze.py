@@ -1,7 +1,19 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+from typing import Optional
+import asyncio
 import logging
 import os
+import time
+
+from routers.auth import verify_api_key
+from routers.executors import run_io
+from routers.llama_batch import LlamaBatchDecoder, LLAMA_BATCHED_DECODE, batch_stats, batch_stats_snapshot
+from routers.llama_scheduler import LlamaInferenceQueue, LlamaQueueFullError, LLAMA_MAX_BATCH_SIZE
+from routers.inference_cache import inference_cache
+from routers.metrics import LatencyHistogram
+from routers.password_extractor import fast_password
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -9,62 +21,339 @@ logger = logging.getLogger(__name__)
 # ✅ LLaMA 모델 경로 (복사된 .gguf 파일 위치)
 model_path = os.path.abspath("./models/llama-2/llama-2-7b-chat.Q2_K.gguf")
 
-# ✅ LLaMA 모델 초기화
+# ✅ 추론 설정 (본문의 문자열을 그대로 골라내는 작업이므로 기본 temperature 0)
+# temperature 0 이면 같은 본문에 항상 같은 답 → 추론 캐시 사용, 0 보다 크면 매번 새로 추론 (캐시 안 함)
+LLAMA_MODEL = os.path.basename(model_path)
+LLAMA_PROMPT_VERSION = "1"  # 프롬프트를 바꾸면 올려서 이전 캐시 답변을 사용하지 않도록 함
+LLAMA_TEMPERATURE = float(os.getenv("LLAMA_TEMPERATURE", "0"))
+LLAMA_PREFIX_CACHE = os.getenv("LLAMA_PREFIX_CACHE", "1") == "1"  # 0 이면 매 요청 프롬프트 전체를 문자열로 전달 (비교 측정용)
+LLAMA_CONSTRAINED_OUTPUT = os.getenv("LLAMA_CONSTRAINED_OUTPUT", "1") == "1"  # 요청에 constrained 값이 없을 때의 기본 모드
+
+# ✅ 모델 로딩 설정
+LLAMA_USE_MMAP = os.getenv("LLAMA_USE_MMAP", "1") == "1"  # 가중치를 mmap 으로 열어 워커 프로세스 간 페이지 캐시 공유
+LLAMA_WARMUP_WAIT = float(os.getenv("LLAMA_WARMUP_WAIT", "0"))  # 로딩 중 요청이 완료를 기다릴 최대 시간(초), 0 이면 바로 503
+LLAMA_RETRY_AFTER = os.getenv("LLAMA_RETRY_AFTER", "10")  # 로딩 중 503 응답의 Retry-After(초)
+
+# ✅ 출력 문법 (GBNF): 공백/따옴표 없는 문자열 1개 + 줄바꿈 → 비밀번호 뒤 설명 문장 없이 바로 종료
+PASSWORD_GBNF = r"""
+root ::= password "\n"
+password ::= [^ \t\r\n"]+
+"""
+
+# ✅ 프롬프트: 예시 기반으로 유도 + 출력 강제 (고정 지시문/예시 = 접두부, 게시글 본문부터 = 접미부)
+PROMPT_PREFIX = """
+다음 문장에서 압축파일 비밀번호로 사용된 정확한 문자열을 그대로 출력해. 다른 말은 절대 하지 마.
+예시 입력: "비밀번호는 Yahoo123이야" → 출력: Yahoo123
+예시 입력: "압축파일 비밀번호는 8765야" → 출력: 8765
+예시 입력: \""""
+PROMPT_SUFFIX = """{post_text}" → 출력:
+"""
+
+# ✅ LLaMA 모델 (임포트 시점이 아니라 서버 시작 후 백그라운드에서 로딩 → 다른 API 는 즉시 응답 가능)
 llm = None
-try:
-    if os.path.exists(model_path):
+password_grammar = None
+batch_decoder: Optional[LlamaBatchDecoder] = None  # 대기열에서 함께 꺼낸 요청을 한 번에 디코딩 (없으면 한 건씩 생성)
+_process_started = time.time()
+_load_task: Optional[asyncio.Task] = None
+model_state = {
+    "status": "not_loaded",  # not_loaded → loading → ready / missing / failed
+    "error": None,
+    "load_seconds": None,
+    "time_to_ready_seconds": None,  # 프로세스(모듈 임포트) 시작부터 준비 완료까지
+    "rss_mb_before": None,
+    "rss_mb_after": None,
+}
+
+# 📏 현재 프로세스 상주 메모리(MB) - mmap 가중치는 워커 간 공유되는 파일 페이지로 잡힘
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+# 🧠 고정 접두부 KV 상태 스냅샷
+# - 시작 시 접두부를 한 번만 평가하고 save_state() 로 KV 캐시를 보관
+# - 요청마다 컨텍스트가 접두부로 시작하지 않으면 load_state() 로 복원 → 게시글 본문 토큰만 새로 평가
+# - 접두부/접미부를 따로 토큰화해 이어 붙이므로 경계에서 토큰이 달라져 재사용이 끊기지 않음
+prefix_tokens: list[int] = []
+prefix_state = None
+prefix_stats = {"requests": 0, "restores": 0, "prompt_tokens": 0, "evaluated_tokens": 0, "reused_tokens": 0}
+generation_latency = LatencyHistogram()  # 한 건씩 생성한 요청 1건의 llm() 실행 시간 (배치 디코딩은 batch_latency)
+
+def _prepare_prompt_prefix():
+    global prefix_tokens, prefix_state
+    if llm is None or not LLAMA_PREFIX_CACHE:
+        return
+    try:
+        started = time.perf_counter()
+        tokens = llm.tokenize(PROMPT_PREFIX.encode("utf-8"), add_bos=True)
+        llm.reset()
+        llm.eval(tokens)
+        prefix_state = llm.save_state()
+        prefix_tokens = tokens
+        logger.info(f"🧠 LLaMA 프롬프트 접두부 KV 스냅샷 완료: {len(tokens)} 토큰, {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        prefix_tokens, prefix_state = [], None
+        logger.warning(f"⚠️ LLaMA 접두부 스냅샷 실패 (매 요청 전체 프롬프트 평가): {e}")
+
+# ✅ 출력 문법 객체 (모델이 있을 때만 생성, 실패하면 기존 자유 생성 + 첫 줄 추출로 동작)
+def _prepare_grammar():
+    global password_grammar
+    try:
+        from llama_cpp import LlamaGrammar
+        password_grammar = LlamaGrammar.from_string(PASSWORD_GBNF, verbose=False)
+    except Exception as e:
+        logger.warning(f"⚠️ LLaMA 출력 문법 생성 실패 (자유 생성으로 동작): {e}")
+
+# ✅ 다중 시퀀스 배치 디코더 (별도 KV 캐시 컨텍스트, 실패하면 대기열 요청을 한 건씩 생성)
+def _prepare_batch_decoder():
+    global batch_decoder
+    if not LLAMA_BATCHED_DECODE or LLAMA_MAX_BATCH_SIZE < 2:
+        return
+    try:
+        started = time.perf_counter()
+        batch_decoder = LlamaBatchDecoder(llm, LLAMA_MAX_BATCH_SIZE)
+        batch_decoder.generate([], prefix_tokens)  # 공유 접두부를 미리 평가
+        logger.info(f"🧮 LLaMA 배치 디코더 준비 완료: 시퀀스 최대 {batch_decoder.max_sequences}개, "
+                    f"컨텍스트 {batch_decoder.n_ctx} 토큰, {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        batch_decoder = None
+        logger.warning(f"⚠️ LLaMA 배치 디코더 준비 실패 (대기열 요청을 한 건씩 생성): {e}")
+
+# 📦 모델 로딩 + 접두부 스냅샷 + 출력 문법 준비 (IO 풀 스레드에서 실행)
+def _load_model():
+    global llm
+    if not os.path.exists(model_path):
+        model_state["status"] = "missing"
+        logger.warning(f"❌ LLaMA 모델 경로가 존재하지 않음: {model_path}")
+        return
+
+    started = time.perf_counter()
+    model_state["rss_mb_before"] = _rss_mb()
+    try:
         from llama_cpp import Llama
         llm = Llama(
             model_path=model_path,
             n_ctx=1024,
-            n_threads=8
+            n_threads=8,
+            use_mmap=LLAMA_USE_MMAP,
         )
-        logger.info(f"✅ LLaMA 모델 로드 완료: {model_path}")
-    else:
-        logger.warning(f"❌ LLaMA 모델 경로가 존재하지 않음: {model_path}")
-except Exception as e:
-    logger.error(f"❌ LLaMA 초기화 실패: {e}")
+        _prepare_prompt_prefix()
+        _prepare_grammar()
+        _prepare_batch_decoder()
+    except Exception as e:
+        llm = None
+        model_state["status"] = "failed"
+        model_state["error"] = str(e)
+        logger.error(f"❌ LLaMA 초기화 실패: {e}")
+        return
+
+    model_state["load_seconds"] = round(time.perf_counter() - started, 2)
+    model_state["time_to_ready_seconds"] = round(time.time() - _process_started, 2)
+    model_state["rss_mb_after"] = _rss_mb()
+    model_state["status"] = "ready"
+    logger.info(f"✅ LLaMA 모델 로드 완료: {model_path} ({model_state['load_seconds']}s, RSS {model_state['rss_mb_after']}MB)")
+
+# 🚀 서버 시작 시 호출: 모델 로딩을 백그라운드 작업으로 시작하고 바로 반환
+async def start_model_loading():
+    global _load_task
+    if _load_task is None:
+        model_state["status"] = "loading"
+        _load_task = asyncio.create_task(run_io(_load_model))
+
+# ⏳ 모델 사용 가능 여부 확인 (로딩 중이면 LLAMA_WARMUP_WAIT 만큼 대기 후 503 + Retry-After)
+async def _ensure_model_ready():
+    if model_state["status"] == "loading" and _load_task is not None and LLAMA_WARMUP_WAIT > 0:
+        try:
+            await asyncio.wait_for(asyncio.shield(_load_task), LLAMA_WARMUP_WAIT)
+        except asyncio.TimeoutError:
+            pass
+
+    if model_state["status"] in ("not_loaded", "loading"):
+        raise HTTPException(
+            status_code=503,
+            detail="LLaMA 모델을 로딩 중입니다. 잠시 후 다시 시도하세요.",
+            headers={"Retry-After": LLAMA_RETRY_AFTER},
+        )
+    if llm is None:
+        raise HTTPException(
+            status_code=503,
+            detail="LLaMA 모델이 초기화되지 않았습니다. 서버에 모델 파일이 없거나 로딩에 실패했습니다."
+        )
+
+# 📝 게시글 → 모델 입력 (스냅샷이 있으면 토큰 목록, 없으면 기존처럼 문자열)
+def _build_prompt(post_text: str):
+    if prefix_state is None:
+        return PROMPT_PREFIX + PROMPT_SUFFIX.format(post_text=post_text)
+    return prefix_tokens + llm.tokenize(PROMPT_SUFFIX.format(post_text=post_text).encode("utf-8"), add_bos=False)
+
+# 🔁 요청 1건 실행: 필요하면 접두부 상태를 복원한 뒤 생성 (llama-cpp 는 현재 컨텍스트와 겹치는 앞부분 토큰을 다시 평가하지 않음)
+def _generate(request: dict) -> dict:
+    prompt = request["prompt"]
+    if isinstance(prompt, list):
+        history = list(llm._input_ids)
+        if history[:len(prefix_tokens)] != prefix_tokens:
+            llm.load_state(prefix_state)
+            history = list(prefix_tokens)
+            prefix_stats["restores"] += 1
+        reused = llm.longest_token_prefix(history, prompt[:-1])
+        prefix_stats["prompt_tokens"] += len(prompt)
+        prefix_stats["reused_tokens"] += reused
+        prefix_stats["evaluated_tokens"] += len(prompt) - reused
+    prefix_stats["requests"] += 1
+
+    started = time.perf_counter()
+    result = llm(**request)
+    generation_latency.observe(time.perf_counter() - started)
+
+    if not isinstance(prompt, list):
+        tokens = result.get("usage", {}).get("prompt_tokens", 0)
+        prefix_stats["prompt_tokens"] += tokens
+        prefix_stats["evaluated_tokens"] += tokens
+    return result
+
+# 🧮 배치 디코더 입력: 프롬프트는 토큰 목록으로, 출력 문법은 GBNF 문자열로 (시퀀스마다 문법 샘플러를 따로 만듦)
+def _batch_request(request: dict) -> dict:
+    prompt = request["prompt"]
+    if not isinstance(prompt, list):
+        prompt = llm.tokenize(prompt.encode("utf-8"), add_bos=True)
+    return {
+        "prompt": prompt,
+        "max_tokens": request["max_tokens"],
+        "stop": request["stop"],
+        "temperature": request["temperature"],
+        "grammar": PASSWORD_GBNF if request.get("grammar") is not None else None,
+    }
+
+# 🚦 대기열에서 함께 꺼낸 요청 실행 (워커 1개가 IO 풀 스레드에서 호출 → 두 컨텍스트 모두 동시에 쓰지 않음)
+# - 2건 이상이면 배치 디코더가 시퀀스별 seq_id 로 함께 디코딩 (접두부 KV 공유, llama_decode 1회에 시퀀스마다 토큰 1개)
+# - 1건이거나 배치 디코더가 없거나 배치 컨텍스트에 들어가지 않는 요청은 기존 컨텍스트에서 한 건씩 생성
+def _run_llama_group(requests: list[dict]) -> list[dict]:
+    results = [None] * len(requests)
+    if batch_decoder is not None and len(requests) > 1:
+        batch = [_batch_request(request) for request in requests]
+        try:
+            results = batch_decoder.generate(batch, prefix_tokens if prefix_state is not None else [])
+        except Exception as e:
+            batch_stats["errors"] += 1
+            logger.warning(f"⚠️ LLaMA 배치 디코딩 실패 (이번 묶음은 한 건씩 생성): {e}")
+            results = [None] * len(requests)
+        reused = len(prefix_tokens) if prefix_state is not None else 0
+        for request, result in zip(batch, results):
+            if result is not None:
+                prefix_stats["requests"] += 1
+                prefix_stats["prompt_tokens"] += len(request["prompt"])
+                prefix_stats["reused_tokens"] += reused
+                prefix_stats["evaluated_tokens"] += len(request["prompt"]) - reused
+    return [result if result is not None else _generate(request) for request, result in zip(requests, results)]
+
+llama_scheduler = LlamaInferenceQueue(_run_llama_group)
 
 # 📥 입력 모델
 class LLaMARequest(BaseModel):
     post_text: str
+    bypass_cache: bool = False
+    constrained: Optional[bool] = None  # None 이면 LLAMA_CONSTRAINED_OUTPUT 설정을 따름
+    bypass_fastpath: bool = False  # true 이면 규칙 기반 추출을 건너뛰고 항상 LLM 호출 (엔진/출력 모드 비교 측정용)
 
 # 📤 출력 모델
 class LLaMAResponse(BaseModel):
     password: str
 
-# 📡 API 라우트
-@router.post("/analyze", response_model=LLaMAResponse, summary="LLaMA LLM 비밀번호 추론")
-async def analyze_with_llama(request: LLaMARequest):
-    if llm is None:
-        raise HTTPException(
-            status_code=503,
-            detail="LLaMA 모델이 초기화되지 않았습니다. 서버에 모델 파일이 없거나 로딩에 실패했습니다."
-        )
+# 🔍 내부 분석 함수 (직접 호출용, 엔진 라우터에서 사용)
+async def analyze_with_llama(post_text: str, bypass_cache: bool = False, constrained: Optional[bool] = None,
+                             bypass_fastpath: bool = False) -> str:
+    # ⚡ 본문에 비밀번호가 명시된 경우는 규칙 기반으로 바로 반환 (모델 미로딩 상태에서도 응답 가능)
+    fast = None if bypass_fastpath else fast_password(post_text)
+    if fast is not None:
+        return fast["password"]
 
-    try:
-        # ✅ 프롬프트: 예시 기반으로 유도 + 출력 강제
-        prompt = f"""
-다음 문장에서 압축파일 비밀번호로 사용된 정확한 문자열을 그대로 출력해. 다른 말은 절대 하지 마.
-예시 입력: "비밀번호는 Yahoo123이야" → 출력: Yahoo123
-예시 입력: "압축파일 비밀번호는 8765야" → 출력: 8765
-예시 입력: "{request.post_text}" → 출력:
-"""
+    await _ensure_model_ready()
 
-        result = llm(
-            prompt=prompt,
-            max_tokens=32,
-            stop=["\n", "</s>", "출력:"],
-            temperature=0.3
-        )
+    constrained = LLAMA_CONSTRAINED_OUTPUT if constrained is None else constrained
+    constrained = constrained and password_grammar is not None
+    prompt_version = f"{LLAMA_PROMPT_VERSION}-gbnf" if constrained else LLAMA_PROMPT_VERSION
 
-        # ✅ 결과 전처리: 첫 줄만 추출
-        raw_answer = result["choices"][0]["text"].strip()
-        password = raw_answer.splitlines()[0].strip()
+    try:
+        return await inference_cache.cached(
+            post_text, LLAMA_MODEL, prompt_version, LLAMA_TEMPERATURE,
+            lambda: _infer_with_llama(post_text, constrained), bypass=bypass_cache,
+        )
 
-        logger.info(f"📌 LLaMA 추론 결과: {password}")
-        return LLaMAResponse(password=password)
+    except LlamaQueueFullError as e:
+        logger.warning(f"⚠️ {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
 
     except Exception as e:
         logger.error(f"❌ LLaMA 분석 실패: {e}")
         raise HTTPException(status_code=500, detail=f"LLaMA 분석 오류: {e}")
+
+# ✅ 엔진 라우터용: 모델 로딩이 끝나 바로 추론 가능한 상태인지
+def llama_available() -> bool:
+    return model_state["status"] == "ready" and llm is not None
+
+# 📡 API 라우트
+@router.post("/analyze", response_model=LLaMAResponse, summary="LLaMA LLM 비밀번호 추론")
+async def analyze_with_llama_api(request: LLaMARequest) -> LLaMAResponse:
+    password = await analyze_with_llama(
+        request.post_text, bypass_cache=request.bypass_cache, constrained=request.constrained,
+        bypass_fastpath=request.bypass_fastpath,
+    )
+    return LLaMAResponse(password=password)
+
+async def _infer_with_llama(post_text: str, constrained: bool = False) -> str:
+    request = {
+        "prompt": _build_prompt(post_text),
+        "max_tokens": 32,
+        "stop": ["\n", "</s>", "출력:"],
+        "temperature": LLAMA_TEMPERATURE,
+    }
+    if constrained:
+        request["grammar"] = password_grammar
+
+    # ✅ 추론은 대기열을 거쳐 IO 풀 스레드에서 실행하여 이벤트 루프를 막지 않음 (동시 요청은 함께 배치 디코딩)
+    result = await llama_scheduler.submit(request)
+
+    # ✅ 결과 전처리: 첫 줄만 추출 (문법 모드에서는 이미 한 줄짜리 비밀번호)
+    raw_answer = result["choices"][0]["text"].strip()
+    password = raw_answer.splitlines()[0].strip() if raw_answer else ""
+
+    logger.info(f"📌 LLaMA 추론 결과: {password}")
+    return password
+
+
+# 🩺 LLaMA 모델 준비 상태 (로드 밸런서/헬스체크용: 준비 완료 200, 그 외 503)
+@router.get("/ready", summary="LLaMA 모델 준비 상태")
+def llama_ready():
+    body = {**model_state, "rss_mb": _rss_mb(), "use_mmap": LLAMA_USE_MMAP}
+    if model_state["status"] == "ready":
+        return body
+    headers = {"Retry-After": LLAMA_RETRY_AFTER} if model_state["status"] in ("not_loaded", "loading") else None
+    return JSONResponse(status_code=503, content=body, headers=headers)
+
+
+# 📊 LLaMA 추론 대기열 / 배치 디코딩 통계 조회 (관리자용)
+@router.get("/scheduler/stats", summary="LLaMA 추론 대기열/배치 디코딩 통계", dependencies=[Depends(verify_api_key)])
+def llama_scheduler_stats():
+    return {
+        **llama_scheduler.snapshot(),
+        "batched_decode": {"enabled": batch_decoder is not None, **batch_stats_snapshot()},
+    }
+
+
+# 📊 프롬프트 접두부 재사용 통계 조회 (요청당 평가 토큰 수 / 생성 지연시간, LLAMA_PREFIX_CACHE=0 과 비교용)
+@router.get("/prefix-cache/stats", summary="LLaMA 프롬프트 접두부 재사용 통계", dependencies=[Depends(verify_api_key)])
+def llama_prefix_cache_stats():
+    requests = prefix_stats["requests"]
+    return {
+        **prefix_stats,
+        "enabled": prefix_state is not None,
+        "prefix_tokens": len(prefix_tokens),
+        "avg_prompt_tokens": round(prefix_stats["prompt_tokens"] / requests, 1) if requests else 0.0,
+        "avg_evaluated_tokens": round(prefix_stats["evaluated_tokens"] / requests, 1) if requests else 0.0,
+        "generation_latency_seconds": generation_latency.snapshot(),
+    }
@@ -0,0 +1,211 @@
+import logging
+import os
+import time
+from typing import Optional
+
+from routers.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# ✅ LLaMA 배치 디코딩 설정 (환경 변수로 조정 가능)
+LLAMA_BATCHED_DECODE = os.getenv("LLAMA_BATCHED_DECODE", "1") == "1"  # 0 이면 대기열에서 함께 꺼낸 요청도 한 건씩 생성
+# 배치 컨텍스트의 KV 캐시 크기(토큰) = 공유 접두부 + 함께 디코딩하는 시퀀스들의 (접미부 + 최대 생성 토큰) 합
+# 모델 기본 컨텍스트와 별도로 잡히므로 그만큼 메모리를 더 사용함 (7B f16 KV 기준 토큰당 약 0.5MB)
+LLAMA_BATCH_CTX = int(os.getenv("LLAMA_BATCH_CTX", "2048"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+# 📊 배치 디코딩 통계 (함께 디코딩한 시퀀스 수 / llama_decode 호출 수 / 평가·생성 토큰 수)
+batch_stats = {"batches": 0, "sequences": 0, "decode_calls": 0, "prompt_tokens": 0, "generated_tokens": 0,
+               "skipped": 0, "errors": 0}
+batch_sizes = LatencyHistogram(BATCH_SIZE_BUCKETS)  # 배치 1회에 함께 디코딩한 시퀀스 수
+batch_latency = LatencyHistogram()  # 배치 1회 (접미부 평가 + 생성 완료까지) 시간
+
+
+# 🧮 llama.cpp 다중 시퀀스 배치 디코더
+# - Llama 객체의 모델 가중치를 공유하는 별도 컨텍스트를 만들고 시퀀스마다 seq_id 를 따로 부여
+# - seq 0 에 고정 접두부를 한 번 평가해 두고, 시퀀스마다 llama_memory_seq_cp 로 KV 를 복사한 뒤 접미부만 평가
+# - 생성 단계는 llama_decode 1회에 진행 중인 시퀀스마다 토큰 1개씩 → 행렬 연산 1번으로 여러 요청을 함께 진행
+# - 샘플링은 시퀀스별 sampler chain (출력 문법 → greedy / top-k·top-p·min-p·temp), Llama.__call__ 기본값과 같은 구성
+# - Llama 객체와 마찬가지로 스레드 안전하지 않음 → 대기열 워커 1개에서만 호출
+class LlamaBatchDecoder:
+    def __init__(self, llm, max_sequences: int, n_ctx: int = LLAMA_BATCH_CTX):
+        import llama_cpp
+
+        if not hasattr(llama_cpp, "llama_get_memory"):
+            raise RuntimeError("설치된 llama-cpp-python 에 llama_memory_* API 가 없습니다 (배치 디코딩에는 더 최신 버전 필요)")
+        self._lib = llama_cpp
+        self.llm = llm
+        self.n_ctx = n_ctx
+        self.max_sequences = max(1, min(max_sequences, 63))  # seq 0 (접두부) 포함 llama.cpp 시퀀스 수 한도 이내
+
+        params = llama_cpp.llama_context_default_params()
+        params.n_ctx = n_ctx
+        params.n_batch = n_ctx
+        params.n_ubatch = min(n_ctx, 512)
+        params.n_seq_max = self.max_sequences + 1
+        params.n_threads = llm.n_threads
+        params.n_threads_batch = llm.n_threads_batch
+        params.kv_unified = True  # 시퀀스들이 긴 접두부를 공유하므로 KV 버퍼 하나를 같이 씀
+        self.ctx = llama_cpp.llama_init_from_model(llm.model, params)
+        if not self.ctx:
+            raise RuntimeError("LLaMA 배치 컨텍스트 생성 실패")
+        self.memory = llama_cpp.llama_get_memory(self.ctx)
+        self.vocab = llama_cpp.llama_model_get_vocab(llm.model)
+        self.batch = llama_cpp.llama_batch_init(n_ctx, 0, 1)
+        self.prefix: list[int] = []
+
+    def close(self):
+        if self.ctx:
+            self._lib.llama_batch_free(self.batch)
+            self._lib.llama_free(self.ctx)
+            self.ctx = None
+
+    # 📥 (토큰, 위치, seq_id, logits 필요 여부) 목록을 배치에 채워 llama_decode 1회 실행
+    def _decode(self, entries: list[tuple]):
+        batch = self.batch
+        for i, (token, pos, seq_id, logits) in enumerate(entries):
+            batch.token[i] = token
+            batch.pos[i] = pos
+            batch.n_seq_id[i] = 1
+            batch.seq_id[i][0] = seq_id
+            batch.logits[i] = logits
+        batch.n_tokens = len(entries)
+        code = self._lib.llama_decode(self.ctx, batch)
+        batch_stats["decode_calls"] += 1
+        if code != 0:
+            raise RuntimeError(f"llama_decode 실패 (code {code}, 토큰 {len(entries)}개)")
+
+    # 🧠 seq 0 에 공유 접두부 평가 (접두부가 바뀔 때만)
+    def _prime(self, prefix: list[int]):
+        if prefix == self.prefix:
+            return
+        self._lib.llama_memory_clear(self.memory, True)
+        self.prefix = []
+        if prefix:
+            self._decode([(token, pos, 0, False) for pos, token in enumerate(prefix)])
+            batch_stats["prompt_tokens"] += len(prefix)
+        self.prefix = list(prefix)
+
+    def _sampler(self, temperature: float, grammar: Optional[str]):
+        lib = self._lib
+        chain = lib.llama_sampler_chain_init(lib.llama_sampler_chain_default_params())
+        if grammar:
+            lib.llama_sampler_chain_add(chain, lib.llama_sampler_init_grammar(self.vocab, grammar.encode("utf-8"), b"root"))
+        if temperature == 0:
+            lib.llama_sampler_chain_add(chain, lib.llama_sampler_init_greedy())
+        else:
+            lib.llama_sampler_chain_add(chain, lib.llama_sampler_init_top_k(40))
+            lib.llama_sampler_chain_add(chain, lib.llama_sampler_init_top_p(0.95, 1))
+            lib.llama_sampler_chain_add(chain, lib.llama_sampler_init_min_p(0.05, 1))
+            lib.llama_sampler_chain_add(chain, lib.llama_sampler_init_temp(temperature))
+            lib.llama_sampler_chain_add(chain, lib.llama_sampler_init_dist(lib.LLAMA_DEFAULT_SEED))
+        return chain
+
+    # 🚦 요청 묶음 생성 → 요청별 결과 (배치 컨텍스트에 들어가지 않는 요청은 None → 호출자가 한 건씩 생성)
+    # request = {"prompt": 토큰 목록, "max_tokens": int, "stop": [str], "temperature": float, "grammar": GBNF 문자열 또는 None}
+    def generate(self, requests: list[dict], prefix: list[int]) -> list[Optional[dict]]:
+        self._prime(prefix)
+        results: list[Optional[dict]] = [None] * len(requests)
+        pending: list[int] = []
+        used = len(prefix)
+        for index, request in enumerate(requests):
+            prompt = request["prompt"]
+            need = len(prompt) - len(prefix) + request["max_tokens"]
+            if prompt[:len(prefix)] != prefix or len(prompt) <= len(prefix) or len(prefix) + need > self.n_ctx:
+                batch_stats["skipped"] += 1
+                continue
+            if pending and (used + need > self.n_ctx or len(pending) == self.max_sequences):
+                for i, result in zip(pending, self._run([requests[i] for i in pending])):
+                    results[i] = result
+                pending, used = [], len(prefix)
+            pending.append(index)
+            used += need
+        if pending:
+            for i, result in zip(pending, self._run([requests[i] for i in pending])):
+                results[i] = result
+        return results
+
+    def _run(self, requests: list[dict]) -> list[dict]:
+        lib = self._lib
+        started = time.perf_counter()
+        shared = len(self.prefix)
+        seqs = []
+        try:
+            # 1) 시퀀스마다 접두부 KV 복사 + 접미부 토큰을 한 배치로 평가 (마지막 토큰만 logits)
+            entries = []
+            for seq_id, request in enumerate(requests, start=1):
+                if shared:
+                    lib.llama_memory_seq_cp(self.memory, 0, seq_id, -1, -1)
+                suffix = request["prompt"][shared:]
+                entries += [(token, shared + offset, seq_id, offset == len(suffix) - 1) for offset, token in enumerate(suffix)]
+                seqs.append({
+                    "seq_id": seq_id,
+                    "request": request,
+                    "sampler": self._sampler(request["temperature"], request.get("grammar")),
+                    "pos": len(request["prompt"]),
+                    "logits_index": len(entries) - 1,
+                    "tokens": [],
+                    "text": "",
+                    "finish_reason": None,
+                })
+                batch_stats["prompt_tokens"] += len(suffix)
+            self._decode(entries)
+
+            # 2) 진행 중인 시퀀스마다 토큰 1개씩 뽑아 다음 llama_decode 에 함께 넣음
+            active = seqs
+            while active:
+                entries = []
+                for seq in active:
+                    token = lib.llama_sampler_sample(seq["sampler"], self.ctx, seq["logits_index"])
+                    if lib.llama_vocab_is_eog(self.vocab, token):
+                        seq["finish_reason"] = "stop"
+                        continue
+                    seq["tokens"].append(token)
+                    text = self.llm.detokenize(seq["tokens"]).decode("utf-8", errors="ignore")
+                    stops = [text.find(stop) for stop in seq["request"]["stop"] if stop in text]
+                    if stops:
+                        seq["text"], seq["finish_reason"] = text[:min(stops)], "stop"
+                        continue
+                    seq["text"] = text
+                    if len(seq["tokens"]) >= seq["request"]["max_tokens"]:
+                        seq["finish_reason"] = "length"
+                        continue
+                    seq["logits_index"] = len(entries)
+                    entries.append((token, seq["pos"], seq["seq_id"], True))
+                    seq["pos"] += 1
+                active = [seq for seq in active if seq["finish_reason"] is None]
+                if entries:
+                    self._decode(entries)
+        finally:
+            for seq in seqs:
+                lib.llama_sampler_free(seq["sampler"])
+                lib.llama_memory_seq_rm(self.memory, seq["seq_id"], -1, -1)
+
+        generated = sum(len(seq["tokens"]) for seq in seqs)
+        batch_stats["batches"] += 1
+        batch_stats["sequences"] += len(seqs)
+        batch_stats["generated_tokens"] += generated
+        batch_sizes.observe(len(seqs))
+        batch_latency.observe(time.perf_counter() - started)
+        logger.debug(f"🧮 LLaMA 배치 디코딩: 시퀀스 {len(seqs)}개, 생성 토큰 {generated}개, {time.perf_counter() - started:.3f}s")
+        return [
+            {
+                "choices": [{"text": seq["text"], "index": 0, "logprobs": None, "finish_reason": seq["finish_reason"]}],
+                "usage": {
+                    "prompt_tokens": len(seq["request"]["prompt"]),
+                    "completion_tokens": len(seq["tokens"]),
+                    "total_tokens": len(seq["request"]["prompt"]) + len(seq["tokens"]),
+                },
+            }
+            for seq in seqs
+        ]
+
+
+def batch_stats_snapshot() -> dict:
+    return {
+        **batch_stats,
+        "avg_sequences_per_batch": round(batch_stats["sequences"] / batch_stats["batches"], 2) if batch_stats["batches"] else 0.0,
+        "batch_size": batch_sizes.snapshot(),
+        "batch_latency_seconds": batch_latency.snapshot(),
+    }
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+from routers.executors import run_io
+from routers.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+# ✅ LLaMA 추론 대기열 설정 (환경 변수로 조정 가능)
+# 0 이면 기다리지 않고 이미 대기 중인 요청만 함께 꺼냄, 0 보다 크면 첫 요청 이후 그만큼 더 기다렸다가 꺼냄
+# (함께 꺼낸 요청은 배치 디코더가 한 번에 디코딩 → 동시 요청이 드문 환경에서 묶음을 키우고 싶을 때만 사용, 그만큼 첫 요청 지연이 늘어남)
+LLAMA_BATCH_WINDOW_MS = float(os.getenv("LLAMA_BATCH_WINDOW_MS", "0"))
+LLAMA_MAX_BATCH_SIZE = int(os.getenv("LLAMA_MAX_BATCH_SIZE", "8"))  # 한 번에 꺼내는 최대 요청 수
+LLAMA_MAX_QUEUE = int(os.getenv("LLAMA_MAX_QUEUE", "256"))
+
+GROUP_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+
+class LlamaQueueFullError(Exception):
+    pass
+
+
+# 🚦 LLaMA 추론 대기열
+# - 워커 1개가 Llama 컨텍스트들을 독점하므로 별도 락 없이 묶음(group) 단위로 차례로 실행
+# - 대기 중인 요청을 최대 max_batch_size 건까지 함께 꺼내 run_group 에 넘김 (함께 디코딩할지는 run_group 이 결정)
+# - 대기열 길이 제한으로 과부하 시 바로 거절
+# - 한 번에 꺼낸 요청 묶음 안의 동일 요청은 한 번만 추론하고 결과를 공유
+# - run_group(requests) -> results 는 IO 풀 스레드에서 호출되는 동기 함수
+class LlamaInferenceQueue:
+    def __init__(
+        self,
+        run_group: Callable[[list[dict]], list],
+        window_ms: float = LLAMA_BATCH_WINDOW_MS,
+        max_batch_size: int = LLAMA_MAX_BATCH_SIZE,
+        max_queue: int = LLAMA_MAX_QUEUE,
+    ):
+        self.run_group = run_group
+        self.window = window_ms / 1000.0
+        self.max_group_size = max(1, max_batch_size)
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.stats = {"requests": 0, "groups": 0, "deduplicated": 0, "rejected": 0, "errors": 0, "max_queue_depth": 0}
+        self.group_size = LatencyHistogram(GROUP_SIZE_BUCKETS)
+        self.queue_wait = LatencyHistogram()
+        self.group_latency = LatencyHistogram()
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = self._queue or asyncio.Queue(maxsize=self.max_queue)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    # 📨 요청 1건 등록 → 차례가 오면 생성한 결과 반환
+    async def submit(self, request: dict):
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((request, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.stats["rejected"] += 1
+            raise LlamaQueueFullError(f"LLaMA 추론 대기열이 가득 찼습니다. ({self.max_queue}건)")
+        self.stats["requests"] += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self._queue.qsize())
+        return await future
+
+    async def _collect(self) -> list:
+        group = [await self._queue.get()]
+        while len(group) < self.max_group_size and not self._queue.empty():
+            group.append(self._queue.get_nowait())
+        deadline = time.perf_counter() + self.window
+        while len(group) < self.max_group_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                group.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return group
+
+    async def _run(self):
+        while True:
+            group = await self._collect()
+            started = time.perf_counter()
+            for _, _, enqueued in group:
+                self.queue_wait.observe(started - enqueued)
+
+            # 같은 요청(프롬프트 + 생성 옵션)은 한 번만 추론
+            unique: dict[tuple, int] = {}
+            requests = []
+            keys = [tuple(sorted((k, repr(v)) for k, v in request.items())) for request, _, _ in group]
+            for (request, _, _), key in zip(group, keys):
+                if key not in unique:
+                    unique[key] = len(requests)
+                    requests.append(request)
+            self.stats["deduplicated"] += len(group) - len(requests)
+
+            try:
+                results = await run_io(self.run_group, requests)
+                error = None
+            except Exception as e:
+                self.stats["errors"] += 1
+                results, error = None, e
+
+            for (_, future, _), key in zip(group, keys):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(results[unique[key]])
+
+            self.stats["groups"] += 1
+            self.group_size.observe(len(group))
+            self.group_latency.observe(time.perf_counter() - started)
+            logger.debug(f"🚦 LLaMA 대기열 처리: {len(group)}건 (고유 {len(requests)}건), {time.perf_counter() - started:.3f}s")
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "window_ms": self.window * 1000,
+            "max_group_size": self.max_group_size,
+            "group_size": self.group_size.snapshot(),
+            "queue_wait_seconds": self.queue_wait.snapshot(),
+            "group_latency_seconds": self.group_latency.snapshot(),
+        }
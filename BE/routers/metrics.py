@@ -0,0 +1,108 @@
+import bisect
+import threading
+
+# ✅ 기본 지연시간 구간 (초)
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+# 📈 지연시간 히스토그램 (누적 구간 개수 + 합계, 구간 경계로 백분위 근사)
+class LatencyHistogram:
+    def __init__(self, buckets: tuple = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # 마지막 칸 = +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self._sum += seconds
+            self._count += 1
+
+    def _quantile(self, q: float) -> float:
+        if not self._count:
+            return 0.0
+        rank = q * self._count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self._counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative = []
+            seen = 0
+            for bound, count in zip(self.buckets + (float("inf"),), self._counts):
+                seen += count
+                cumulative.append(("+Inf" if bound == float("inf") else bound, seen))
+            return {
+                "count": self._count,
+                "sum": round(self._sum, 6),
+                "avg": round(self._sum / self._count, 6) if self._count else 0.0,
+                "p50": self._quantile(0.5),
+                "p95": self._quantile(0.95),
+                "p99": self._quantile(0.99),
+                "buckets": cumulative,
+            }
+
+
+# 📤 Prometheus 텍스트 형식 출력 (조회 시점에 각 모듈의 통계를 읽어 변환 → 요청 처리 경로에는 추가 비용 없음)
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels.keys(), escaped)) + "}"
+
+
+# 값 표기: 정수는 그대로, 실수는 repr (":g" 는 유효숫자 6자리로 잘려 큰 카운터/바이트 수가 뭉개짐)
+def _format_value(value) -> str:
+    if isinstance(value, (bool, int)):
+        return str(int(value))
+    value = float(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+# 카운터/게이지: samples = [(라벨 dict, 값), ...], const_labels 는 모든 샘플 앞에 붙는 공통 라벨
+def prometheus_metric(name: str, kind: str, help_text: str, samples: list, const_labels: dict = None) -> str:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if value is None:
+            continue
+        lines.append(f"{name}{_format_labels({**(const_labels or {}), **labels})} {_format_value(value)}")
+    return "\n".join(lines)
+
+
+# 히스토그램: series = [(라벨 dict, LatencyHistogram), ...]
+def prometheus_histogram(name: str, help_text: str, series: list, const_labels: dict = None) -> str:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        labels = {**(const_labels or {}), **labels}
+        snapshot = histogram.snapshot()
+        for bound, count in snapshot["buckets"]:
+            lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound if bound == '+Inf' else _format_value(bound)})} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(snapshot['sum'])}")
+        lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+    return "\n".join(lines)
+
+
+# 🔗 여러 프로세스가 출력한 텍스트를 지표(family)별로 합침 (HELP/TYPE 는 한 번만, 샘플은 worker 라벨로 구분되어 있어야 함)
+def merge_prometheus_texts(texts: list) -> str:
+    headers: dict[str, dict] = {}
+    samples: dict[str, list] = {}
+    for text in texts:
+        name = None
+        for line in text.splitlines():
+            if line.startswith(("# HELP ", "# TYPE ")):
+                name = line.split(" ", 3)[2]
+                headers.setdefault(name, {}).setdefault(line[2:6], line)
+                samples.setdefault(name, [])
+            elif line and name is not None:
+                samples[name].append(line)
+    return "\n".join("\n".join([*headers[name].values(), *samples[name]]) for name in headers)
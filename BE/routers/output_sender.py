@@ -1,7 +1,50 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
+from typing import Optional
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+import httpx
+
+from routers.auth import verify_api_key
+from routers.executors import run_io
+from routers.metrics import LatencyHistogram
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# ✅ 결과 콜백(웹훅) 전송 설정 (환경 변수로 조정 가능)
+WEBHOOK_DEFAULT_URL = os.getenv("WEBHOOK_DEFAULT_URL", "")  # 요청에 callback_url 이 없을 때 사용할 FE 수신 주소 (비어 있으면 전송 안 함)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")  # HMAC-SHA256 서명 키 (FE 와 공유, 비어 있으면 서명 생략)
+WEBHOOK_OUTBOX_PATH = os.getenv("WEBHOOK_OUTBOX_PATH", os.path.abspath("./data/webhook_outbox.sqlite3"))  # 비어 있으면 메모리에만 보관
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))  # 이 횟수만큼 실패하면 dead 로 보관 (재전송 API 로 복구)
+WEBHOOK_BACKOFF_BASE = float(os.getenv("WEBHOOK_BACKOFF_BASE", "2"))
+WEBHOOK_BACKOFF_MAX = float(os.getenv("WEBHOOK_BACKOFF_MAX", "300"))
+WEBHOOK_BATCH_MAX = int(os.getenv("WEBHOOK_BATCH_MAX", "20"))  # 콜백 1회에 묶어 보낼 최대 결과 수
+WEBHOOK_CONNECT_TIMEOUT = float(os.getenv("WEBHOOK_CONNECT_TIMEOUT", "5"))
+WEBHOOK_READ_TIMEOUT = float(os.getenv("WEBHOOK_READ_TIMEOUT", "30"))
+# 전송 중(inflight) 항목의 임대 시간(초) - 전송하던 워커가 죽으면 이 시간 뒤 다른 워커가 이어서 전송
+WEBHOOK_LEASE_SECONDS = float(os.getenv("WEBHOOK_LEASE_SECONDS", "120"))
+# 1 이면 요청의 callback_url 로 사설/루프백 주소 허용 (FE 가 같은 내부망에 있을 때), 기본은 SSRF 방지를 위해 거부
+WEBHOOK_ALLOW_PRIVATE = os.getenv("WEBHOOK_ALLOW_PRIVATE", "0") == "1"
+
+RETRYABLE_STATUS = (408, 425, 429, 500, 502, 503, 504)
+
+# ✅ 전송 대기열 항목 상태
+DELIVERY_PENDING = "pending"
+DELIVERY_INFLIGHT = "inflight"
+DELIVERY_DEAD = "dead"
 
 # ✅ 위험도 등급에 따른 이모지 변환 함수
 def convert_to_emoji(level: str) -> str:
@@ -42,7 +85,363 @@ def send_output_data(data: OutputData) -> dict:
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Output 전송 실패: {str(e)}")
 
+
+# 🔏 콜백 본문 서명 (FE 는 같은 키로 "타임스탬프.본문" 의 HMAC-SHA256 을 계산해 비교, 타임스탬프로 재전송 공격 차단)
+def sign_payload(secret: str, timestamp: str, body: bytes) -> str:
+    digest = hmac.new(secret.encode("utf-8"), timestamp.encode("ascii") + b"." + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+# 🛡️ 요청으로 받은 callback_url 검사 → 문제가 있으면 사유, 없으면 None
+# - httpx 가 실제로 보낼 수 있는 주소인지 등록 시점에 확인 (잘못된 주소가 대기열에서 계속 실패하지 않도록)
+# - 루프백/사설/링크로컬 IP 와 localhost 는 거부 (BE 내부망으로 요청을 보내게 하는 SSRF 방지)
+#   도메인 이름은 해석하지 않으므로 내부 주소로 해석되는 도메인까지 막으려면 네트워크 단에서 차단
+def callback_url_error(url: str) -> Optional[str]:
+    try:
+        parsed = httpx.URL(url)
+    except Exception:
+        return "callback_url 형식이 올바르지 않습니다."
+    if parsed.scheme not in ("http", "https") or not parsed.host:
+        return "callback_url 은 http:// 또는 https:// 주소여야 합니다."
+    if WEBHOOK_ALLOW_PRIVATE:
+        return None
+    host = parsed.host.rstrip(".").lower()
+    if host == "localhost" or host.endswith(".localhost"):
+        return "callback_url 로 내부 주소는 사용할 수 없습니다."
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return None
+    if address.is_loopback or address.is_private or address.is_link_local or address.is_reserved \
+            or address.is_multicast or address.is_unspecified:
+        return "callback_url 로 내부 주소는 사용할 수 없습니다."
+    return None
+
+
+# 📮 전송 대기열 (SQLite, 전송 성공 시 삭제 → 서버 재시작 후에도 못 보낸 결과를 이어서 전송)
+# - 여러 워커 프로세스가 같은 파일을 공유: 보낼 항목은 UPDATE ... RETURNING 으로 inflight 로 바꾸며 가져가므로
+#   한 항목은 한 워커만 전송하고, 다른 워커가 전송 중인 주소는 건너뜀 (주소별 전송은 전체에서 한 번에 하나)
+# - inflight 항목은 담당 프로세스(owner)와 임대 만료 시각(lease_until)을 기록, 만료되면 다시 가져갈 수 있음
+class WebhookOutbox:
+    def __init__(self, db_path: str = WEBHOOK_OUTBOX_PATH, lease_seconds: float = WEBHOOK_LEASE_SECONDS):
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path or ":memory:", check_same_thread=False, timeout=30)
+        if db_path:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS webhook_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                callback_url TEXT NOT NULL,
+                post_id INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at REAL NOT NULL,
+                owner TEXT,
+                lease_until REAL
+            )
+            """
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(webhook_outbox)")]
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE webhook_outbox ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON webhook_outbox (status, next_attempt_at)")
+        self._conn.commit()
+        if db_path:
+            logger.info(f"📮 결과 콜백 대기열 사용: {db_path} (미전송 {self.counts().get(DELIVERY_PENDING, 0)}건)")
+
+    def add(self, callback_url: str, post_id: int, payload: dict) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO webhook_outbox (callback_url, post_id, payload, status, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (callback_url, post_id, json.dumps(payload, ensure_ascii=False), DELIVERY_PENDING, now, now),
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+
+    # 🔍 지금 보낼 항목을 이 프로세스 담당(inflight)으로 가져옴 → {콜백 주소: [항목, ...]} (주소별 오래된 순 최대 limit 건)
+    # 전송 대기 중이면서 지금 보낼 차례인 항목, 또는 임대가 만료된(전송하던 워커가 죽은) inflight 항목이 대상
+    # 어느 워커든 전송 중(임대 유효)인 주소는 제외, UPDATE ... RETURNING 한 문장이라 여러 워커가 동시에 호출해도 중복 없음
+    def claim_due(self, limit: int) -> dict[str, list[dict]]:
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                UPDATE webhook_outbox SET status = ?, owner = ?, lease_until = ?
+                WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (PARTITION BY callback_url ORDER BY id) AS rank
+                        FROM webhook_outbox
+                        WHERE ((status = ? AND next_attempt_at <= ?) OR (status = ? AND lease_until <= ?))
+                          AND callback_url NOT IN (
+                              SELECT callback_url FROM webhook_outbox WHERE status = ? AND lease_until > ?
+                          )
+                    ) WHERE rank <= ?
+                )
+                RETURNING id, callback_url, payload, attempts
+                """,
+                (DELIVERY_INFLIGHT, self.owner, now + self.lease_seconds,
+                 DELIVERY_PENDING, now, DELIVERY_INFLIGHT, now, DELIVERY_INFLIGHT, now, limit),
+            ).fetchall()
+            self._conn.commit()
+        batches: dict[str, list[dict]] = {}
+        for delivery_id, url, payload, attempts in sorted(rows):
+            batches.setdefault(url, []).append({"id": delivery_id, "payload": json.loads(payload), "attempts": attempts})
+        return batches
+
+    # ⏰ 다음에 확인할 시각 (전송 대기 항목의 예정 시각, 다른 워커가 전송 중인 항목의 임대 만료 시각 중 가장 이른 것)
+    # 다른 워커가 전송 중인 주소의 대기 항목은 그 워커가 전송을 마치고 이어서 보내므로 제외
+    def next_due_at(self) -> Optional[float]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT MIN(due) FROM (
+                    SELECT MIN(next_attempt_at) AS due FROM webhook_outbox
+                    WHERE status = ? AND callback_url NOT IN (
+                        SELECT callback_url FROM webhook_outbox WHERE status = ? AND lease_until > ?
+                    )
+                    UNION ALL
+                    SELECT MIN(lease_until) FROM webhook_outbox WHERE status = ? AND lease_until > ?
+                )
+                """,
+                (DELIVERY_PENDING, DELIVERY_INFLIGHT, now, DELIVERY_INFLIGHT, now),
+            ).fetchone()
+        return row[0]
+
+    # ↩️ 이 프로세스가 전송 중이던 항목을 전송 대기로 되돌림 (종료 시 - 다른 워커/재시작 후 바로 이어서 전송)
+    def release(self):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE webhook_outbox SET status = ?, owner = NULL, lease_until = NULL WHERE status = ? AND owner = ?",
+                (DELIVERY_PENDING, DELIVERY_INFLIGHT, self.owner),
+            )
+            self._conn.commit()
+
+    def delivered(self, ids: list[int]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM webhook_outbox WHERE id = ?", [(i,) for i in ids])
+            self._conn.commit()
+
+    def failed(self, delivery_id: int, attempts: int, next_attempt_at: Optional[float], error: str):
+        status = DELIVERY_PENDING if next_attempt_at is not None else DELIVERY_DEAD
+        with self._lock:
+            self._conn.execute(
+                "UPDATE webhook_outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, owner = NULL, lease_until = NULL WHERE id = ?",
+                (status, attempts, next_attempt_at or time.time(), error, delivery_id),
+            )
+            self._conn.commit()
+
+    # 🔁 dead 항목을 다시 전송 대기 상태로 (FE 복구 후 운영자가 호출)
+    def redrive(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE webhook_outbox SET status = ?, attempts = 0, next_attempt_at = ? WHERE status = ?",
+                (DELIVERY_PENDING, time.time(), DELIVERY_DEAD),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM webhook_outbox GROUP BY status").fetchall()
+        return dict(rows)
+
+
+# 📡 결과 콜백 전송기
+# - 분석이 끝난 결과를 대기열에 넣고 FE 콜백 주소로 POST (HMAC 서명, 지터 백오프 재시도)
+# - 콜백 주소별 전송은 (모든 워커를 통틀어) 한 번에 하나 → FE 가 느려 전송 중에 쌓인 결과는 다음 호출 1회에 묶어 전송
+# - 전송 직후 서버가 죽으면 임대 만료 후 같은 결과가 다시 갈 수 있으므로 FE 는 delivery_id 로 중복 처리
+class WebhookDispatcher:
+    def __init__(
+        self,
+        outbox: WebhookOutbox,
+        secret: str = WEBHOOK_SECRET,
+        default_url: str = WEBHOOK_DEFAULT_URL,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+        batch_max: int = WEBHOOK_BATCH_MAX,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.outbox = outbox
+        self.secret = secret
+        self.default_url = default_url
+        self.max_attempts = max_attempts
+        self.batch_max = batch_max
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.stats = {"enqueued": 0, "delivered": 0, "calls": 0, "batched_calls": 0, "retries": 0, "dead": 0}
+        self.latency = LatencyHistogram()
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(WEBHOOK_READ_TIMEOUT, connect=WEBHOOK_CONNECT_TIMEOUT),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"📡 결과 콜백 전송기 시작 - 배치 최대 {self.batch_max}건, 최대 시도 {self.max_attempts}회, 서명 {'사용' if self.secret else '미사용'}")
+
+    async def stop(self):
+        tasks = ([self._task] if self._task else []) + list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._inflight.clear()
+        await run_io(self.outbox.release)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        logger.info("🛑 결과 콜백 전송기 종료")
+
+    # 📥 끝난 작업 1건을 전송 대기열에 추가 (콜백 주소가 없으면 무시)
+    async def enqueue_job(self, job: dict) -> Optional[int]:
+        url = (job.get("payload") or {}).get("callback_url") or self.default_url
+        if not url:
+            return None
+        if job["status"] == "graded":
+            item = {"job_id": job["job_id"], **job["result"]}
+        else:
+            item = {"job_id": job["job_id"], "post_id": job["post_id"], "status": "failed", "error": job.get("error")}
+        delivery_id = await run_io(self.outbox.add, url, job["post_id"], item)
+        self.stats["enqueued"] += 1
+        if self._wake is not None:
+            self._wake.set()
+        return delivery_id
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            for url, batch in (await run_io(self.outbox.claim_due, self.batch_max)).items():
+                self._inflight[url] = asyncio.create_task(self._deliver(url, batch))
+
+            next_due = await run_io(self.outbox.next_due_at)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=None if next_due is None else max(0.05, next_due - time.time()))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, url: str, batch: list[dict]):
+        try:
+            await self._post(url, batch)
+        finally:
+            self._inflight.pop(url, None)
+            self._wake.set()
+
+    async def _post(self, url: str, batch: list[dict]):
+        body = json.dumps(
+            {"deliveries": [{"delivery_id": item["id"], **item["payload"]} for item in batch]},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        timestamp = str(int(time.time()))
+        headers = {"Content-Type": "application/json", "X-ZipSentinel-Timestamp": timestamp}
+        if self.secret:
+            headers["X-ZipSentinel-Signature"] = sign_payload(self.secret, timestamp, body)
+
+        self.stats["calls"] += 1
+        if len(batch) > 1:
+            self.stats["batched_calls"] += 1
+        started = time.perf_counter()
+        unsendable = False
+        try:
+            response = await self._http().post(url, content=body, headers=headers)
+            status, error = response.status_code, f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            response, status, error = None, None, repr(e)
+        except Exception as e:
+            # 주소 자체를 보낼 수 없는 경우(InvalidURL 등)는 재시도해도 같으므로 바로 dead
+            response, status, error, unsendable = None, None, repr(e), True
+
+        if status is not None and 200 <= status < 300:
+            self.latency.observe(time.perf_counter() - started)
+            await run_io(self.outbox.delivered, [item["id"] for item in batch])
+            self.stats["delivered"] += len(batch)
+            logger.info(f"📤 결과 콜백 전송 완료 - {url}, {len(batch)}건")
+            return
+
+        # 재시도할 수 없는 응답(서명 거부 등)은 바로 dead 로 보관
+        permanent = unsendable or (status is not None and status not in RETRYABLE_STATUS)
+        for item in batch:
+            attempts = item["attempts"] + 1
+            if permanent or attempts >= self.max_attempts:
+                await run_io(self.outbox.failed, item["id"], attempts, None, error)
+                self.stats["dead"] += 1
+            else:
+                await run_io(self.outbox.failed, item["id"], attempts, time.time() + self._backoff_delay(attempts, response), error)
+                self.stats["retries"] += 1
+        logger.warning(f"⚠️ 결과 콜백 전송 실패 - {url}, {len(batch)}건: {error}")
+
+    @staticmethod
+    def _backoff_delay(attempts: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(float(retry_after), WEBHOOK_BACKOFF_MAX)
+                except ValueError:
+                    pass
+        return random.uniform(0, min(WEBHOOK_BACKOFF_BASE * (2 ** attempts), WEBHOOK_BACKOFF_MAX))
+
+    def redrive(self) -> int:
+        count = self.outbox.redrive()
+        if self._wake is not None:
+            self._wake.set()
+        return count
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "outbox": self.outbox.counts(),
+            "inflight_urls": list(self._inflight),
+            "signed": bool(self.secret),
+            "latency_seconds": self.latency.snapshot(),
+        }
+
+
+# ✅ 프로세스 공용 결과 콜백 전송기 (main.py 의 startup/shutdown 이벤트에서 시작/종료)
+webhook_dispatcher = WebhookDispatcher(WebhookOutbox())
+
+
 # ✅ 외부 요청용 라우터 (Swagger 테스트용 등)
 @router.post("/send", summary="게시글 분석 결과를 최종 응답 포맷으로 반환")
 def send_output(data: OutputData):
-    return send_output_data(data)
\ No newline at end of file
+    return send_output_data(data)
+
+
+# 📊 결과 콜백 전송 통계 조회 (전송/재시도/dead 수, 대기열 상태별 건수)
+@router.get(
+    "/webhooks/stats",
+    dependencies=[Depends(verify_api_key)],
+    summary="결과 콜백 전송 통계"
+)
+def webhook_stats():
+    return webhook_dispatcher.snapshot()
+
+
+# 🔁 전송을 포기한(dead) 결과 콜백 재전송
+@router.post(
+    "/webhooks/redrive",
+    dependencies=[Depends(verify_api_key)],
+    summary="전송 실패(dead) 결과 콜백 재전송"
+)
+def webhook_redrive():
+    return {"requeued": webhook_dispatcher.redrive()}
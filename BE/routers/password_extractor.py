@@ -0,0 +1,205 @@
+import logging
+import os
+import re
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# ✅ 규칙 기반 비밀번호 추출 설정 (환경 변수로 조정 가능)
+# 이 값 이상인 후보가 하나로 확정되면 LLM 을 호출하지 않고 바로 사용
+PASSWORD_FASTPATH_MIN_CONFIDENCE = float(os.getenv("PASSWORD_FASTPATH_MIN_CONFIDENCE", "0.9"))
+PASSWORD_FASTPATH_ENABLED = os.getenv("PASSWORD_FASTPATH_ENABLED", "1") != "0"
+# 추론 결과가 모두 틀렸을 때 마지막으로 시도하는 흔한 비밀번호 (쉼표 구분)
+PASSWORD_DEFAULTS = [p for p in os.getenv("PASSWORD_DEFAULTS", "infected,malware,virus").split(",") if p]
+PASSWORD_MAX_CANDIDATES = int(os.getenv("PASSWORD_MAX_CANDIDATES", "8"))
+
+# 비밀번호를 가리키는 단어
+_KO_LABEL = r"(?:비밀\s*번호|비번|암호|패스\s*워드)"
+_EN_LABEL = r"(?:password|passwd|pass\s*word|passcode|pwd|pw|pass)"
+_INTL_LABEL = r"(?:密码|密碼|口令|パスワード|暗証番号|пароль|contraseña|clave|mot\s+de\s+passe|passwort|kennwort|senha|parola|wachtwoord|hasło|mật\s+khẩu|รหัสผ่าน|şifre)"
+
+# 비밀번호 앞뒤를 감싸는 따옴표/괄호
+_OPEN_QUOTE = "\"'`“‘「『《<\\[("
+_CLOSE_QUOTE = "\"'`”’」』》>\\])"
+_QUOTED = rf"[{_OPEN_QUOTE}](?P<quoted>[^{_CLOSE_QUOTE}\s]{{1,64}})[{_CLOSE_QUOTE}]"
+# 따옴표 없는 비밀번호: 공백 전까지 (뒤에 붙은 한국어 어미 / 문장부호는 아래 _TERMINATOR 로 분리)
+_BARE = r"(?P<bare>[^\s\"'`“”‘’「」『』《》]{1,64}?)"
+
+# 한국어 서술 어미 / 조사 (비밀번호 바로 뒤에 붙어 쓰는 경우가 많음)
+_KO_ENDING = r"(?:입니다|이에요|예요|에요|이예요|이야|야|임|이다|입니당|이에여|이여|요|으로|로|를|을)"
+# 비밀번호 끝: 공백/본문 끝, 또는 문장부호 뒤에 공백/본문 끝이 올 때만 (P@ss.word, qwer1234!입니다 처럼 부호가 비밀번호 안에 있을 수 있음)
+_TERMINATOR = r"(?=$|\s|[.,!?;:。、！？)\]]+(?:\s|$))"
+
+_INTL_SEP = r"(?:(?:是|は|(?:es|est|ist|é|è|is)\b)\s*[:：=]?|[:：=])"
+# 영어 라벨 뒤 구분자 ("is", "is:", ":", "=", "->")
+_EN_SEP = r"(?:(?:is|was)\b\s*(?:[:=]|->)?|[:=]|->)"
+# 라틴 문자 라벨이 다른 단어의 일부일 때 제외 (enclave, autoclave 의 clave 등, 한글/한자 앞은 허용)
+_LATIN_START = r"(?<![a-z])"
+
+# (이름, 정규식, 기본 신뢰도) - 위에서부터 우선 적용
+_PATTERNS = [
+    ("ko_quoted", re.compile(rf"{_KO_LABEL}\s*(?:은|는|이|가|:|：|=|->|→)?\s*(?:바로\s*)?{_QUOTED}", re.IGNORECASE), 0.97),
+    ("ko_sentence", re.compile(rf"{_KO_LABEL}\s*(?:은|는|이|가)\s*{_BARE}{_KO_ENDING}?{_TERMINATOR}", re.IGNORECASE), 0.95),
+    ("ko_label", re.compile(rf"{_KO_LABEL}\s*(?::|：|=|->|→)\s*{_BARE}{_KO_ENDING}?{_TERMINATOR}", re.IGNORECASE), 0.95),
+    ("en_quoted", re.compile(rf"\b{_EN_LABEL}\s*{_EN_SEP}?\s*{_QUOTED}", re.IGNORECASE), 0.95),
+    ("en_sentence", re.compile(rf"\b{_EN_LABEL}\s*{_EN_SEP}\s*{_BARE}{_TERMINATOR}", re.IGNORECASE), 0.92),
+    ("intl_quoted", re.compile(rf"{_LATIN_START}{_INTL_LABEL}\s*{_INTL_SEP}?\s*{_QUOTED}", re.IGNORECASE), 0.92),
+    ("intl_label", re.compile(rf"{_LATIN_START}{_INTL_LABEL}\s*{_INTL_SEP}\s*{_BARE}(?:です|だ|입니다)?{_TERMINATOR}", re.IGNORECASE), 0.9),
+]
+
+# 라벨 위치만 문자열 검색으로 먼저 찾고, 그 주변 구간에만 상세 패턴 적용
+# (대소문자 무시 정규식으로 긴 본문 전체를 여러 번 훑는 비용을 피하기 위함)
+# 구간을 잘라내지 않고 pos/endpos 로 검색 → \b 등 단어 경계는 원문 기준 (compass, bypass 의 pass 제외)
+_LABEL_KEYWORDS = (
+    "비밀", "비번", "암호", "패스", "pass", "pw",
+    "密码", "密碼", "口令", "パスワード", "暗証番号", "пароль", "contraseña", "clave", "mot de passe",
+    "kennwort", "senha", "parola", "wachtwoord", "hasło", "mật khẩu", "รหัสผ่าน", "şifre",
+)
+_WINDOW_SIZE = 200
+
+# LLM 판단이 필요한 게시글 신호 (힌트형/계산형 - 엔진 테스트 004/005)
+_ESCALATION_KEYWORDS = (
+    "힌트", "추측", "맞춰", "계산", "더한", "더하기", "빼기", "곱하기", "나누기", "합계", "생년월일", "생일", "전화번호",
+    "뒷자리", "앞자리", "거꾸로", "대문자", "소문자",
+    "hint", "guess", "calculate", "sum of", "plus", "minus", "times", "multipl", "reverse", "birthday",
+)
+_ARITHMETIC = re.compile(r"\d\s*[+\-×*/÷]\s*\d")
+
+# 비밀번호가 아닌 것으로 알려진 값 (부정/안내 문구)
+_NOT_A_PASSWORD = {
+    "없음", "없습니다", "없어요", "없다", "없이", "없고", "아래", "다음", "댓글", "쪽지", "본문", "같습니다", "동일",
+    "none", "no", "not", "below", "above", "the", "is", "required", "protected", "hint",
+}
+
+# 비밀번호 자리에 오면 안내 문장의 일부일 가능성이 큰 흔한 단어 (제외하지 않고 신뢰도만 낮춤)
+_COMMON_WORDS = {
+    "see", "check", "read", "refer", "look", "here", "there", "this", "that", "it", "in", "on", "at", "for", "as",
+    "same", "follows", "following", "attached", "inside", "file", "zip", "link", "download", "comment", "click",
+    "참고", "확인", "첨부", "파일", "링크", "다운로드",
+}
+
+# 비밀번호 뒤에 같은 줄에서 단어가 더 이어지는지 (어미만 붙는 "abc 입니다" 는 제외)
+_MORE_WORDS = re.compile(rf"[ \t]+(?!{_KO_ENDING}[.!?]*(?:\s|$))[^\s.,!?;:。、！？]")
+_UNCERTAIN_FACTOR = 0.6
+
+_TRAILING_KO_ENDING = re.compile(rf"{_KO_ENDING}[.!]*$")
+
+_STRIP_CHARS = " \t.,!?;:。、！？\"'`“”‘’「」『』《》"
+
+# 📊 빠른 경로 통계 (프로세스 누적)
+extractor_stats = {"lookups": 0, "fast_path": 0, "escalated": 0, "no_candidate": 0}
+
+
+def normalize_candidate(value: str) -> str:
+    return value.strip(_STRIP_CHARS)
+
+
+def _find_all(text: str, keyword: str):
+    pos = text.find(keyword)
+    while pos != -1:
+        yield pos
+        pos = text.find(keyword, pos + 1)
+
+
+def _match_window(text: str, start: int, end: int, found: dict):
+    for name, pattern, confidence in _PATTERNS:
+        for match in pattern.finditer(text, start, end):
+            groups = match.groupdict()
+            if groups.get("quoted"):
+                # 따옴표 안 값은 그대로 사용 ("qwer1234!" 의 ! 도 비밀번호)
+                value = raw = groups["quoted"]
+            else:
+                value = groups.get("bare") or ""
+                # 문장부호/어미를 떼어낸 값이 틀렸을 때를 위해 원문도 후보로 보관
+                # (뒤에 단어가 이어지면 "hello world" 처럼 공백 포함 비밀번호일 수 있으므로 줄 끝까지)
+                rest = text[match.start("bare"):].split("\n", 1)[0].strip()
+                raw = rest.split(None, 1)[0] if rest else ""
+                if _MORE_WORDS.match(text, match.end()):
+                    raw = rest
+                    confidence = round(confidence * _UNCERTAIN_FACTOR, 3)
+                elif value.lower() in _COMMON_WORDS:
+                    confidence = round(confidence * _UNCERTAIN_FACTOR, 3)
+            if not normalize_candidate(value) or value.lower() in _NOT_A_PASSWORD:
+                continue
+            if value not in found or found[value]["confidence"] < confidence:
+                found[value] = {"password": value, "raw": raw, "confidence": confidence, "source": name}
+
+
+# 🔍 게시글에서 비밀번호 후보 추출 → 신뢰도 순 [{"password", "confidence", "source"}]
+def extract_password_candidates(post_text: str) -> list[dict]:
+    found: dict[str, dict] = {}
+    lowered = post_text.lower()
+    if len(lowered) != len(post_text):
+        # 소문자 변환으로 길이가 바뀌는 특수 문자가 있으면 위치가 어긋나므로 전체를 한 구간으로 처리
+        windows = [[0, len(post_text)]]
+    else:
+        starts = sorted(
+            pos
+            for keyword in _LABEL_KEYWORDS
+            for pos in _find_all(lowered, keyword)
+        )
+        windows = []
+        for pos in starts:
+            if windows and pos < windows[-1][1]:
+                windows[-1][1] = pos + _WINDOW_SIZE
+            else:
+                windows.append([pos, pos + _WINDOW_SIZE])
+
+    for start, end in windows:
+        _match_window(post_text, start, end, found)
+
+    candidates = sorted(found.values(), key=lambda c: c["confidence"], reverse=True)
+
+    # 힌트/계산형 게시글이거나 서로 다른 후보가 여러 개면 규칙만으로 확정하지 않음
+    if candidates and (any(k in lowered for k in _ESCALATION_KEYWORDS) or _ARITHMETIC.search(post_text)):
+        for c in candidates:
+            c["confidence"] = round(c["confidence"] * 0.5, 3)
+    if len(candidates) > 1:
+        for c in candidates:
+            c["confidence"] = round(c["confidence"] * 0.7, 3)
+    return candidates
+
+
+# ⚡ 빠른 경로: 신뢰도가 충분한 후보가 하나로 확정되면 반환, 아니면 None (LLM 으로 넘김)
+def fast_password(post_text: str) -> Optional[dict]:
+    if not PASSWORD_FASTPATH_ENABLED:
+        return None
+    extractor_stats["lookups"] += 1
+    candidates = extract_password_candidates(post_text)
+    if not candidates:
+        extractor_stats["no_candidate"] += 1
+        extractor_stats["escalated"] += 1
+        return None
+    best = candidates[0]
+    if best["confidence"] < PASSWORD_FASTPATH_MIN_CONFIDENCE:
+        extractor_stats["escalated"] += 1
+        logger.info(f"🤔 규칙 기반 비밀번호 후보 불확실 → LLM 추론으로 전환: {candidates}")
+        return None
+    extractor_stats["fast_path"] += 1
+    logger.info(f"⚡ 규칙 기반 비밀번호 추출: {best['password']} ({best['source']}, 신뢰도 {best['confidence']})")
+    return best
+
+
+# 🧾 LLM 답변 1개에서 나올 수 있는 비밀번호 후보
+# 답변 안의 규칙 기반 후보 → 답변 원문 → 정리본(따옴표/마침표/어미 제거, 첫 단어)
+def answer_candidates(llm_answer: Optional[str]) -> list[str]:
+    if not llm_answer:
+        return []
+    answer = llm_answer.strip()
+    ranked = [p for c in extract_password_candidates(answer) for p in (c["password"], c["raw"])]
+    ranked.append(answer)
+    cleaned = normalize_candidate(answer)
+    ranked.append(cleaned)
+    ranked.append(_TRAILING_KO_ENDING.sub("", cleaned))
+    if cleaned.split():
+        ranked.append(normalize_candidate(cleaned.split()[0]))
+    return [p for p in dict.fromkeys(ranked) if p]
+
+
+# 📋 압축파일에 시도할 비밀번호 후보 목록 (순서 = 시도 순서)
+# LLM 답변 후보 → 본문 규칙 기반 후보 → 기본 비밀번호
+def password_candidates(post_text: str, llm_answer: Optional[str] = None) -> list[str]:
+    ranked = answer_candidates(llm_answer)
+    ranked.extend(p for c in extract_password_candidates(post_text) for p in (c["password"], c["raw"]))
+    ranked.extend(PASSWORD_DEFAULTS)
+    return [p for p in dict.fromkeys(ranked) if p][:PASSWORD_MAX_CANDIDATES]
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from routers.metrics import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+
+# ⏭️ 단계 안에서 최종 결과가 이미 정해졌을 때(이전 분석 결과 재사용 등) 나머지 단계를 건너뛰기 위해 사용
+class PipelineShortCircuit(Exception):
+    def __init__(self, result: Any):
+        super().__init__("pipeline short-circuit")
+        self.result = result
+
+
+# 📈 단계별 처리 시간 / 실패 횟수 (전체 게시글 누적)
+stage_latency: dict[str, LatencyHistogram] = {}
+stage_failures: dict[str, int] = {}
+
+
+# 🕸️ 단계 의존성 그래프 실행기
+# - stages: {이름: (선행 단계 이름들, async fn(results) -> 결과)}
+# - 선행 단계가 모두 끝난 단계는 즉시 시작 → 서로 독립인 단계(다운로드 / 추론 등)는 동시에 실행
+# - 한 단계라도 실패하면 실행 중인 나머지 단계를 취소하고 예외를 그대로 전달
+# - timings: {이름: {"start_ms", "elapsed_ms"}} (실행 시작 기준, 실패/중단 시에도 채워짐)
+async def run_dag(
+    stages: dict[str, tuple[tuple[str, ...], Callable[[dict], Awaitable[Any]]]],
+    timings: Optional[dict] = None,
+    on_start: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> dict:
+    results: dict[str, Any] = {}
+    timings = {} if timings is None else timings
+    origin = time.perf_counter()
+    pending = dict(stages)
+    running: dict[asyncio.Task, str] = {}
+
+    async def run_stage(name: str, fn: Callable[[dict], Awaitable[Any]]):
+        started = time.perf_counter()
+        timings[name] = {"start_ms": round((started - origin) * 1000, 1), "elapsed_ms": None}
+        if on_start is not None:
+            await on_start(name)
+        try:
+            return await fn(results)
+        finally:
+            elapsed = time.perf_counter() - started
+            timings[name]["elapsed_ms"] = round(elapsed * 1000, 1)
+            stage_latency.setdefault(name, LatencyHistogram()).observe(elapsed)
+
+    try:
+        while pending or running:
+            for name, (deps, fn) in list(pending.items()):
+                if all(dep in results for dep in deps):
+                    del pending[name]
+                    running[asyncio.create_task(run_stage(name, fn))] = name
+            if not running:
+                raise RuntimeError(f"실행할 수 없는 단계가 남았습니다 (의존성 확인 필요): {list(pending)}")
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                try:
+                    results[name] = task.result()  # 실패/중단 예외는 여기서 전달됨
+                except PipelineShortCircuit:
+                    raise
+                except BaseException:
+                    stage_failures[name] = stage_failures.get(name, 0) + 1
+                    raise
+        return results
+
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+
+def stage_stats_snapshot() -> dict:
+    return {
+        name: {**histogram.snapshot(), "failures": stage_failures.get(name, 0)}
+        for name, histogram in stage_latency.items()
+    }
@@ -0,0 +1,262 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import asyncio
+import logging
+import os
+import time
+
+from routers.auth import verify_api_key
+from routers.executors import run_io
+from routers.metrics import prometheus_metric, prometheus_histogram, merge_prometheus_texts
+from routers.pipeline_dag import stage_latency, stage_failures
+from routers.input_receiver import job_queue, pipeline_counts, pipeline_failures
+from routers.downloader import download_stats
+from routers.download_cache import download_cache
+from routers.file_extract import extraction_stats
+from routers.result_store import result_store
+from routers.inference_cache import inference_cache
+from routers.password_extractor import extractor_stats
+from routers.engine_router import INFERENCE_ENGINES, engine_router
+from routers.clovax_client import clovax_client
+from routers.llama_analyze import llama_scheduler, generation_latency, model_state
+from routers.llama_batch import batch_stats, batch_sizes, batch_latency
+from routers.vt_client import vt_client
+from routers.vt_analyzer import unanalyzed_counts
+from routers.vt_cache import vt_cache
+from routers.output_sender import webhook_dispatcher
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+PREFIX = "zipsentinel"
+
+# 🔐 /metrics 인증 여부 (0 이면 인증 없이 스크레이프 허용 - 내부망 전용 포트로만 노출할 때)
+# 인증을 유지하면 Prometheus 스크레이프 설정에서 verify_api_key 가 기대하는 헤더("authorization: API KEY")를 보내야 함
+#   - job_name: zipsentinel
+#     authorization: {type: API, credentials: KEY}
+METRICS_REQUIRE_API_KEY = os.getenv("METRICS_REQUIRE_API_KEY", "1") == "1"
+
+# 👥 워커 프로세스별 지표 공유 (gunicorn --workers 2 처럼 스크레이프가 아무 워커에나 도착하는 경우)
+# - 모든 샘플에 worker(pid) 라벨 → 워커마다 카운터가 따로 단조 증가 (합계는 sum without(worker) (rate(...)))
+# - 각 워커가 METRICS_SNAPSHOT_INTERVAL 마다 자기 지표를 디렉토리에 기록하고, 응답하는 워커가 살아 있는 워커 것을 합쳐 반환
+# - 비어 있으면 응답한 워커의 지표만 반환 (단일 워커 배포 전용)
+METRICS_SHARED_DIR = os.getenv("METRICS_SHARED_DIR", os.path.abspath("./data/metrics"))
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "5"))
+
+
+# fork 이후 워커마다 다른 값이 되도록 호출 시점의 pid 사용
+def _worker_labels() -> dict:
+    return {"worker": str(os.getpid())}
+
+
+def _counter(name: str, help_text: str, samples: list) -> str:
+    return prometheus_metric(f"{PREFIX}_{name}_total", "counter", help_text, samples, _worker_labels())
+
+
+def _gauge(name: str, help_text: str, samples: list) -> str:
+    return prometheus_metric(f"{PREFIX}_{name}", "gauge", help_text, samples, _worker_labels())
+
+
+def _histogram(name: str, help_text: str, series: list) -> str:
+    return prometheus_histogram(f"{PREFIX}_{name}", help_text, series, _worker_labels())
+
+
+# 🔁 통계 dict 의 항목들을 라벨 1개로 펼친 샘플 목록
+def _by(label: str, values: dict, keys=None) -> list:
+    return [({label: key}, values[key]) for key in (keys or values)]
+
+
+def _pipeline() -> list[str]:
+    return [
+        _histogram("pipeline_stage_duration_seconds", "파이프라인 단계별 처리 시간",
+                   [({"stage": name}, histogram) for name, histogram in stage_latency.items()]),
+        _counter("pipeline_stage_failures", "파이프라인 단계별 실패 횟수", _by("stage", stage_failures)),
+        _counter("pipeline_jobs", "분석 작업 처리 결과별 횟수", _by("outcome", pipeline_counts)),
+        _counter("pipeline_failures", "분석 작업 실패 사유별 횟수", _by("reason", pipeline_failures)),
+        _gauge("job_queue_depth", "분석 작업 대기열 길이", [({}, job_queue.qsize())]),
+    ]
+
+
+def _download() -> list[str]:
+    return [
+        _counter("download_bytes", "다운로드한 바이트 수", [({}, download_stats["bytes"])]),
+        _counter("download_seconds", "다운로드에 걸린 시간 합계(초)", [({}, download_stats["seconds"])]),
+        _counter("downloads", "다운로드 횟수", [({"mode": "segmented"}, download_stats["segmented_downloads"]),
+                                           ({"mode": "single"}, download_stats["downloads"] - download_stats["segmented_downloads"])]),
+        _counter("download_resumes", "끊긴 다운로드 이어받기 횟수", [({}, download_stats["resumes"])]),
+        _counter("download_cache_events", "다운로드 캐시 이벤트별 횟수",
+                 _by("event", download_cache.stats, ("hits", "misses", "stale", "stores", "dedup_stores", "evictions"))),
+        _counter("download_cache_saved_bytes", "다운로드 캐시로 절약한 바이트 수", [({}, download_cache.stats["bytes_saved"])]),
+    ]
+
+
+def _extraction() -> list[str]:
+    return [
+        _counter("extracted_archives", "해제한 압축파일 수", [({"level": "top"}, extraction_stats["archives"]),
+                                                      ({"level": "nested"}, extraction_stats["nested_archives"])]),
+        _counter("extracted_files", "해시를 계산한 최종 파일 수", [({}, extraction_stats["files"])]),
+        _counter("extracted_bytes", "해제/해시한 바이트 수", [({}, extraction_stats["bytes"])]),
+    ]
+
+
+def _caches() -> list[str]:
+    samples = []
+    for name, stats in (("result_store", result_store.stats), ("vt_cache", vt_cache.stats)):
+        samples += [({"cache": name, "event": key}, value) for key, value in stats.items()]
+    for model, stats in inference_cache.stats.items():
+        samples += [({"cache": "inference", "model": model, "event": key}, value)
+                    for key, value in stats.items() if key != "saved_seconds"]
+    return [
+        _counter("cache_events", "결과/VT/추론 캐시 이벤트별 횟수", samples),
+        _counter("inference_cache_saved_seconds", "추론 캐시 적중으로 절약한 시간(초)",
+                 [({"model": model}, stats["saved_seconds"]) for model, stats in inference_cache.stats.items()]),
+    ]
+
+
+def _inference() -> list[str]:
+    scheduler_stats = llama_scheduler.stats
+    return [
+        _counter("password_rule_lookups", "규칙 기반 비밀번호 추출 결과별 횟수", _by("result", extractor_stats)),
+        _counter("engine_router_requests", "추론 엔진 라우터 처리 결과별 횟수", _by("result", engine_router.stats)),
+        _counter("engine_calls", "추론 엔진 호출 결과별 횟수",
+                 [({"engine": name, "result": key}, value)
+                  for name, engine in INFERENCE_ENGINES.items() for key, value in engine["stats"].items()]),
+        _histogram("engine_latency_seconds", "추론 엔진 응답 시간",
+                   [({"engine": name}, engine["latency"]) for name, engine in INFERENCE_ENGINES.items()]),
+        _counter("clovax_requests", "ClovaX API 요청 결과별 횟수",
+                 _by("result", clovax_client.stats, ("requests", "retries", "throttled", "timeouts", "errors"))),
+        _gauge("clovax_inflight", "진행 중인 ClovaX 요청 수", [({}, clovax_client.stats["inflight"])]),
+        _histogram("clovax_request_duration_seconds", "ClovaX 요청 1회 응답 시간", [({}, clovax_client.latency)]),
+        _histogram("clovax_call_duration_seconds", "재시도 포함 ClovaX 호출 전체 시간", [({}, clovax_client.call_latency)]),
+        _gauge("llama_model_ready", "LLaMA 모델 준비 완료 여부", [({}, int(model_state["status"] == "ready"))]),
+        _counter("llama_queue_events", "LLaMA 추론 대기열 이벤트별 횟수",
+                 _by("event", scheduler_stats, ("requests", "groups", "deduplicated", "rejected", "errors"))),
+        _gauge("llama_queue_depth", "LLaMA 추론 대기열 길이", [({}, llama_scheduler.snapshot()["queue_depth"])]),
+        _histogram("llama_queue_group_size", "LLaMA 대기열에서 한 번에 꺼낸 요청 수", [({}, llama_scheduler.group_size)]),
+        _histogram("llama_queue_wait_seconds", "LLaMA 요청 대기 시간", [({}, llama_scheduler.queue_wait)]),
+        _histogram("llama_generation_seconds", "LLaMA 요청 1건 생성 시간 (한 건씩 생성한 요청)", [({}, generation_latency)]),
+        # 배치 디코딩: llama_decode 1회에 여러 seq_id 의 토큰을 함께 넣은 묶음 (sequences / batches = 평균 동시 디코딩 수)
+        _counter("llama_batch_events", "LLaMA 배치 디코딩 이벤트별 횟수",
+                 _by("event", batch_stats, ("batches", "sequences", "decode_calls", "skipped", "errors"))),
+        _counter("llama_batch_tokens", "LLaMA 배치 디코딩 토큰 수", [({"kind": "prompt"}, batch_stats["prompt_tokens"]),
+                                                            ({"kind": "generated"}, batch_stats["generated_tokens"])]),
+        _histogram("llama_batch_sequences", "LLaMA 배치 1회에 함께 디코딩한 시퀀스 수", [({}, batch_sizes)]),
+        _histogram("llama_batch_seconds", "LLaMA 배치 1회 디코딩 시간", [({}, batch_latency)]),
+    ]
+
+
+def _virustotal() -> list[str]:
+    return [
+        # requests = 실제 API 호출 수 (호출 한도 사용량), coalesced 는 동일 해시 병합으로 호출하지 않은 수
+        _counter("vt_requests", "VirusTotal API 요청 결과별 횟수",
+                 _by("result", vt_client.stats, ("requests", "retries", "throttled", "coalesced", "errors"))),
+        _gauge("vt_inflight_lookups", "진행 중인 VirusTotal 해시 조회 수", [({}, vt_client.snapshot()["inflight"])]),
+        # 게시글을 실패시키지 않고 미분석으로 넘긴 해시 조회 (사유별)
+        _counter("vt_unanalyzed", "VirusTotal 미분석 처리 사유별 해시 수", _by("reason", unanalyzed_counts)),
+    ]
+
+
+def _webhooks(outbox_counts: dict) -> list[str]:
+    return [
+        _counter("webhook_events", "결과 콜백 전송 이벤트별 횟수", _by("event", webhook_dispatcher.stats)),
+        _gauge("webhook_outbox", "결과 콜백 대기열 상태별 건수",
+               [({"state": state}, outbox_counts.get(state, 0)) for state in ("pending", "dead")]),
+        _histogram("webhook_delivery_seconds", "결과 콜백 전송 1회 응답 시간", [({}, webhook_dispatcher.latency)]),
+    ]
+
+
+# 📄 이 워커의 지표 텍스트 (통계 dict 를 순회하므로 이벤트 루프에서 호출)
+def render_metrics(outbox_counts: dict) -> str:
+    sections = _pipeline() + _download() + _extraction() + _caches() + _inference() + _virustotal() + _webhooks(outbox_counts)
+    return "\n".join(sections)
+
+
+# 🗂️ 워커별 지표 스냅샷 파일 (<pid>.prom) 기록/수집
+class MetricsSnapshots:
+    def __init__(self, directory: str = METRICS_SHARED_DIR, interval: float = METRICS_SNAPSHOT_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"{pid}.prom")
+
+    def write(self, text: str):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(os.getpid())
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(f"{path}.tmp", path)
+
+    # 다른 워커의 최근 스냅샷 (종료된 워커 파일은 삭제, 오래 갱신되지 않은 파일은 건너뜀)
+    def read_others(self) -> list[str]:
+        texts = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".prom") or not name[:-5].isdigit() or int(name[:-5]) == os.getpid():
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                os.kill(int(name[:-5]), 0)
+            except ProcessLookupError:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            except PermissionError:
+                pass
+            try:
+                if now - os.path.getmtime(path) > self.interval * 6:
+                    continue
+                with open(path, "r", encoding="utf-8") as f:
+                    texts.append(f.read())
+            except FileNotFoundError:
+                continue
+        return texts
+
+    # 스크레이프 시: 내 최신 지표를 기록하고 다른 워커 것을 읽어 옴 (IO 풀 스레드)
+    def exchange(self, text: str) -> list[str]:
+        self.write(text)
+        return self.read_others()
+
+    async def start(self):
+        if self.directory and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                await run_io(os.remove, self._path(os.getpid()))
+            except FileNotFoundError:
+                pass
+
+    async def _loop(self):
+        while True:
+            try:
+                await run_io(self.write, render_metrics(await run_io(webhook_dispatcher.outbox.counts)))
+            except Exception as e:
+                logger.error(f"[❌ 지표 스냅샷 기록 실패] {e}")
+            await asyncio.sleep(self.interval)
+
+
+metrics_snapshots = MetricsSnapshots()
+
+
+# 📈 Prometheus 스크레이프 엔드포인트 (main.py 에서 /metrics 로 등록)
+@router.get("/metrics", response_class=PlainTextResponse, summary="Prometheus 지표",
+            dependencies=[Depends(verify_api_key)] if METRICS_REQUIRE_API_KEY else [])
+async def metrics():
+    # outbox 상태별 건수는 SQLite 조회라 IO 풀에서 먼저 받아 둠
+    text = render_metrics(await run_io(webhook_dispatcher.outbox.counts))
+    if metrics_snapshots.directory:
+        others = await run_io(metrics_snapshots.exchange, text)
+        text = merge_prometheus_texts([text, *others])
+    return PlainTextResponse(text + "\n", media_type="text/plain; version=0.0.4")
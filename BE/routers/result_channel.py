@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from routers.executors import run_io
+
+try:
+    import fcntl  # 여러 워커 프로세스가 같은 파일에 기록할 때 오프셋이 겹치지 않도록 파일 잠금
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ✅ 분석 결과 채널 설정 (환경 변수로 조정 가능)
+RESULT_CHANNEL_PATH = os.getenv("RESULT_CHANNEL_PATH", os.path.abspath("./data/results.ndjson"))  # 비어 있으면 파일 기록 안 함
+RESULT_CHANNEL_SUBSCRIBER_QUEUE = int(os.getenv("RESULT_CHANNEL_SUBSCRIBER_QUEUE", "1000"))
+
+
+# 📣 완료된 분석 결과 발행 채널
+# - 결과 1건 = NDJSON 1줄 (추가 전용 파일), 게시글 ID → 마지막 결과 줄의 바이트 오프셋 인덱스
+# - 여러 워커 프로세스가 같은 파일에 기록 → 인덱스는 마지막으로 훑은 위치(_indexed_size) 이후를 조회 시 이어서 훑음
+# - 구독자(SSE 연결)마다 asyncio.Queue 로 바로 전달, 끊긴 구독자는 오프셋부터 파일을 다시 읽어 이어받기
+#   (파일을 쓰는 경우 큐는 깨우기 신호로만 쓰고, 다른 워커의 결과까지 포함해 파일을 꼬리 읽기)
+class ResultChannel:
+    def __init__(self, path: str = RESULT_CHANNEL_PATH, subscriber_queue: int = RESULT_CHANNEL_SUBSCRIBER_QUEUE):
+        self.path = path
+        self.subscriber_queue = subscriber_queue
+        self._lock = threading.Lock()
+        self._offsets: dict[int, int] = {}
+        self._indexed_size = 0
+        self._subscribers: set[asyncio.Queue] = set()
+        self.stats = {"published": 0, "dropped": 0}
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._rebuild_index()
+
+    # 🔁 시작 시 파일을 한 번 훑어 게시글별 마지막 결과 오프셋 복원
+    def _rebuild_index(self):
+        self._catch_up()
+        logger.info(f"📣 결과 채널 인덱스 복원 - 게시글 {len(self._offsets)}건, {self._indexed_size} bytes")
+
+    # ⏩ 마지막으로 훑은 위치 이후에 추가된 줄(다른 워커가 발행한 결과 포함)을 인덱스에 반영
+    # 기록 중인(끝이 잘린) 마지막 줄은 다음 번에 다시 훑음
+    def _catch_up(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with self._lock:
+            if os.path.getsize(self.path) <= self._indexed_size:
+                return
+            offset = self._indexed_size
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        self._offsets[json.loads(line)["post_id"]] = offset
+                    except (ValueError, KeyError):
+                        pass
+                    offset += len(line)
+            self._indexed_size = offset
+
+    # 📏 현재 파일 끝 위치 (기록 중인 줄이 없을 때의 레코드 경계 → 새 결과만 받을 구독자의 시작 위치)
+    def end_offset(self) -> int:
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        with open(self.path, "rb") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                return f.seek(0, os.SEEK_END)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    # 📤 종료된 작업 1건 발행 → 기록된 레코드 (offset = 파일 내 시작 위치, next_offset = 다음 레코드 위치)
+    # 파일 기록은 IO 풀에서, 구독자 큐 전달은 이벤트 루프에서
+    async def publish(self, job: dict) -> dict:
+        record = await run_io(self.append, job)
+        self._notify(record)
+        return record
+
+    # 📝 레코드 1줄 기록 (블로킹, 파일 잠금)
+    def append(self, job: dict) -> dict:
+        record = {
+            "job_id": job["job_id"],
+            "post_id": job["post_id"],
+            "status": job["status"],
+            "result": job.get("result"),
+            "error": job.get("error"),
+            "timings": job.get("timings"),
+            "finished_at": job.get("updated_at") or time.time(),
+        }
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            record["offset"] = 0
+            if self.path:
+                with open(self.path, "ab") as f:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        record["offset"] = f.seek(0, os.SEEK_END)
+                        f.write(line)
+                        f.flush()
+                    finally:
+                        if fcntl is not None:
+                            fcntl.flock(f, fcntl.LOCK_UN)
+                self._offsets[record["post_id"]] = record["offset"]
+                if record["offset"] == self._indexed_size:
+                    # 그 사이 다른 워커가 기록한 줄이 없으면 훑은 위치도 함께 전진
+                    self._indexed_size += len(line)
+            record["next_offset"] = record["offset"] + len(line)
+            self.stats["published"] += 1
+        return record
+
+    def _notify(self, record: dict):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(record)
+            except asyncio.QueueFull:
+                # 너무 느린 구독자는 이번 레코드를 건너뜀 (next_offset 으로 파일에서 다시 읽을 수 있음)
+                self.stats["dropped"] += 1
+
+    # 🔍 게시글의 마지막 결과 (인덱스로 한 줄만 읽음, 파일이 늘었으면 늘어난 부분만 먼저 훑음)
+    def latest(self, post_id: int) -> Optional[dict]:
+        self._catch_up()
+        offset = self._offsets.get(post_id)
+        if offset is None:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            line = f.readline()
+        record = json.loads(line)
+        record["offset"], record["next_offset"] = offset, offset + len(line)
+        return record
+
+    # 📜 오프셋 이후 레코드 최대 limit 건 (이어받기/재생용)
+    def read_from(self, offset: int, limit: int = 1000) -> list[dict]:
+        if not self.path or not os.path.exists(self.path):
+            return []
+        end = os.path.getsize(self.path)
+        records = []
+        with open(self.path, "rb") as f:
+            if offset > 0:
+                # 레코드 경계가 아닌 오프셋이면 다음 줄 시작까지 건너뜀
+                f.seek(offset - 1)
+                if f.read(1) != b"\n":
+                    f.readline()
+            position = f.tell()
+            while position < end and len(records) < limit:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                record = json.loads(line)
+                record["offset"], record["next_offset"] = position, position + len(line)
+                records.append(record)
+                position += len(line)
+        return records
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.subscriber_queue)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "posts": len(self._offsets),
+            "indexed_bytes": self._indexed_size,
+            "bytes": os.path.getsize(self.path) if self.path and os.path.exists(self.path) else 0,
+            "subscribers": len(self._subscribers),
+        }
+
+
+# ✅ 프로세스 공용 결과 채널
+result_channel = ResultChannel()
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from routers.risk_grader import GRADING_POLICY_VERSION
+
+logger = logging.getLogger(__name__)
+
+# ✅ 분석 결과 재사용 설정 (환경 변수로 조정 가능)
+RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH", os.path.abspath("./data/results.sqlite3"))  # 비어 있으면 디스크 계층 비활성화
+RESULT_STORE_MEMORY_SIZE = int(os.getenv("RESULT_STORE_MEMORY_SIZE", "1024"))
+RESULT_STORE_TTL = int(os.getenv("RESULT_STORE_TTL", str(24 * 3600)))  # 0 이면 재사용 안 함
+
+# 재사용하지 않는 등급 (VT 미분석/호출 한도 초과 결과는 다음 요청에서 다시 분석)
+UNCACHEABLE_LEVELS = ("미분석",)
+
+
+# 🔑 (원본 압축파일 SHA-256, 비밀번호, 등급 기준 버전) → 저장 키
+def result_key(archive_sha256: str, password: Optional[str], policy_version: str = GRADING_POLICY_VERSION) -> str:
+    raw = "\0".join([archive_sha256, password or "", policy_version])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# 🗄️ 게시글 분석 결과 저장소 (메모리 LRU + SQLite 2계층, TTL 만료)
+# 같은 파일이 다른 게시글로 다시 올라오면 다운로드 이후 단계를 건너뛰고 이전 결과를 그대로 반환
+class ResultStore:
+    def __init__(
+        self,
+        db_path: str = RESULT_STORE_PATH,
+        memory_size: int = RESULT_STORE_MEMORY_SIZE,
+        ttl: int = RESULT_STORE_TTL,
+    ):
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, dict] = OrderedDict()
+        self._conn = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "stores": 0, "skipped": 0}
+
+        if db_path and ttl > 0:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    archive_sha256 TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+            logger.info(f"🗄️ 분석 결과 저장소 디스크 계층 사용: {db_path}")
+
+    def _remember(self, key: str, entry: dict):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[dict]:
+        if self.ttl <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry["expires_at"] > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return dict(entry["result"])
+                del self._memory[key]
+                self.stats["expired"] += 1
+
+            if self._conn is not None:
+                row = self._conn.execute("SELECT result, expires_at FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    result, expires_at = json.loads(row[0]), row[1]
+                    if expires_at > now:
+                        self._remember(key, {"result": result, "expires_at": expires_at})
+                        self.stats["disk_hits"] += 1
+                        return dict(result)
+                    self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self._conn.commit()
+                    self.stats["expired"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, archive_sha256: str, result: dict):
+        if self.ttl <= 0:
+            return
+        if result.get("risk_level") in UNCACHEABLE_LEVELS:
+            self.stats["skipped"] += 1
+            return
+        entry = {"result": dict(result), "expires_at": time.time() + self.ttl}
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO results (key, archive_sha256, result, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, archive_sha256, json.dumps(result, ensure_ascii=False), entry["expires_at"]),
+                )
+                self._conn.commit()
+            self.stats["stores"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"]
+            disk_entries = None
+            if self._conn is not None:
+                disk_entries = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            return {
+                **self.stats,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "ttl_seconds": self.ttl,
+                "policy_version": GRADING_POLICY_VERSION,
+            }
+
+
+# ✅ 프로세스 공용 저장소 인스턴스
+result_store = ResultStore()
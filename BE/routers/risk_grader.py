@@ -6,6 +6,9 @@ import logging
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# ✅ 등급 기준 버전 (기준/임계값을 바꾸면 올려서 이전 기준으로 저장된 분석 결과를 재사용하지 않도록 함)
+GRADING_POLICY_VERSION = "1"
+
 # ✅ 응답 구조 모델 (Swagger 테스트용 입력 모델)
 class VTResultInput(BaseModel):
     total: int
@@ -1,15 +1,19 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+import asyncio
 import logging
-import requests
+
+from routers.auth import verify_api_key
+from routers.executors import run_io
+from routers.vt_client import vt_client, VTClientError, VTRateLimitedError
+from routers.vt_cache import vt_cache, VERDICT_POSITIVE, VERDICT_CLEAN, VERDICT_NOT_FOUND
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-# ✅ VirusTotal 설정
-VT_API_KEY = 'Virus Total API KEY'
-VT_BASE_URL = "https://www.virustotal.com/api/v3/files/"
+# 📊 게시글을 실패시키지 않고 미분석으로 처리한 해시 조회 수 (사유별, 프로세스 누적)
+unanalyzed_counts: dict[str, int] = {}
 
 # ✅ 결과 모델 정의
 class VTResult(BaseModel):
@@ -18,59 +22,68 @@ class VTResult(BaseModel):
     sha256: str
     permalink: str
 
-# ✅ 해시 리스트를 받아서 VirusTotal 분석
-def analyze_hashes_with_virustotal(hashes: List[str]) -> List[VTResult]:
-    if not hashes:
-        raise ValueError("해시 리스트가 비어 있습니다.")
-
-    results = []
-    for sha256 in hashes:
-        url = f"{VT_BASE_URL}{sha256}"
-        headers = {"x-apikey": VT_API_KEY}
-
-        logger.debug(f"📡 [VT 요청] {url}")
-        response = requests.get(url, headers=headers)
-
-        logger.debug(f"📥 [응답 상태] {response.status_code}")
-        if response.status_code == 401:
-            logger.error("❌ 잘못된 VirusTotal API 키입니다.")
-            raise HTTPException(status_code=401, detail="VirusTotal API 인증 실패: 잘못된 API 키입니다.")
+# ✅ 해시 1건 조회 (캐시 → 공용 VT 클라이언트)
+async def _lookup_hash(sha256: str) -> VTResult:
+    permalink = f"https://www.virustotal.com/gui/file/{sha256}"
 
-        elif response.status_code == 404:
-            logger.warning(f"⚠️ VirusTotal에 등록되지 않은 파일: {sha256}")
-            results.append(VTResult(
-                total=0,
-                positives=0,
-                sha256=sha256,
-                permalink=f"https://www.virustotal.com/gui/file/{sha256}"
-            ))
-            continue  # 🔁 예외 발생 없이 다음 해시로 진행
+    # 🗄️ 캐시에 유효한 판정이 있으면 VirusTotal 호출 생략
+    cached = await run_io(vt_cache.get, sha256)
+    if cached is not None:
+        logger.debug(f"🗄️ [VT 캐시 적중] {sha256} ({cached['verdict']})")
+        return VTResult(total=cached["total"], positives=cached["positives"], sha256=sha256, permalink=permalink)
 
-        elif response.status_code != 200:
-            logger.error(f"❌ VirusTotal 요청 실패: {response.status_code} - {response.text}")
-            raise HTTPException(status_code=response.status_code, detail="VirusTotal 요청 실패")
+    try:
+        verdict = await vt_client.lookup(sha256)
+    except VTRateLimitedError:
+        # 🔁 재시도 후에도 호출 한도 초과면 게시글 전체를 실패시키지 않고 미분석으로 처리 (캐시 저장 안 함)
+        logger.warning(f"⚠️ VirusTotal 호출 한도 초과로 미분석 처리: {sha256}")
+        unanalyzed_counts["VT_RATE_LIMITED"] = unanalyzed_counts.get("VT_RATE_LIMITED", 0) + 1
+        return VTResult(total=0, positives=0, sha256=sha256, permalink=permalink)
+    except VTClientError as e:
+        # HTTP 응답 변환은 API 엔드포인트에서 (파이프라인은 실패 사유 집계를 위해 원래 예외 유형을 받음)
+        logger.error(f"❌ {e}")
+        raise
 
-        try:
-            data = response.json()
-            stats = data["data"]["attributes"]["last_analysis_stats"]
-            total = sum(stats.values())
-            positives = stats.get("malicious", 0)
-            permalink = f"https://www.virustotal.com/gui/file/{sha256}"
+    if verdict["total"] == 0:
+        logger.warning(f"⚠️ VirusTotal에 등록되지 않은 파일: {sha256}")
+    await run_io(vt_cache.put, sha256, total=verdict["total"], positives=verdict["positives"])
+    return VTResult(total=verdict["total"], positives=verdict["positives"], sha256=sha256, permalink=permalink)
 
-            results.append(VTResult(
-                total=total,
-                positives=positives,
-                sha256=sha256,
-                permalink=permalink
-            ))
-
-        except KeyError as e:
-            logger.error(f"❌ VT 결과 파싱 실패: {e}")
-            raise HTTPException(status_code=500, detail="VirusTotal 결과 파싱 오류")
+# ✅ 해시 리스트를 받아서 VirusTotal 분석 (동시 조회, 입력 순서 유지)
+async def analyze_hashes_with_virustotal(hashes: List[str]) -> List[VTResult]:
+    if not hashes:
+        raise ValueError("해시 리스트가 비어 있습니다.")
 
-    return results
+    return list(await asyncio.gather(*(_lookup_hash(sha256) for sha256 in hashes)))
 
 # ✅ API 엔드포인트
 @router.post("/vt-analyzer/analyze", summary="VT 해시 분석 API", response_model=List[VTResult])
 async def vt_analyze_api(hashes: List[str]):
-    return analyze_hashes_with_virustotal(hashes)
+    try:
+        return await analyze_hashes_with_virustotal(hashes)
+    except VTClientError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e)) from e
+
+# 📊 VT 클라이언트 호출/재시도/병합 통계 조회 (관리자용)
+@router.get("/client/stats", summary="VT 클라이언트 호출 통계", dependencies=[Depends(verify_api_key)])
+def vt_client_stats():
+    return vt_client.snapshot()
+
+# 📊 VT 판정 캐시 통계 조회 (관리자용)
+@router.get("/cache/stats", summary="VT 판정 캐시 적중/미스 통계", dependencies=[Depends(verify_api_key)])
+def vt_cache_stats():
+    return vt_cache.snapshot()
+
+# 🧹 VT 판정 캐시 삭제 (관리자용)
+@router.delete("/cache", summary="VT 판정 캐시 삭제", dependencies=[Depends(verify_api_key)])
+def vt_cache_purge(
+    sha256: Optional[str] = Query(None, description="지정 시 해당 해시만 삭제"),
+    verdict: Optional[str] = Query(
+        None,
+        description=f"지정 시 해당 판정만 삭제 ({VERDICT_POSITIVE} / {VERDICT_CLEAN} / {VERDICT_NOT_FOUND})"
+    ),
+):
+    if verdict is not None and verdict not in (VERDICT_POSITIVE, VERDICT_CLEAN, VERDICT_NOT_FOUND):
+        raise HTTPException(status_code=400, detail=f"알 수 없는 판정 값입니다: {verdict}")
+    removed = vt_cache.purge(sha256=sha256.lower() if sha256 else None, verdict=verdict)
+    return {"removed": removed}
@@ -0,0 +1,169 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# ✅ VirusTotal 판정 캐시 설정 (환경 변수로 조정 가능)
+VT_CACHE_PATH = os.getenv("VT_CACHE_PATH", os.path.abspath("./data/vt_cache.sqlite3"))  # 비어 있으면 디스크 계층 비활성화
+VT_CACHE_MEMORY_SIZE = int(os.getenv("VT_CACHE_MEMORY_SIZE", "4096"))
+VT_CACHE_TTL_POSITIVE = int(os.getenv("VT_CACHE_TTL_POSITIVE", str(7 * 24 * 3600)))  # 악성 판정: 7일
+VT_CACHE_TTL_CLEAN = int(os.getenv("VT_CACHE_TTL_CLEAN", str(24 * 3600)))  # 정상 판정: 1일
+VT_CACHE_TTL_NOT_FOUND = int(os.getenv("VT_CACHE_TTL_NOT_FOUND", "3600"))  # 404/미분석: 1시간
+
+# ✅ 판정 종류
+VERDICT_POSITIVE = "positive"
+VERDICT_CLEAN = "clean"
+VERDICT_NOT_FOUND = "not_found"
+
+
+def classify_verdict(total: int, positives: int) -> str:
+    if total == 0:
+        return VERDICT_NOT_FOUND
+    if positives > 0:
+        return VERDICT_POSITIVE
+    return VERDICT_CLEAN
+
+
+# 🗄️ SHA-256 → VT 판정 캐시 (메모리 LRU + SQLite 2계층)
+class VTVerdictCache:
+    def __init__(
+        self,
+        db_path: str = VT_CACHE_PATH,
+        memory_size: int = VT_CACHE_MEMORY_SIZE,
+        ttl_positive: int = VT_CACHE_TTL_POSITIVE,
+        ttl_clean: int = VT_CACHE_TTL_CLEAN,
+        ttl_not_found: int = VT_CACHE_TTL_NOT_FOUND,
+    ):
+        self.memory_size = memory_size
+        self.ttls = {
+            VERDICT_POSITIVE: ttl_positive,
+            VERDICT_CLEAN: ttl_clean,
+            VERDICT_NOT_FOUND: ttl_not_found,
+        }
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, dict] = OrderedDict()
+        self._conn = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "stores": 0}
+
+        if db_path:
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS vt_verdicts (
+                    sha256 TEXT PRIMARY KEY,
+                    total INTEGER NOT NULL,
+                    positives INTEGER NOT NULL,
+                    verdict TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+            logger.info(f"🗄️ VT 판정 캐시 디스크 계층 사용: {db_path}")
+
+    def _remember(self, sha256: str, entry: dict):
+        self._memory[sha256] = entry
+        self._memory.move_to_end(sha256)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, sha256: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(sha256)
+            if entry is not None:
+                if entry["expires_at"] > now:
+                    self._memory.move_to_end(sha256)
+                    self.stats["memory_hits"] += 1
+                    return entry
+                del self._memory[sha256]
+                self.stats["expired"] += 1
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT total, positives, verdict, expires_at FROM vt_verdicts WHERE sha256 = ?",
+                    (sha256,),
+                ).fetchone()
+                if row is not None:
+                    total, positives, verdict, expires_at = row
+                    if expires_at > now:
+                        entry = {"total": total, "positives": positives, "verdict": verdict, "expires_at": expires_at}
+                        self._remember(sha256, entry)
+                        self.stats["disk_hits"] += 1
+                        return entry
+                    self._conn.execute("DELETE FROM vt_verdicts WHERE sha256 = ?", (sha256,))
+                    self._conn.commit()
+                    self.stats["expired"] += 1
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, sha256: str, total: int, positives: int):
+        verdict = classify_verdict(total, positives)
+        entry = {
+            "total": total,
+            "positives": positives,
+            "verdict": verdict,
+            "expires_at": time.time() + self.ttls[verdict],
+        }
+        with self._lock:
+            self._remember(sha256, entry)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO vt_verdicts (sha256, total, positives, verdict, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (sha256, total, positives, verdict, entry["expires_at"]),
+                )
+                self._conn.commit()
+            self.stats["stores"] += 1
+
+    def purge(self, sha256: Optional[str] = None, verdict: Optional[str] = None) -> int:
+        with self._lock:
+            if sha256 is not None:
+                keys = [sha256] if sha256 in self._memory else []
+            elif verdict is not None:
+                keys = [k for k, v in self._memory.items() if v["verdict"] == verdict]
+            else:
+                keys = list(self._memory)
+            for key in keys:
+                del self._memory[key]
+            removed = len(keys)
+
+            if self._conn is not None:
+                if sha256 is not None:
+                    cursor = self._conn.execute("DELETE FROM vt_verdicts WHERE sha256 = ?", (sha256,))
+                elif verdict is not None:
+                    cursor = self._conn.execute("DELETE FROM vt_verdicts WHERE verdict = ?", (verdict,))
+                else:
+                    cursor = self._conn.execute("DELETE FROM vt_verdicts")
+                self._conn.commit()
+                removed = max(removed, cursor.rowcount)
+
+        logger.info(f"🧹 VT 판정 캐시 삭제 - sha256: {sha256}, verdict: {verdict}, {removed}건")
+        return removed
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            lookups = hits + self.stats["misses"]
+            disk_entries = None
+            if self._conn is not None:
+                disk_entries = self._conn.execute("SELECT COUNT(*) FROM vt_verdicts").fetchone()[0]
+            return {
+                **self.stats,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "ttl_seconds": dict(self.ttls),
+            }
+
+
+# ✅ 프로세스 공용 캐시 인스턴스
+vt_cache = VTVerdictCache()
@@ -0,0 +1,252 @@
+import asyncio
+import fcntl
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+import httpx
+
+from routers.executors import run_io
+
+logger = logging.getLogger(__name__)
+
+# ✅ VirusTotal 클라이언트 설정 (환경 변수로 조정 가능, 로컬 스텁 서버 테스트 시 VT_BASE_URL 변경)
+VT_API_KEY = os.getenv("VT_API_KEY", "Virus Total API KEY")
+VT_BASE_URL = os.getenv("VT_BASE_URL", "https://www.virustotal.com/api/v3/files/")
+# 호출 한도는 VT_RATE_STATE_PATH 파일을 함께 쓰는 모든 워커 프로세스의 합계 (gunicorn --workers 2 여도 4회/분)
+VT_RATE_PER_MINUTE = float(os.getenv("VT_RATE_PER_MINUTE", "4"))  # 무료 API 4회/분, 0 이면 무제한
+VT_RATE_BURST = int(os.getenv("VT_RATE_BURST", "4"))
+# 비어 있으면 프로세스마다 따로 버킷을 가짐 → 실제 한도 = VT_RATE_PER_MINUTE x 워커 수
+VT_RATE_STATE_PATH = os.getenv("VT_RATE_STATE_PATH", os.path.abspath("./data/vt_rate.state"))
+VT_MAX_CONCURRENCY = int(os.getenv("VT_MAX_CONCURRENCY", "4"))
+VT_MAX_RETRIES = int(os.getenv("VT_MAX_RETRIES", "4"))
+VT_BACKOFF_BASE = float(os.getenv("VT_BACKOFF_BASE", "2"))
+VT_BACKOFF_MAX = float(os.getenv("VT_BACKOFF_MAX", "60"))
+VT_CONNECT_TIMEOUT = float(os.getenv("VT_CONNECT_TIMEOUT", "10"))
+VT_READ_TIMEOUT = float(os.getenv("VT_READ_TIMEOUT", "30"))
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class VTClientError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class VTRateLimitedError(VTClientError):
+    pass
+
+
+# 🪣 토큰 버킷: 모든 게시글의 VT 요청이 공유하는 호출 한도
+# - state_path 가 있으면 "토큰 수 갱신시각" 을 파일에 두고 flock 으로 갱신 → 같은 파일을 쓰는 워커 프로세스가 한도 1개를 나눠 씀
+# - 없으면 프로세스 메모리에만 보관
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, burst: int, state_path: Optional[str] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.time()
+        self.state_path = state_path
+        self._lock = asyncio.Lock()
+        if state_path:
+            os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+
+    # change(현재 토큰 수) -> (새 토큰 수, 반환값) 를 버킷 상태에 적용 (파일 모드면 배타 잠금 안에서)
+    def _update(self, change):
+        if not self.state_path:
+            now = time.time()
+            tokens = min(self.capacity, self.tokens + max(0.0, now - self.updated) * self.rate)
+            self.tokens, result = change(tokens)
+            self.updated = now
+            return result
+
+        fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            now = time.time()
+            try:
+                tokens, updated = (float(v) for v in os.read(fd, 64).split())
+            except ValueError:
+                tokens, updated = float(self.capacity), now
+            tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+            tokens, result = change(tokens)
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, f"{tokens} {now}".encode(), 0)
+            return result
+        finally:
+            os.close(fd)  # 닫으면 flock 도 해제
+
+    # 토큰 1개 사용 → 0 (사용함) 또는 다음 토큰까지 기다릴 초
+    def _take(self) -> float:
+        return self._update(lambda tokens: (tokens - 1, 0.0) if tokens >= 1 else (tokens, (1 - tokens) / self.rate))
+
+    async def _call(self, fn):
+        return await run_io(fn) if self.state_path else fn()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        # 락을 쥔 채로 기다려 요청 순서(FIFO)를 보장 (프로세스 안에서)
+        async with self._lock:
+            while True:
+                wait = await self._call(self._take)
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+    async def drain(self):
+        # 429 응답을 받으면 남은 토큰을 비워 다른 요청(다른 워커 포함)도 함께 속도를 늦춤
+        await self._call(lambda: self._update(lambda tokens: (0.0, None)))
+
+
+# 📡 공용 VirusTotal 클라이언트 (커넥션 풀 + 호출 한도 + 재시도 + 동일 해시 요청 병합)
+class VTClient:
+    def __init__(
+        self,
+        api_key: str = VT_API_KEY,
+        base_url: str = VT_BASE_URL,
+        rate_per_minute: float = VT_RATE_PER_MINUTE,
+        burst: int = VT_RATE_BURST,
+        rate_state_path: Optional[str] = VT_RATE_STATE_PATH,
+        max_concurrency: int = VT_MAX_CONCURRENCY,
+        max_retries: int = VT_MAX_RETRIES,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate_per_minute, burst, rate_state_path)
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "coalesced": 0, "errors": 0}
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"x-apikey": self.api_key},
+                timeout=httpx.Timeout(VT_READ_TIMEOUT, connect=VT_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # 🔍 해시 1건 조회 → {"total", "positives"} (미등록이면 total=0)
+    async def lookup(self, sha256: str) -> dict:
+        future = self._inflight.get(sha256)
+        if future is not None:
+            # 다른 게시글이 같은 해시를 이미 조회 중이면 그 결과를 함께 사용
+            self.stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # 먼저 조회하던 게시글이 취소된 경우(이 대기자는 취소되지 않음) → 직접 다시 조회
+                return await self.lookup(sha256)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[sha256] = future
+        try:
+            result = await self._fetch(sha256)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # 병합 대기자가 없을 때 "Future exception was never retrieved" 경고 방지
+            future.exception()
+            raise
+        except BaseException:
+            # 취소(CancelledError) 등은 except Exception 에 잡히지 않음 → 대기자가 영원히 기다리지 않도록 future 도 취소
+            future.cancel()
+            raise
+        finally:
+            self._inflight.pop(sha256, None)
+
+    async def _fetch(self, sha256: str) -> dict:
+        url = f"{self.base_url}{sha256}"
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            async with self._semaphore:
+                self.stats["requests"] += 1
+                logger.debug(f"📡 [VT 요청] {url} (시도 {attempt + 1})")
+                try:
+                    response = await self._http().get(url)
+                    status = response.status_code
+                except httpx.TransportError as e:
+                    response, status = None, None
+                    logger.warning(f"⚠️ VirusTotal 연결 오류: {e}")
+
+            logger.debug(f"📥 [응답 상태] {status}")
+            if status == 200:
+                try:
+                    stats = response.json()["data"]["attributes"]["last_analysis_stats"]
+                except (KeyError, ValueError) as e:
+                    self.stats["errors"] += 1
+                    logger.error(f"❌ VT 결과 파싱 실패: {e}")
+                    raise VTClientError(500, "VirusTotal 결과 파싱 오류")
+                return {"total": sum(stats.values()), "positives": stats.get("malicious", 0)}
+
+            if status == 404:
+                return {"total": 0, "positives": 0}
+
+            if status == 401:
+                self.stats["errors"] += 1
+                raise VTClientError(401, "VirusTotal API 인증 실패: 잘못된 API 키입니다.")
+
+            if status is not None and status not in RETRYABLE_STATUS:
+                self.stats["errors"] += 1
+                logger.error(f"❌ VirusTotal 요청 실패: {status} - {response.text}")
+                raise VTClientError(status, "VirusTotal 요청 실패")
+
+            if status == 429:
+                self.stats["throttled"] += 1
+                await self.bucket.drain()
+
+            if attempt >= self.max_retries:
+                self.stats["errors"] += 1
+                if status == 429:
+                    raise VTRateLimitedError(429, "VirusTotal 호출 한도 초과 (재시도 소진)")
+                raise VTClientError(status or 503, "VirusTotal 요청 실패 (재시도 소진)")
+
+            delay = self._backoff_delay(attempt, response)
+            attempt += 1
+            self.stats["retries"] += 1
+            logger.warning(f"🔁 VirusTotal 재시도 대기 {delay:.1f}s - 상태: {status}, 해시: {sha256}")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _backoff_delay(attempt: int, response: Optional[httpx.Response]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(float(retry_after), VT_BACKOFF_MAX)
+                except ValueError:
+                    pass
+        delay = min(VT_BACKOFF_BASE * (2 ** attempt), VT_BACKOFF_MAX)
+        return delay * random.uniform(0.5, 1.0)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "inflight": len(self._inflight),
+            "rate_per_minute": self.bucket.rate * 60,
+            "rate_shared": bool(self.bucket.state_path),
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+# ✅ 프로세스 공용 클라이언트 인스턴스
+vt_client = VTClient()
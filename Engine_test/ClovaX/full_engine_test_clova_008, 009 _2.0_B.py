@@ -1,4 +1,4 @@
-import os, json, time, csv, requests, tempfile, pyzipper, re
+import os, json, time, csv, requests, tempfile, pyzipper
 
 # ──────────────────────────────────────────────
 # ⚙️ 실행 모드 설정: "A" 또는 "B"
@@ -7,8 +7,6 @@ MODE = "B"
 
 # ─── 경로 설정 ───
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-LOG_DIR = os.path.join(BASE_DIR, "logs")
-os.makedirs(LOG_DIR, exist_ok=True)
 
 LOG_PATH = os.path.join(BASE_DIR, f"log_{MODE}.txt")
 INPUT_JSON = os.path.join(BASE_DIR, f"inputs_test_1000_filled_final_{MODE}.json")
@@ -19,8 +17,6 @@ AUTH_KEY = "Zipsentinel API KEY"  # MODE에 따라 교체 가능
 TIMEOUT = 180
 SLEEP_INTERVAL = 30
 MAX_MB = 30
-RESULT_RE = re.compile(r"\[✅ FE 전송 결과\] *(?P<json>\{.*\})")
-LOG_MONITOR_PATH = os.path.join(LOG_DIR, "zipsentinel.log")
 
 # ─── 로그 출력 함수 ───
 def log(msg):
@@ -45,25 +41,28 @@ def get_inner_zip_under_30mb(zip_path, password="infected"):
         log(f"[⚠️ 내부 ZIP 추출 실패] {e}")
     return None, None
 
-# ─── 로그에서 결과 감시 ───
-def wait_for_result(post_id, timeout=TIMEOUT):
+# ─── 서버 결과 채널(롱폴링)에서 결과 대기 ───
+def wait_for_result(post_id, job_id=None, timeout=TIMEOUT):
     start = time.time()
     while time.time() - start < timeout:
+        remaining = timeout - (time.time() - start)
         try:
-            with open(LOG_MONITOR_PATH, encoding="utf-8") as f:
-                for line in reversed(f.readlines()):
-                    if "[✅ FE 전송 결과]" in line:
-                        match = RESULT_RE.search(line)
-                        if match:
-                            try:
-                                result_obj = json.loads(match.group("json").replace("'", '"'))
-                                if result_obj.get("post_id") == post_id:
-                                    return result_obj
-                            except json.JSONDecodeError:
-                                continue
-        except FileNotFoundError:
-            log(f"[❌ 로그파일 없음] {LOG_MONITOR_PATH}")
-        time.sleep(3)
+            res = requests.get(f"{API_ENDPOINT}/result/{post_id}/wait",
+                               params={"job_id": job_id, "timeout": max(1, min(30, int(remaining)))},
+                               timeout=40)
+        except requests.RequestException as e:
+            log(f"[⚠️ 결과 조회 실패] {e}")
+            time.sleep(3)
+            continue
+        if res.status_code != 200:
+            log(f"[⚠️ 결과 조회 오류] {res.status_code}, {res.text}")
+            time.sleep(3)
+            continue
+        job = res.json()
+        if job.get("status") == "graded":
+            return job.get("result", {})
+        if job.get("status") == "failed":
+            raise RuntimeError(f"분석 실패: {job.get('error')}")
     return {}
 
 # ─── 메인 실행 ───
@@ -102,13 +101,14 @@ with open(OUTPUT_CSV, "w", newline="", encoding="utf-8-sig") as csvf:
             log(f"[{idx:04}] 📁 내부 파일 분석 대상 선택 완료: {file_name}")
 
             res = requests.post(API_ENDPOINT,
+                                params={"wait": "false"},  # 202 즉시 반환 → 결과는 롱폴링으로 대기
                                 headers={"Authorization": AUTH_KEY},
                                 json={"post_id": post_id, "post_text": post_text, "download_link": download_link},
                                 timeout=10)
-            if res.status_code != 200:
+            if res.status_code not in (200, 202):
                 raise RuntimeError(f"API 오류: {res.status_code}, {res.text}")
 
-            result = wait_for_result(post_id, timeout=TIMEOUT)
+            result = wait_for_result(post_id, res.json().get("job_id"), timeout=TIMEOUT)
             if result:
                 analyzed = True
                 status = result.get("status", "completed")
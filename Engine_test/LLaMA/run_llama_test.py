@@ -1,6 +1,9 @@
 import os
 import json
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # === 경로 설정 (도커 실행 디렉토리 기준) ===
@@ -9,16 +12,21 @@ INPUT_PATH = os.path.join(BASE_DIR, "final_testcases_400_tracking.json")
 OUTPUT_PATH = os.path.join(BASE_DIR, "final_testcases_400_llama_with_timing.json")
 API_URL = "http://localhost:8000/llama-analyze/analyze"
 
+# === 동시 요청 수 (1 = 기존 순차 실행, 2 이상이면 동시 요청을 함께 디코딩하는 배치 디코딩 처리량 벤치마크) ===
+CONCURRENCY = int(os.getenv("LLAMA_TEST_CONCURRENCY", "1"))
+# === 1 이면 추론 캐시/규칙 기반 추출을 건너뛰고 매 건 LLM 생성 (배치 디코딩 처리량만 측정할 때) ===
+BYPASS = os.getenv("LLAMA_TEST_BYPASS", "0") == "1"
+
 # === 테스트 데이터 로드 ===
 with open(INPUT_PATH, "r", encoding="utf-8") as f:
     data = json.load(f)
 
-# === 테스트 케이스 반복 처리 ===
-for case in data:
-    if case.get("predicted_password") is not None:
-        continue  # 이미 처리된 항목은 건너뜀
+save_lock = threading.Lock()
+
 
-    payload = {"post_text": case["input_text"]}
+# === 테스트 케이스 1건 처리 ===
+def run_case(case):
+    payload = {"post_text": case["input_text"], "bypass_cache": BYPASS, "bypass_fastpath": BYPASS}
 
     try:
         started_at = datetime.now()
@@ -46,7 +54,18 @@ for case in data:
         print(f"[{case['id']:03}] ❌ 오류 발생: {str(e)} | 시간={case['duration_ms']}ms")
 
     # ✅ 매 케이스마다 중간 저장
-    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    with save_lock:
+        with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+# === 테스트 케이스 반복 처리 ===
+pending = [case for case in data if case.get("predicted_password") is None]  # 이미 처리된 항목은 건너뜀
+suite_started = time.perf_counter()
+with ThreadPoolExecutor(max_workers=max(1, CONCURRENCY)) as executor:
+    list(executor.map(run_case, pending))
+suite_elapsed = time.perf_counter() - suite_started
 
+if pending:
+    print(f"📊 처리량: {len(pending)}건 / {suite_elapsed:.1f}s = {len(pending) / suite_elapsed:.2f}건/s (동시 요청 {CONCURRENCY})")
 print(f"✅ 전체 테스트 완료! 결과 저장됨: {OUTPUT_PATH}")
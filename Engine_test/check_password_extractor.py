@@ -0,0 +1,47 @@
+import os
+import sys
+
+# BE 라우터를 서버 없이 직접 불러와 규칙 기반 비밀번호 추출(빠른 경로)만 확인
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "BE"))
+from routers.password_extractor import fast_password, password_candidates  # noqa: E402
+
+# === 회귀 케이스: (게시글, 빠른 경로 기대값 (None = LLM 으로 넘겨야 함), 후보 목록에 반드시 있어야 하는 값) ===
+CASES = [
+    ('비밀번호는 "qwer1234!" 입니다', "qwer1234!", "qwer1234!"),
+    ("비밀번호는 qwer1234!입니다", "qwer1234!", "qwer1234!"),
+    ("Password: P@ss.word!", "P@ss.word", "P@ss.word!"),
+    ("비밀번호는 abc.def 입니다", "abc.def", "abc.def"),
+    ("비번: a.b?c!d", "a.b?c!d", "a.b?c!d"),
+    ("password is 'x!y.z?'.", "x!y.z?", "x!y.z?"),
+    ("password: see below for details", None, None),
+    ("pw = hello world", None, "hello world"),
+    ("비밀번호는 infected입니다.", "infected", "infected"),
+    ("password is infected. Enjoy", "infected", "infected"),
+    ("パスワード: abc123です", "abc123", "abc123"),
+    # 다른 단어 안의 라벨 (compass, bypass, trespass, sharpw, enclave) 은 비밀번호 라벨이 아님
+    ("compass: north", None, None),
+    ("UAC bypass: enabled", None, None),
+    ("Trespass is illegal", None, None),
+    ("sharpw=3", None, None),
+    ("Download here. Bypass: true", None, None),
+    ("Enclave: Safe", None, None),
+    ("bypass=1 and password=abc", "abc", "abc"),
+    ("The password is: s3cr3t", "s3cr3t", "s3cr3t"),
+]
+
+
+def run():
+    failures = 0
+    for post_text, expected, must_try in CASES:
+        fast = fast_password(post_text)
+        got = fast["password"] if fast else None
+        candidates = password_candidates(post_text)
+        ok = got == expected and (must_try is None or must_try in candidates)
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {post_text!r} → 빠른 경로: {got!r} (기대 {expected!r}), 후보: {candidates}")
+    print(f"📊 {len(CASES) - failures}/{len(CASES)} 통과")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if run() else 0)
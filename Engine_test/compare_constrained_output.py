@@ -0,0 +1,77 @@
+import json
+import os
+import time
+import requests
+
+# === 설정 ===
+API_BASE = os.getenv("API_BASE", "http://localhost:8000")
+ENGINES = {
+    "clovax": f"{API_BASE}/clovax",
+    "llama": f"{API_BASE}/llama-analyze/analyze",
+}
+DATASETS = [
+    "test_001_pw_length.json",
+    "test_002_context_length_json.json",
+    "test_003_special_characters.json",
+    "test_004_hint_based.json",
+    "test_005_math_based.json",
+    "test_006_multilingual.json",
+]
+OUTPUT_PATH = "results_constrained_output.json"
+
+
+# === 1건 호출 (캐시/규칙 기반 빠른 경로 우회 → 항상 LLM 이 답하도록, 출력 모드 지정) ===
+def run_case(url, case, constrained):
+    payload = {"post_text": case["input_text"], "bypass_cache": True, "bypass_fastpath": True, "constrained": constrained}
+    started = time.perf_counter()
+    try:
+        response = requests.post(url, json=payload, timeout=300)
+        predicted = response.json().get("password", "") if response.status_code == 200 else "ERROR"
+    except Exception as e:
+        predicted = f"EXCEPTION: {e}"
+    return predicted, (time.perf_counter() - started) * 1000
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0
+
+
+# === 데이터셋 x 엔진 x 출력 모드(자유 생성 / 제약 출력) 비교 ===
+def run_compare():
+    report = []
+    for dataset in DATASETS:
+        if not os.path.exists(dataset):
+            print(f"⚠️ 데이터셋 없음, 건너뜀: {dataset}")
+            continue
+        with open(dataset, "r", encoding="utf-8") as f:
+            test_cases = json.load(f)
+
+        for engine, url in ENGINES.items():
+            for constrained in (False, True):
+                matches, durations = 0, []
+                for case in test_cases:
+                    predicted, duration_ms = run_case(url, case, constrained)
+                    matches += predicted == case.get("expected_password", case.get("password"))
+                    durations.append(duration_ms)
+
+                row = {
+                    "dataset": dataset,
+                    "engine": engine,
+                    "constrained": constrained,
+                    "cases": len(test_cases),
+                    "accuracy": round(matches / len(test_cases), 4) if test_cases else 0.0,
+                    "avg_ms": round(sum(durations) / len(durations), 1) if durations else 0.0,
+                    "p95_ms": round(percentile(durations, 0.95), 1),
+                }
+                report.append(row)
+                print(f"📊 {dataset} | {engine} | 제약={constrained} | 정확도={row['accuracy']:.2%} | 평균={row['avg_ms']}ms | p95={row['p95_ms']}ms")
+
+    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"✅ 완료: 결과가 {OUTPUT_PATH}에 저장되었습니다.")
+
+
+if __name__ == "__main__":
+    run_compare()